@@ -1,20 +1,40 @@
 import os
 import datetime
 import pytz
-import smtplib
 import json
 import urllib.request
 import urllib.parse
 import urllib.error
 import re
 import html
+import io
+import sqlite3
+import tempfile
+import argparse
+import array
 import base64
+import collections
+import gzip
+import hashlib
+import heapq
+import http.client
+import importlib.util
+import queue
+import random
+import sys
+import threading
 import time
+import types
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from html.parser import HTMLParser
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from string import Template
 
+try:
+    import fcntl
+except ImportError:  # Windows: cache keys are written atomically but not locked.
+    fcntl = None
+
 def _env_int(name, default, minimum=None, maximum=None):
     raw_value = os.environ.get(name)
     if raw_value is None or str(raw_value).strip() == "":
@@ -39,6 +59,13 @@ def _env_str(name, default=""):
     return str(raw_value).strip()
 
 
+def _env_bool(name, default=False):
+    raw_value = os.environ.get(name)
+    if raw_value is None or str(raw_value).strip() == "":
+        return default
+    return str(raw_value).strip().lower() in ("1", "true", "yes", "on")
+
+
 def _env_csv(name, default_values):
     raw_value = os.environ.get(name)
     if raw_value is None:
@@ -62,8 +89,8 @@ def _load_brief_settings():
     return {}
 
 
-def _brief_setting(path, default=None):
-    cursor = BRIEF_SETTINGS
+def _brief_setting(path, default=None, settings=None):
+    cursor = _config().brief_settings if settings is None else settings
     for key in path:
         if not isinstance(cursor, dict) or key not in cursor:
             return default
@@ -71,13 +98,16 @@ def _brief_setting(path, default=None):
     return cursor
 
 
-def _brief_settings_tickers(default_values):
+def _brief_settings_tickers(default_values, settings=None):
     raw_env = os.environ.get("PORTFOLIO_FALLBACK_TICKERS")
     if raw_env is not None:
         return _env_csv("PORTFOLIO_FALLBACK_TICKERS", default_values)
 
+    return _tickers_from_holdings(_brief_setting(["holdings"], [], settings=settings)) or list(default_values)
+
+
+def _tickers_from_holdings(holdings):
     tickers = []
-    holdings = _brief_setting(["holdings"], [])
     if isinstance(holdings, list):
         for item in holdings:
             if isinstance(item, dict) and item.get("include") is False:
@@ -89,12 +119,13 @@ def _brief_settings_tickers(default_values):
             ticker = ticker.replace(" ", "")
             if re.fullmatch(r"[A-Z0-9.\-]{1,12}", ticker) and ticker not in tickers:
                 tickers.append(ticker)
-    return tickers or list(default_values)
+    return tickers
 
 
-def _brief_enabled_sections():
+def _brief_enabled_sections(configured=None):
     known = ["odak", "hava", "astro", "karar", "is", "todoist", "finans"]
-    configured = _brief_setting(["sections"], {})
+    if configured is None:
+        configured = _brief_setting(["sections"], {})
     if not isinstance(configured, dict):
         return known
     enabled = [section_id for section_id in known if configured.get(section_id, True)]
@@ -156,70 +187,296 @@ class TodoistAPIError(RuntimeError):
         super().__init__(f"Todoist[{phase}] {path} status={status}: {details}")
 
 # --- CONFIGURATION ---
-BRIEF_SETTINGS = _load_brief_settings()
-API_KEY = os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
-GEMINI_MODEL = os.environ.get("GEMINI_MODEL") or _brief_setting(["format", "geminiModel"], "gemini-2.5-flash")
-GEMINI_FALLBACK_MODELS = _env_csv("GEMINI_FALLBACK_MODELS", ["gemini-2.0-flash", "gemini-2.5-flash-lite", "gemini-1.5-flash"])
-GEMINI_MAX_RETRIES = _env_int("GEMINI_MAX_RETRIES", 4, minimum=1, maximum=8)
-GEMINI_RETRY_BASE_SEC = max(0.5, float(os.environ.get("GEMINI_RETRY_BASE_SEC") or 3.0))
-EMAIL_RENDER_MODE = os.environ.get("EMAIL_RENDER_MODE") or "email-safe"
-THEME_PROFILE = os.environ.get("THEME_PROFILE") or "offwhite-slate"
-EMAIL_HTML_BUDGET_BYTES = _env_int(
-    "EMAIL_HTML_BUDGET_BYTES",
-    _safe_int(_brief_setting(["format", "htmlBudgetBytes"], 102400), 102400),
-    minimum=16384,
-    maximum=500000,
-)
-BRIEF_FONT_STACK = _env_str(
-    "BRIEF_FONT_STACK",
-    _brief_setting(["fontPairing", "body"], '-apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Arial, sans-serif'),
-)
-BRIEF_MONO_FONT_STACK = _env_str(
-    "BRIEF_MONO_FONT_STACK",
-    _brief_setting(["fontPairing", "mono"], '"SFMono-Regular", Menlo, Consolas, "Liberation Mono", monospace'),
-)
-BRIEF_ENABLED_SECTIONS = _brief_enabled_sections()
-GEMINI_IMAGE_MODEL = os.environ.get("GEMINI_IMAGE_MODEL") or "gemini-2.5-flash-image"
-TIMEZONE = _env_str("BRIEF_TIMEZONE", _brief_setting(["data", "timezone"], "Asia/Qatar"))
-USER_BIRTH_DATA = _env_str("USER_BIRTH_DATA", "kişisel profil yapılandırıldı")
 CACHE_DIR = ".cache"
 HEADER_IMAGE_DIR = os.path.join("assets", "headers")
-HEADER_POOL_SIZE = _env_int("HEADER_POOL_SIZE", 5, minimum=1, maximum=10)
-HEADER_TARGET_WIDTH = _env_int("HEADER_TARGET_WIDTH", 1360, minimum=680, maximum=3000)
-HEADER_TARGET_HEIGHT = _env_int("HEADER_TARGET_HEIGHT", 440, minimum=220, maximum=1500)
 FALLBACK_HERO_BG = "#374151"
 TODOIST_DEFAULT_FILTER = "overdue | today"
-TODOIST_API_TOKEN = _normalize_todoist_token(_env_str("TODOIST_API_TOKEN", ""))
-TODOIST_FILTER = _normalize_todoist_filter(
-    _env_str("TODOIST_FILTER", _brief_setting(["data", "todoistFilter"], TODOIST_DEFAULT_FILTER)),
-    TODOIST_DEFAULT_FILTER,
-)
-TODOIST_MAX_ITEMS = max(
-    10,
-    _env_int(
-        "TODOIST_MAX_ITEMS",
-        _safe_int(_brief_setting(["data", "todoistMaxItems"], 10), 10),
-        minimum=1,
-        maximum=20,
-    ),
-)
-TODOIST_CACHE_TTL_MIN = _env_int("TODOIST_CACHE_TTL_MIN", 10, minimum=1, maximum=180)
 TODOIST_API_BASE = "https://api.todoist.com/api/v1"
 
-# Fatih's natal chart coordinates. Override through secrets/variables when
-# running outside the private local environment.
-NATAL_YEAR = _env_int("NATAL_YEAR", 1989)
-NATAL_MONTH = _env_int("NATAL_MONTH", 6, minimum=1, maximum=12)
-NATAL_DAY = _env_int("NATAL_DAY", 14, minimum=1, maximum=31)
-NATAL_HOUR = _env_int("NATAL_HOUR", 9, minimum=0, maximum=23)
-NATAL_MINUTE = _env_int("NATAL_MINUTE", 45, minimum=0, maximum=59)
-NATAL_LAT = _env_float("NATAL_LAT", 41.0082)
-NATAL_LNG = _env_float("NATAL_LNG", 28.9784)
-NATAL_TZ = _env_str("NATAL_TZ", "Europe/Istanbul")
-
 # Doha coordinates (current location)
 DOHA_LAT, DOHA_LNG = 25.2854, 51.5310
 DOHA_TZ = "Asia/Qatar"
+DOHA_LABEL = "Doha, Katar"
+
+
+_ENGINE_CONFIG_FIELDS = (
+    "brief_settings",
+    "api_key",
+    "gemini_model",
+    "gemini_fallback_models",
+    "gemini_max_retries",
+    "gemini_retry_base_sec",
+    "gemini_hedge_percentile",
+    "gemini_hedge_after_sec",
+    "gemini_breaker_threshold",
+    "gemini_breaker_cooldown_min",
+    "gemini_image_model",
+    "gemini_cache_ttl_min",
+    "gemini_cache_bypass",
+    "gemini_generation_mode",
+    "gemini_output_format",
+    "gemini_section_timeout_sec",
+    "gemini_http_timeout_sec",
+    "gemini_context_cache",
+    "gemini_context_cache_ttl_min",
+    "gemini_context_cache_min_tokens",
+    "prompt_compact",
+    "prompt_token_budget",
+    "email_render_mode",
+    "theme_profile",
+    "email_html_budget_bytes",
+    "brief_font_stack",
+    "brief_mono_font_stack",
+    "brief_enabled_sections",
+    "timezone",
+    "user_birth_data",
+    "cache_backend",
+    "cache_max_bytes",
+    "weather_cache_ttl_min",
+    "weather_cache_stale_min",
+    "weather_grid_deg",
+    "header_pool_size",
+    "header_pool_workers",
+    "header_pool_background",
+    "header_normalize_workers",
+    "header_derivatives",
+    "header_image_budget_kb",
+    "static_asset_dir",
+    "static_asset_base_url",
+    "header_target_width",
+    "header_target_height",
+    "todoist_api_token",
+    "todoist_filter",
+    "todoist_max_items",
+    "todoist_cache_ttl_min",
+    "todoist_sync_mode",
+    "finance_cache_ttl_min",
+    "price_store_dir",
+    "data_fetch_workers",
+    "data_fetch_deadlines_sec",
+    # Fatih's natal chart coordinates. Override through secrets/variables when
+    # running outside the private local environment.
+    "natal_year",
+    "natal_month",
+    "natal_day",
+    "natal_hour",
+    "natal_minute",
+    "natal_lat",
+    "natal_lng",
+    "natal_tz",
+    # Optional precomputed transit table (see `--precompute-transits`).
+    "ephemeris_table_dir",
+    "ephemeris_table_step_min",
+    # Single-brief recipient name and multi-recipient batch mode.
+    "recipient_name",
+    "brief_recipients_file",
+    "brief_batch_workers",
+    "brief_batch_output_dir",
+    "etf_fallback_tickers",
+    "email_user",
+    "email_pass",
+    "email_to",
+    # Email transport (see `_email_transport()`).
+    "email_backend",
+    "email_smtp_host",
+    "email_smtp_port",
+    "email_smtp_security",
+    "email_smtp_timeout_sec",
+    "email_pool_size",
+    "email_max_per_connection",
+    "email_rate_per_min",
+    "email_max_retries",
+    "email_retry_base_sec",
+    "email_outbox_dir",
+)
+
+
+class EngineConfig(collections.namedtuple("EngineConfig", _ENGINE_CONFIG_FIELDS)):
+    """Settings read from `brief-settings.json` and the environment.
+
+    Built on first use by `_config()` rather than at import time; call
+    `reload_config()` to pick up changed settings in a long-lived process.
+    The old module-level names (`GEMINI_MODEL`, `NATAL_YEAR`, ...) remain
+    readable through the module `__getattr__`.
+    """
+
+    __slots__ = ()
+
+
+def _load_config():
+    brief_settings = _load_brief_settings()
+
+    def setting(path, default=None):
+        return _brief_setting(path, default, settings=brief_settings)
+
+    return EngineConfig(
+        brief_settings=brief_settings,
+        api_key=os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY"),
+        gemini_model=os.environ.get("GEMINI_MODEL") or setting(["format", "geminiModel"], "gemini-2.5-flash"),
+        gemini_fallback_models=tuple(
+            _env_csv("GEMINI_FALLBACK_MODELS", ["gemini-2.0-flash", "gemini-2.5-flash-lite", "gemini-1.5-flash"])
+        ),
+        gemini_max_retries=_env_int("GEMINI_MAX_RETRIES", 4, minimum=1, maximum=8),
+        gemini_retry_base_sec=max(0.5, float(os.environ.get("GEMINI_RETRY_BASE_SEC") or 3.0)),
+        gemini_hedge_percentile=_env_int("GEMINI_HEDGE_PERCENTILE", 90, minimum=50, maximum=99),
+        gemini_hedge_after_sec=max(0.1, _env_float("GEMINI_HEDGE_AFTER_SEC", 25.0)),
+        gemini_breaker_threshold=_env_int("GEMINI_BREAKER_THRESHOLD", 3, minimum=1, maximum=20),
+        gemini_breaker_cooldown_min=_env_int("GEMINI_BREAKER_COOLDOWN_MIN", 30, minimum=1, maximum=1440),
+        gemini_image_model=os.environ.get("GEMINI_IMAGE_MODEL") or "gemini-2.5-flash-image",
+        gemini_cache_ttl_min=_env_int("GEMINI_CACHE_TTL_MIN", 720, minimum=0, maximum=1440),
+        gemini_cache_bypass=_env_bool("GEMINI_CACHE_BYPASS"),
+        gemini_generation_mode=(_env_str("GEMINI_GENERATION_MODE") or "single").lower(),
+        gemini_output_format=(_env_str("GEMINI_OUTPUT_FORMAT") or "html").lower(),
+        gemini_section_timeout_sec=max(0.1, _env_float("GEMINI_SECTION_TIMEOUT_SEC", 90.0)),
+        gemini_http_timeout_sec=max(1.0, _env_float("GEMINI_HTTP_TIMEOUT_SEC", 120.0)),
+        gemini_context_cache=_env_bool("GEMINI_CONTEXT_CACHE"),
+        gemini_context_cache_ttl_min=_env_int("GEMINI_CONTEXT_CACHE_TTL_MIN", 360, minimum=5, maximum=10080),
+        gemini_context_cache_min_tokens=_env_int("GEMINI_CONTEXT_CACHE_MIN_TOKENS", 1024, minimum=0, maximum=100000),
+        prompt_compact=_env_bool("PROMPT_COMPACT", True),
+        prompt_token_budget=_env_int("PROMPT_TOKEN_BUDGET", 4000, minimum=0, maximum=1000000),
+        email_render_mode=os.environ.get("EMAIL_RENDER_MODE") or "email-safe",
+        theme_profile=os.environ.get("THEME_PROFILE") or "offwhite-slate",
+        email_html_budget_bytes=_env_int(
+            "EMAIL_HTML_BUDGET_BYTES",
+            _safe_int(setting(["format", "htmlBudgetBytes"], 102400), 102400),
+            minimum=16384,
+            maximum=500000,
+        ),
+        brief_font_stack=_env_str(
+            "BRIEF_FONT_STACK",
+            setting(["fontPairing", "body"], '-apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Arial, sans-serif'),
+        ),
+        brief_mono_font_stack=_env_str(
+            "BRIEF_MONO_FONT_STACK",
+            setting(["fontPairing", "mono"], '"SFMono-Regular", Menlo, Consolas, "Liberation Mono", monospace'),
+        ),
+        brief_enabled_sections=tuple(_brief_enabled_sections(setting(["sections"], {}))),
+        timezone=_env_str("BRIEF_TIMEZONE", setting(["data", "timezone"], "Asia/Qatar")),
+        user_birth_data=_env_str("USER_BIRTH_DATA", "kişisel profil yapılandırıldı"),
+        cache_backend=_env_str("CACHE_BACKEND", "json").lower() or "json",
+        cache_max_bytes=_env_int(
+            "CACHE_MAX_BYTES", 64 * 1024 * 1024, minimum=1024 * 1024, maximum=4 * 1024 * 1024 * 1024
+        ),
+        weather_cache_ttl_min=_env_int("WEATHER_CACHE_TTL_MIN", 60, minimum=5, maximum=720),
+        weather_cache_stale_min=_env_int("WEATHER_CACHE_STALE_MIN", 120, minimum=0, maximum=1440),
+        weather_grid_deg=min(1.0, max(0.01, _env_float("WEATHER_GRID_DEG", 0.1))),
+        header_pool_size=_env_int("HEADER_POOL_SIZE", 5, minimum=1, maximum=10),
+        header_pool_workers=_env_int("HEADER_POOL_WORKERS", 3, minimum=1, maximum=10),
+        header_pool_background=_env_bool("HEADER_POOL_BACKGROUND"),
+        header_derivatives=_env_bool("HEADER_DERIVATIVES", True),
+        header_image_budget_kb=_env_int("HEADER_IMAGE_BUDGET_KB", 60, minimum=5, maximum=2048),
+        static_asset_dir=_env_str("STATIC_ASSET_DIR", ""),
+        static_asset_base_url=_env_str("STATIC_ASSET_BASE_URL", ""),
+        header_normalize_workers=_env_int(
+            "HEADER_NORMALIZE_WORKERS", min(4, os.cpu_count() or 1), minimum=1, maximum=16
+        ),
+        header_target_width=_env_int("HEADER_TARGET_WIDTH", 1360, minimum=680, maximum=3000),
+        header_target_height=_env_int("HEADER_TARGET_HEIGHT", 440, minimum=220, maximum=1500),
+        todoist_api_token=_normalize_todoist_token(_env_str("TODOIST_API_TOKEN", "")),
+        todoist_filter=_normalize_todoist_filter(
+            _env_str("TODOIST_FILTER", setting(["data", "todoistFilter"], TODOIST_DEFAULT_FILTER)),
+            TODOIST_DEFAULT_FILTER,
+        ),
+        todoist_max_items=max(
+            10,
+            _env_int(
+                "TODOIST_MAX_ITEMS",
+                _safe_int(setting(["data", "todoistMaxItems"], 10), 10),
+                minimum=1,
+                maximum=20,
+            ),
+        ),
+        todoist_cache_ttl_min=_env_int("TODOIST_CACHE_TTL_MIN", 10, minimum=1, maximum=180),
+        todoist_sync_mode=_env_str("TODOIST_SYNC_MODE", "filter").lower() or "filter",
+        finance_cache_ttl_min=_env_int("FINANCE_CACHE_TTL_MIN", 30, minimum=1, maximum=1440),
+        price_store_dir=_env_str("PRICE_STORE_DIR", os.path.join(CACHE_DIR, "prices")),
+        data_fetch_workers=_env_int("DATA_FETCH_WORKERS", 4, minimum=1, maximum=16),
+        data_fetch_deadlines_sec=types.MappingProxyType({
+            "planetary": _env_int("DATA_FETCH_PLANETARY_TIMEOUT_SEC", 45, minimum=1, maximum=600),
+            "finance": _env_int("DATA_FETCH_FINANCE_TIMEOUT_SEC", 60, minimum=1, maximum=600),
+            "weather": _env_int("DATA_FETCH_WEATHER_TIMEOUT_SEC", 25, minimum=1, maximum=600),
+            "todoist": _env_int("DATA_FETCH_TODOIST_TIMEOUT_SEC", 45, minimum=1, maximum=600),
+        }),
+        natal_year=_env_int("NATAL_YEAR", 1989),
+        natal_month=_env_int("NATAL_MONTH", 6, minimum=1, maximum=12),
+        natal_day=_env_int("NATAL_DAY", 14, minimum=1, maximum=31),
+        natal_hour=_env_int("NATAL_HOUR", 9, minimum=0, maximum=23),
+        natal_minute=_env_int("NATAL_MINUTE", 45, minimum=0, maximum=59),
+        natal_lat=_env_float("NATAL_LAT", 41.0082),
+        natal_lng=_env_float("NATAL_LNG", 28.9784),
+        natal_tz=_env_str("NATAL_TZ", "Europe/Istanbul"),
+        ephemeris_table_dir=_env_str("EPHEMERIS_TABLE_DIR", os.path.join(".cache", "ephemeris")),
+        ephemeris_table_step_min=_env_int("EPHEMERIS_TABLE_STEP_MIN", 60, minimum=5, maximum=1440),
+        recipient_name=_env_str("BRIEF_RECIPIENT_NAME", "Fatih") or "Fatih",
+        brief_recipients_file=_env_str("BRIEF_RECIPIENTS_FILE", ""),
+        brief_batch_workers=_env_int("BRIEF_BATCH_WORKERS", 4, minimum=1, maximum=32),
+        brief_batch_output_dir=_env_str("BRIEF_BATCH_OUTPUT_DIR", os.path.join("output", "briefs")),
+        etf_fallback_tickers=tuple(
+            _brief_settings_tickers(["SCHD", "QQQI", "AIS", "SCHG", "ROKT", "ARKX"], settings=brief_settings)
+        ),
+        email_user=os.environ.get("EMAIL_USER"),
+        email_pass=os.environ.get("EMAIL_PASS"),
+        email_to=os.environ.get("EMAIL_TO"),
+        email_backend=_env_str("EMAIL_BACKEND", "smtp").lower() or "smtp",
+        email_smtp_host=_env_str("EMAIL_SMTP_HOST", "smtp.gmail.com") or "smtp.gmail.com",
+        email_smtp_port=_env_int("EMAIL_SMTP_PORT", 465, minimum=1, maximum=65535),
+        email_smtp_security=_env_str("EMAIL_SMTP_SECURITY", "ssl").lower() or "ssl",
+        email_smtp_timeout_sec=_env_int("EMAIL_SMTP_TIMEOUT_SEC", 30, minimum=1, maximum=300),
+        email_pool_size=_env_int("EMAIL_POOL_SIZE", 2, minimum=1, maximum=10),
+        email_max_per_connection=_env_int("EMAIL_MAX_PER_CONNECTION", 50, minimum=1, maximum=1000),
+        email_rate_per_min=_env_int("EMAIL_RATE_PER_MIN", 20, minimum=1, maximum=6000),
+        email_max_retries=_env_int("EMAIL_MAX_RETRIES", 3, minimum=1, maximum=8),
+        email_retry_base_sec=max(0.1, _env_float("EMAIL_RETRY_BASE_SEC", 2.0)),
+        email_outbox_dir=_env_str("EMAIL_OUTBOX_DIR", os.path.join("output", "outbox")),
+    )
+
+
+_CONFIG = None
+_CONFIG_LOCK = threading.Lock()
+_CONFIG_ALIASES = {
+    "BRIEF_SETTINGS": "brief_settings",
+    "_ETF_FALLBACK_WHITELIST": "etf_fallback_tickers",
+}
+
+
+def _config():
+    """Return the memoized `EngineConfig`, building it on first use."""
+    global _CONFIG
+    config = _CONFIG
+    if config is None:
+        with _CONFIG_LOCK:
+            if _CONFIG is None:
+                _CONFIG = _load_config()
+            config = _CONFIG
+    return config
+
+
+def reload_config():
+    """Re-read `brief-settings.json` and the environment; returns the new config."""
+    global _CONFIG, _EMAIL_CLASS_STYLES, _CACHE_BACKEND, _GEMINI_HEALTH
+    with _CONFIG_LOCK:
+        _CONFIG = _load_config()
+    # Derived state is rebuilt lazily from the new config.
+    _EMAIL_CLASS_STYLES = None
+    with _CACHE_BACKEND_LOCK:
+        _CACHE_BACKEND = None
+    with _GEMINI_HEALTH_LOCK:
+        _GEMINI_HEALTH = None
+    close_email_transport()
+    return _CONFIG
+
+
+def __getattr__(name):
+    field = _CONFIG_ALIASES.get(name)
+    if field is None and name.isupper() and name.lower() in EngineConfig._fields:
+        field = name.lower()
+    if field is not None:
+        return getattr(_config(), field)
+    if name == "HTML_TEMPLATE":
+        return _html_template()
+    if name == "EMAIL_CLASS_STYLES":
+        return _email_class_styles()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --- ASTROLOGER REFERENCES ---
 ASTROLOGER_SOURCES = """
@@ -247,19 +504,14 @@ REFERANS KİTAPLAR:
 - "Astroloji: Kendini Bil" - Hande Kazanova
 """
 
-# Email Config
-EMAIL_USER = os.environ.get("EMAIL_USER")
-EMAIL_PASS = os.environ.get("EMAIL_PASS")
-EMAIL_TO = os.environ.get("EMAIL_TO")
-
 # --- THE HTML TEMPLATE (EMAIL-SAFE, TABLE-FIRST) ---
-HTML_TEMPLATE = Template("""
+_HTML_TEMPLATE_SOURCE = """
 <!DOCTYPE html>
 <html lang="tr" xmlns:v="urn:schemas-microsoft-com:vml" xmlns:o="urn:schemas-microsoft-com:office:office">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Sabah Özeti | Fatih</title>
+    <title>Sabah Özeti | $recipient_name</title>
     <style>
       body, table, td, p, a, span, div {
         font-family: $brief_font_stack;
@@ -391,7 +643,7 @@ HTML_TEMPLATE = Template("""
           <table role="presentation" cellpadding="0" cellspacing="0" border="0" width="100%" style="max-width:680px; width:100%;">
             <tr>
               <td style="padding:6px 14px; background-color:#D0D3DC; color:#4B5563; font-size:11px; text-align:right;">
-                SON GÜNCELLEME: $gen_time (Katar)
+                SON GÜNCELLEME: $gen_time ($location_label)
               </td>
             </tr>
             <tr>
@@ -426,7 +678,7 @@ HTML_TEMPLATE = Template("""
               <td style="padding:16px 18px 24px 18px; text-align:center; border-top:1px solid #D0D3DC;">
                 <p style="margin:0; font-size:12px; color:#4B5563;">Okuma süresi: ~2.5 dk</p>
                 <p style="margin:6px 0 0 0; font-size:12px; color:#4B5563;">Veri tazeliği: Hava $weather_time — Todoist $todoist_time — Finans $finance_time ($market_status)</p>
-                <p style="margin:8px 0 0 0; font-size:11px; color:#6B7280;">© 2026 Sabah Özeti - Fatih</p>
+                <p style="margin:8px 0 0 0; font-size:11px; color:#6B7280;">© 2026 Sabah Özeti - $recipient_name</p>
               </td>
             </tr>
           </table>
@@ -440,10 +692,18 @@ HTML_TEMPLATE = Template("""
     </table>
 </body>
 </html>
-""")
+"""
+_HTML_TEMPLATE = None
+
+
+def _html_template():
+    global _HTML_TEMPLATE
+    if _HTML_TEMPLATE is None:
+        _HTML_TEMPLATE = Template(_HTML_TEMPLATE_SOURCE)
+    return _HTML_TEMPLATE
 
 def get_current_time_qatar():
-    qatar_tz = pytz.timezone(TIMEZONE)
+    qatar_tz = pytz.timezone(_config().timezone)
     return datetime.datetime.now(qatar_tz)
 
 def _validate_html_template_placeholders():
@@ -458,8 +718,10 @@ def _validate_html_template_placeholders():
         "market_status",
         "brief_font_stack",
         "nav_links",
+        "recipient_name",
+        "location_label",
     }
-    template_str = HTML_TEMPLATE.template
+    template_str = _HTML_TEMPLATE_SOURCE
     # Guard against JS template literals that can hide ${...} placeholders.
     if "`" in template_str:
         raise ValueError("HTML template contains backticks; avoid JS template literals to prevent ${...} collisions.")
@@ -474,42 +736,403 @@ def _ensure_cache_dir():
     if not os.path.exists(CACHE_DIR):
         os.makedirs(CACHE_DIR, exist_ok=True)
 
-def _load_cache(name, ttl_minutes):
-    _ensure_cache_dir()
-    path = os.path.join(CACHE_DIR, name)
-    if not os.path.exists(path):
-        return None
+
+def _atomic_write_bytes(path, data):
+    """Write `data` to a temp file next to `path` and rename it into place."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=os.path.basename(path), dir=directory)
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            payload = json.load(f)
-        ts = datetime.datetime.fromisoformat(payload.get("ts"))
-        now = datetime.datetime.now(datetime.timezone.utc)
-        if (now - ts).total_seconds() <= ttl_minutes * 60:
-            return payload
-    except Exception:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class _FileLock:
+    """Exclusive advisory lock on `<CACHE_DIR>/.locks/<key>.lock` (no-op without fcntl)."""
+
+    def __init__(self, key, blocking=True):
+        lock_dir = os.path.join(CACHE_DIR, ".locks")
+        os.makedirs(lock_dir, exist_ok=True)
+        safe_key = re.sub(r"[^A-Za-z0-9_.-]", "_", key)
+        self.path = os.path.join(lock_dir, f"{safe_key}.lock")
+        self.blocking = blocking
+        self.acquired = False
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a+")
+        if fcntl is None:
+            self.acquired = True
+            return self
+        flags = fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(self._file.fileno(), flags)
+            self.acquired = True
+        except BlockingIOError:
+            self.acquired = False
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.acquired and fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self.acquired = False
+        return False
+
+
+class _CacheBackend:
+    """Stores cache entries `{"ts", "ttl", "data"}` by key, evicting LRU entries over a byte budget."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, entry):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def usage(self):
+        """Return `[(key, size_bytes, last_access_ts, entry_ts, ttl)]` for every entry."""
+        raise NotImplementedError
+
+    def lock(self, key, blocking=True):
+        return _FileLock(key, blocking=blocking)
+
+    def evict(self):
+        entries = self.usage()
+        total = sum(size for _, size, _, _, _ in entries)
+        if total <= self.max_bytes:
+            return 0
+        now = time.time()
+
+        def _priority(item):
+            _, _, accessed, entry_ts, ttl = item
+            expired = ttl is not None and entry_ts is not None and now - entry_ts > ttl
+            return (0 if expired else 1, accessed)
+
+        evicted = 0
+        for key, size, _, _, _ in sorted(entries, key=_priority):
+            if total <= self.max_bytes:
+                break
+            self.delete(key)
+            total -= size
+            evicted += 1
+        return evicted
+
+
+def _cache_entry_clock(entry):
+    """`(entry_ts, ttl)` of a cache entry for eviction: epoch seconds and TTL seconds, or None."""
+    entry_ts = _parse_iso_datetime(entry.get("ts"))
+    return (entry_ts.timestamp() if entry_ts else None), entry.get("ttl")
+
+
+# `_cache_payload` writes "ts" and "ttl" first, so eviction reads them from the file head.
+_JSON_ENTRY_HEAD_RE = re.compile(r'^\{"ts": "([^"]*)", "ttl": (null|[0-9.]+)')
+JSON_ENTRY_HEAD_BYTES = 128
+
+
+class _JSONFileCacheBackend(_CacheBackend):
+    """One JSON file per key in `CACHE_DIR`; the file mtime doubles as the LRU clock."""
+
+    def __init__(self, directory, max_bytes):
+        super().__init__(max_bytes)
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry if isinstance(entry, dict) else None
+
+    def set(self, key, entry):
+        _atomic_write_bytes(self._path(key), json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+
+    def delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def usage(self):
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            path = self._path(name)
+            if name.startswith(".") or not name.endswith(".json") or not os.path.isfile(path):
+                continue
+            try:
+                stat = os.stat(path)
+                with open(path, "r", encoding="utf-8", errors="replace") as f:
+                    head = _JSON_ENTRY_HEAD_RE.match(f.read(JSON_ENTRY_HEAD_BYTES))
+            except OSError:
+                continue
+            entry_ts, ttl = None, None
+            if head:
+                entry_ts, ttl = _cache_entry_clock({"ts": head.group(1), "ttl": json.loads(head.group(2))})
+            entries.append((name, stat.st_size, stat.st_mtime, entry_ts, ttl))
+        return entries
+
+
+class _SQLiteCacheBackend(_CacheBackend):
+    """All keys in one SQLite database (WAL mode) under `CACHE_DIR`."""
+
+    def __init__(self, path, max_bytes):
+        super().__init__(max_bytes)
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "key TEXT PRIMARY KEY, payload TEXT NOT NULL, size INTEGER NOT NULL, "
+                "entry_ts REAL, ttl REAL, accessed REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT payload FROM cache_entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE cache_entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        try:
+            entry = json.loads(row[0])
+        except ValueError:
+            return None
+        return entry if isinstance(entry, dict) else None
+
+    def set(self, key, entry):
+        payload = json.dumps(entry, ensure_ascii=False)
+        entry_ts, ttl = _cache_entry_clock(entry)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, payload, size, entry_ts, ttl, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    payload,
+                    len(payload.encode("utf-8")),
+                    entry_ts,
+                    ttl,
+                    time.time(),
+                ),
+            )
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def usage(self):
+        with self._connect() as conn:
+            return list(conn.execute("SELECT key, size, accessed, entry_ts, ttl FROM cache_entries"))
+
+
+class _MemoryCacheBackend(_CacheBackend):
+    """Process-local LRU cache; useful for tests and long-lived batch workers."""
+
+    def __init__(self, max_bytes):
+        super().__init__(max_bytes)
+        self._entries = collections.OrderedDict()
+        self._guard = threading.Lock()
+        self._key_locks = collections.defaultdict(threading.Lock)
+
+    def get(self, key):
+        with self._guard:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return json.loads(self._entries[key][0])
+
+    def set(self, key, entry):
+        payload = json.dumps(entry, ensure_ascii=False)
+        with self._guard:
+            self._entries[key] = (payload, *_cache_entry_clock(entry))
+            self._entries.move_to_end(key)
+
+    def delete(self, key):
+        with self._guard:
+            self._entries.pop(key, None)
+
+    def usage(self):
+        with self._guard:
+            # OrderedDict order is the LRU order; its position serves as the access clock.
+            return [
+                (key, len(payload.encode("utf-8")), position, entry_ts, ttl)
+                for position, (key, (payload, entry_ts, ttl)) in enumerate(self._entries.items())
+            ]
+
+    def lock(self, key, blocking=True):
+        return _ThreadLock(self._key_locks[key], blocking)
+
+
+class _ThreadLock:
+    def __init__(self, lock, blocking=True):
+        self._lock = lock
+        self.blocking = blocking
+        self.acquired = False
+
+    def __enter__(self):
+        self.acquired = self._lock.acquire(blocking=self.blocking)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.acquired:
+            self._lock.release()
+            self.acquired = False
+        return False
+
+
+_CACHE_BACKEND = None
+_CACHE_BACKEND_LOCK = threading.Lock()
+_CACHE_REFRESH_THREADS = []
+_CACHE_REFRESH_LOCK = threading.Lock()
+
+
+def _start_cache_refresh(target, name):
+    """Run a background revalidation, keeping only live threads in `_CACHE_REFRESH_THREADS`."""
+    worker = threading.Thread(target=target, name=name)
+    with _CACHE_REFRESH_LOCK:
+        _CACHE_REFRESH_THREADS[:] = [thread for thread in _CACHE_REFRESH_THREADS if thread.is_alive()]
+        _CACHE_REFRESH_THREADS.append(worker)
+    worker.start()
+    return worker
+
+
+def _join_cache_refresh_threads(timeout=None):
+    """Wait for background revalidations so their cache writes finish before exit."""
+    with _CACHE_REFRESH_LOCK:
+        workers, _CACHE_REFRESH_THREADS[:] = list(_CACHE_REFRESH_THREADS), []
+    for worker in workers:
+        worker.join(timeout)
+
+
+def _cache_backend():
+    global _CACHE_BACKEND
+    config = _config()
+    with _CACHE_BACKEND_LOCK:
+        if _CACHE_BACKEND is None:
+            if config.cache_backend == "sqlite":
+                _CACHE_BACKEND = _SQLiteCacheBackend(os.path.join(CACHE_DIR, "cache.sqlite3"), config.cache_max_bytes)
+            elif config.cache_backend == "memory":
+                _CACHE_BACKEND = _MemoryCacheBackend(config.cache_max_bytes)
+            else:
+                if config.cache_backend != "json":
+                    print(f"⚠️ Desteklenmeyen CACHE_BACKEND='{config.cache_backend}'. json kullanılıyor.")
+                _ensure_cache_dir()
+                _CACHE_BACKEND = _JSONFileCacheBackend(CACHE_DIR, config.cache_max_bytes)
+        return _CACHE_BACKEND
+
+
+def _cache_entry_age_seconds(entry):
+    ts = _parse_iso_datetime(entry.get("ts")) if isinstance(entry, dict) else None
+    if ts is None:
         return None
-    return None
+    return (datetime.datetime.now(datetime.timezone.utc) - ts).total_seconds()
 
-def _load_cache_any(name):
-    _ensure_cache_dir()
-    path = os.path.join(CACHE_DIR, name)
-    if not os.path.exists(path):
+
+def _load_cache(name, ttl_minutes=None):
+    """Return the entry for `name` if it is younger than `ttl_minutes` (or its stored TTL)."""
+    entry = _cache_backend().get(name)
+    if entry is None:
         return None
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
+    age = _cache_entry_age_seconds(entry)
+    ttl_seconds = ttl_minutes * 60 if ttl_minutes is not None else entry.get("ttl")
+    if age is None or (ttl_seconds is not None and age > ttl_seconds):
         return None
+    return entry
+
 
-def _save_cache(name, data):
-    _ensure_cache_dir()
-    path = os.path.join(CACHE_DIR, name)
-    payload = {
+def _load_cache_any(name):
+    return _cache_backend().get(name)
+
+
+def _cache_payload(data, ttl_minutes=None):
+    return {
         "ts": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "ttl": ttl_minutes * 60 if ttl_minutes is not None else None,
         "data": data,
     }
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False)
+
+
+def _evict_cache(backend):
+    try:
+        evicted = backend.evict()
+        if evicted:
+            print(f"🧹 Önbellek bütçesi ({backend.max_bytes} bayt) için {evicted} kayıt silindi.")
+    except Exception as err:
+        print(f"⚠️ Önbellek temizliği başarısız: {err}")
+
+
+def _save_cache(name, data, ttl_minutes=None):
+    backend = _cache_backend()
+    with backend.lock(name):
+        backend.set(name, _cache_payload(data, ttl_minutes))
+    _evict_cache(backend)
+
+
+def _cache_fetch(name, ttl_minutes, refresh, stale_minutes=0):
+    """Read-through cache with per-key locking and stale-while-revalidate.
+
+    A fresh entry is returned as is. An entry that expired less than
+    `stale_minutes` ago is returned immediately while `refresh()` runs in a
+    background thread. Otherwise `refresh()` runs under the key lock, so
+    concurrent runs sharing the cache directory fetch the value only once.
+    """
+    backend = _cache_backend()
+    entry = backend.get(name)
+    age = _cache_entry_age_seconds(entry) if entry else None
+    ttl_seconds = ttl_minutes * 60
+    if age is not None and age <= ttl_seconds:
+        return entry["data"]
+
+    if age is not None and age <= ttl_seconds + stale_minutes * 60:
+        def _revalidate():
+            with backend.lock(name, blocking=False) as lock:
+                if not lock.acquired:
+                    return
+                try:
+                    backend.set(name, _cache_payload(refresh(), ttl_minutes))
+                except Exception as err:
+                    print(f"⚠️ Önbellek arka plan yenilemesi başarısız ({name}): {err}")
+                    return
+            _evict_cache(backend)
+
+        _start_cache_refresh(_revalidate, f"cache-refresh-{name}")
+        return entry["data"]
+
+    with backend.lock(name):
+        entry = backend.get(name)
+        age = _cache_entry_age_seconds(entry) if entry else None
+        if age is not None and age <= ttl_seconds:
+            return entry["data"]
+        data = refresh()
+        backend.set(name, _cache_payload(data, ttl_minutes))
+    _evict_cache(backend)
+    return data
+
 
 def _format_time_for_display(dt_obj, tz_name):
     tz = pytz.timezone(tz_name)
@@ -529,40 +1152,101 @@ def _market_status_us(now_utc):
     return "Piyasa kapalı (saat dışı)"
 
 class _HTMLSanitizer(HTMLParser):
-    def __init__(self, allowed_tags, allowed_attrs):
+    """Allow-list sanitizer that can also post-process a brief in the same pass.
+
+    Besides sanitizing and inlining class styles it records section ids
+    (`<div id=...>`), swaps the first section with an id from
+    `section_replacements` for the given HTML (an empty string drops it),
+    escapes `${` sequences and, with `collect_text=True`, gathers the plain
+    text used for mood and theme scoring.
+    """
+
+    def __init__(self, policy, section_replacements=None, collect_text=False):
         super().__init__(convert_charrefs=True)
-        self.allowed_tags = allowed_tags
-        self.allowed_attrs = allowed_attrs
+        self.policy = policy
         self.parts = []
+        self.section_ids = []
+        self.text_parts = [] if collect_text else None
+        self._replacements = dict(section_replacements or {})
+        self._skip_depth = 0
+        # Rendered open tags by raw (tag, attrs); model output repeats the same few tags.
+        self._open_tags = {}
+
+    def feed(self, data):
+        # Callers feed whole documents; the pre-pass needs to see where the input ends.
+        super().feed(_neutralize_markup_declarations(data))
 
     def handle_starttag(self, tag, attrs):
-        if tag not in self.allowed_tags:
+        if self._skip_depth:
+            if tag == "div":
+                self._skip_depth += 1
+            return
+        if self.text_parts is not None:
+            self.text_parts.append(" ")
+        rule = self.policy.get(tag)
+        if rule is None:
+            return
+        attr_sanitizers, open_tag, _ = rule
+        if not attrs or not attr_sanitizers:
+            self.parts.append(open_tag)
+            return
+        key = (tag, tuple(attrs))
+        rendered = self._open_tags.get(key)
+        if rendered is not None:
+            self.parts.append(rendered)
             return
         safe_attrs = {}
         for k, v in attrs:
-            if k not in self.allowed_attrs.get(tag, set()):
+            sanitize = attr_sanitizers.get(k)
+            if sanitize is None:
                 continue
-            cleaned_value = _sanitize_attr_value(tag, k, v)
+            cleaned_value = sanitize(tag, "" if v is None else v.strip())
             if cleaned_value is not None:
                 safe_attrs[k] = cleaned_value
 
-        class_name = safe_attrs.get("class", "")
-        class_style = _style_for_classes(class_name)
-        if class_style:
-            existing = safe_attrs.get("style", "")
-            safe_attrs["style"] = _merge_styles(existing, class_style)
+        section_id = safe_attrs.get("id") if tag == "div" else None
+        if section_id:
+            self.section_ids.append(section_id)
+            replacement = self._replacements.pop(section_id, None)
+            if replacement is not None:
+                self._skip_depth = 1
+                if replacement:
+                    self.parts.append(replacement)
+                    if self.text_parts is not None:
+                        self.text_parts.append(f" {_strip_html_tags(replacement)} ")
+                return
+
+        class_name = safe_attrs.get("class")
+        if class_name:
+            class_style = _style_for_classes(class_name)
+            if class_style:
+                safe_attrs["style"] = _merge_styles(safe_attrs.get("style", ""), class_style)
 
         attr_str = "".join(
-            [f' {k}="{html.escape(str(v), quote=True)}"' for k, v in safe_attrs.items()]
+            [f' {k}="{_escape_template_like_sequences(html.escape(v, quote=True))}"' for k, v in safe_attrs.items()]
         )
-        self.parts.append(f"<{tag}{attr_str}>")
+        rendered = f"<{tag}{attr_str}>"
+        if not section_id and len(self._open_tags) < SANITIZER_MEMO_LIMIT:
+            self._open_tags[key] = rendered
+        self.parts.append(rendered)
 
     def handle_endtag(self, tag):
-        if tag in self.allowed_tags:
-            self.parts.append(f"</{tag}>")
+        if self._skip_depth:
+            if tag == "div":
+                self._skip_depth -= 1
+            return
+        if self.text_parts is not None:
+            self.text_parts.append(" ")
+        rule = self.policy.get(tag)
+        if rule is not None:
+            self.parts.append(rule[2])
 
     def handle_data(self, data):
-        self.parts.append(data)
+        if self._skip_depth:
+            return
+        if self.text_parts is not None:
+            self.text_parts.append(data)
+        self.parts.append(_escape_template_like_sequences(html.escape(data, quote=False)))
 
     def handle_entityref(self, name):
         self.parts.append(f"&{name};")
@@ -570,65 +1254,135 @@ class _HTMLSanitizer(HTMLParser):
     def handle_charref(self, name):
         self.parts.append(f"&#{name};")
 
+    def text(self):
+        return re.sub(r"\s+", " ", "".join(self.text_parts or [])).strip()
+
+
+_EMAIL_CLASS_STYLES = None
+
+
+def _email_class_styles():
+    """Inline styles per brief CSS class; rebuilt after `reload_config()` (font stacks are configurable)."""
+    global _EMAIL_CLASS_STYLES
+    styles = _EMAIL_CLASS_STYLES
+    if styles is None:
+        styles = _EMAIL_CLASS_STYLES = _build_email_class_styles(_config().brief_mono_font_stack)
+    return styles
+
+
+def _build_email_class_styles(mono_font_stack):
+    return {
+        "section-wrapper": "padding:0 0 12px 0;",
+        "card": "background-color:#FFFFFF;border:1px solid #D0D3DC;border-radius:12px;padding:16px;margin-bottom:10px;",
+        "card-header": "margin-bottom:8px;",
+        "card-title": "font-size:16px;font-weight:700;color:#1F2933;line-height:1.4;",
+        "tag": "display:inline-block;font-size:11px;font-weight:700;text-transform:uppercase;padding:3px 8px;border-radius:8px;letter-spacing:0.3px;",
+        "tag-blue": "background-color:#EAF3FA;color:#2B7CAB;border:1px solid #CDE4F4;",
+        "tag-gold": "background-color:#FDEDE5;color:#C85826;border:1px solid #F7CBB5;",
+        "tag-red": "background-color:#FDEDE5;color:#C85826;border:1px solid #F7CBB5;",
+        "tag-green": "background-color:#E9F8F0;color:#1D8F56;border:1px solid #BEE8D0;",
+        "tag-lavender": "background-color:#EEF4F8;color:#4B5563;border:1px solid #D0D3DC;",
+        "weather-card": "background-color:#F6F6F7;border:1px solid #D0D3DC;border-radius:12px;padding:14px;margin-bottom:12px;",
+        "weather-icon-wrap": "margin-bottom:10px;",
+        "weather-summary": "font-size:15px;color:#1F2933;line-height:1.5;",
+        "weather-periods": "margin-top:8px;",
+        "weather-period": "background-color:#FFFFFF;border:1px solid #D0D3DC;border-radius:10px;padding:10px;margin-bottom:8px;font-size:14px;color:#1F2933;line-height:1.45;",
+        "decision-grid": "margin-top:8px;",
+        "decision-box": "background-color:#FFFFFF;border:1px solid #D0D3DC;border-radius:10px;padding:10px;margin-bottom:8px;",
+        "d-icon": "font-size:16px;margin-right:6px;",
+        "d-label": "font-size:12px;color:#4B5563;font-weight:600;",
+        "d-val": "font-size:14px;font-weight:700;color:#1F2933;",
+        "d-good": "color:#26B46D;",
+        "d-bad": "color:#EE763A;",
+        "d-neutral": "color:#4B5563;",
+        "ticker-pill": f"display:inline-block;background-color:#FDEDE5;border:1px solid #F7CBB5;border-radius:4px;padding:2px 8px;color:#C85826;font-family:{mono_font_stack};font-size:13px;",
+        "bullet-list": "margin:0;padding-left:18px;",
+        "finance-list": "list-style:none;padding:0;margin:0;",
+        "source-link": "color:#2B7CAB;text-decoration:underline;",
+    }
+
+
+_ATTR_DIGITS_RE = re.compile(r"\d{1,4}")
+_ATTR_ROLE_RE = re.compile(r"[A-Za-z0-9_-]{1,32}")
+_ATTR_ID_RE = re.compile(r"[A-Za-z][A-Za-z0-9_-]{0,63}")
+_CLASS_TOKEN_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+_STYLE_PROPERTY_RE = re.compile(r"[a-z-]{1,40}")
+_STYLE_DANGEROUS_RE = re.compile(
+    r"(?i)(expression\s*\(|javascript\s*:|data\s*:|url\s*\(|@import|behavior\s*:|binding\s*:)"
+)
+_ALIGN_VALUES = frozenset({"left", "center", "right", "top", "middle", "bottom"})
+# Memo tables keyed by raw attribute values stop growing at this many entries,
+# so adversarial output with unique values cannot balloon memory.
+SANITIZER_MEMO_LIMIT = 4096
+
+
+def _matching_attr(pattern):
+    def _sanitize(tag, value):
+        return value if pattern.fullmatch(value) else None
+    return _sanitize
+
+
+def _sanitize_href_attr(tag, value):
+    return _sanitize_url_attr(tag, "href", value)
+
+
+def _sanitize_src_attr(tag, value):
+    return _sanitize_url_attr(tag, "src", value)
+
 
-EMAIL_CLASS_STYLES = {
-    "section-wrapper": "padding:0 0 12px 0;",
-    "card": "background-color:#FFFFFF;border:1px solid #D0D3DC;border-radius:12px;padding:16px;margin-bottom:10px;",
-    "card-header": "margin-bottom:8px;",
-    "card-title": "font-size:16px;font-weight:700;color:#1F2933;line-height:1.4;",
-    "tag": "display:inline-block;font-size:11px;font-weight:700;text-transform:uppercase;padding:3px 8px;border-radius:8px;letter-spacing:0.3px;",
-    "tag-blue": "background-color:#EAF3FA;color:#2B7CAB;border:1px solid #CDE4F4;",
-    "tag-gold": "background-color:#FDEDE5;color:#C85826;border:1px solid #F7CBB5;",
-    "tag-red": "background-color:#FDEDE5;color:#C85826;border:1px solid #F7CBB5;",
-    "tag-green": "background-color:#E9F8F0;color:#1D8F56;border:1px solid #BEE8D0;",
-    "tag-lavender": "background-color:#EEF4F8;color:#4B5563;border:1px solid #D0D3DC;",
-    "weather-card": "background-color:#F6F6F7;border:1px solid #D0D3DC;border-radius:12px;padding:14px;margin-bottom:12px;",
-    "weather-icon-wrap": "margin-bottom:10px;",
-    "weather-summary": "font-size:15px;color:#1F2933;line-height:1.5;",
-    "weather-periods": "margin-top:8px;",
-    "weather-period": "background-color:#FFFFFF;border:1px solid #D0D3DC;border-radius:10px;padding:10px;margin-bottom:8px;font-size:14px;color:#1F2933;line-height:1.45;",
-    "decision-grid": "margin-top:8px;",
-    "decision-box": "background-color:#FFFFFF;border:1px solid #D0D3DC;border-radius:10px;padding:10px;margin-bottom:8px;",
-    "d-icon": "font-size:16px;margin-right:6px;",
-    "d-label": "font-size:12px;color:#4B5563;font-weight:600;",
-    "d-val": "font-size:14px;font-weight:700;color:#1F2933;",
-    "d-good": "color:#26B46D;",
-    "d-bad": "color:#EE763A;",
-    "d-neutral": "color:#4B5563;",
-    "ticker-pill": f"display:inline-block;background-color:#FDEDE5;border:1px solid #F7CBB5;border-radius:4px;padding:2px 8px;color:#C85826;font-family:{BRIEF_MONO_FONT_STACK};font-size:13px;",
-    "bullet-list": "margin:0;padding-left:18px;",
-    "finance-list": "list-style:none;padding:0;margin:0;",
-    "source-link": "color:#2B7CAB;text-decoration:underline;",
+def _sanitize_target_attr(tag, value):
+    return "_blank" if value == "_blank" else None
+
+
+def _sanitize_align_attr(tag, value):
+    return value if value.lower() in _ALIGN_VALUES else None
+
+
+_CLASS_ATTR_MEMO = {}
+
+
+def _sanitize_class_attr(tag, value):
+    cleaned = _CLASS_ATTR_MEMO.get(value)
+    if cleaned is None:
+        cleaned = " ".join(cls for cls in value.split() if _CLASS_TOKEN_RE.fullmatch(cls))
+        if len(_CLASS_ATTR_MEMO) < SANITIZER_MEMO_LIMIT:
+            _CLASS_ATTR_MEMO[value] = cleaned
+    return cleaned
+
+
+def _sanitize_style_attr(tag, value):
+    return _sanitize_inline_style(value)
+
+
+def _sanitize_alt_attr(tag, value):
+    return value[:160]
+
+
+def _keep_attr(tag, value):
+    return value
+
+
+_ATTR_SANITIZERS = {
+    "href": _sanitize_href_attr,
+    "src": _sanitize_src_attr,
+    "target": _sanitize_target_attr,
+    **dict.fromkeys(
+        ("width", "height", "border", "cellpadding", "cellspacing", "colspan", "rowspan"), _matching_attr(_ATTR_DIGITS_RE),
+    ),
+    "role": _matching_attr(_ATTR_ROLE_RE),
+    "align": _sanitize_align_attr,
+    "valign": _sanitize_align_attr,
+    "id": _matching_attr(_ATTR_ID_RE),
+    "class": _sanitize_class_attr,
+    "style": _sanitize_style_attr,
+    "alt": _sanitize_alt_attr,
 }
 
 
 def _sanitize_attr_value(tag, attr_name, value):
     if value is None:
         return ""
-
-    attr_name = attr_name.lower()
-    value = str(value).strip()
-
-    if attr_name in {"href", "src"}:
-        return _sanitize_url_attr(tag, attr_name, value)
-    if attr_name == "target":
-        return "_blank" if value == "_blank" else None
-    if attr_name in {"width", "height", "border", "cellpadding", "cellspacing", "colspan", "rowspan"}:
-        return value if re.fullmatch(r"\d{1,4}", value) else None
-    if attr_name == "role":
-        return value if re.fullmatch(r"[A-Za-z0-9_-]{1,32}", value) else None
-    if attr_name in {"align", "valign"}:
-        return value if value.lower() in {"left", "center", "right", "top", "middle", "bottom"} else None
-    if attr_name == "id":
-        return value if re.fullmatch(r"[A-Za-z][A-Za-z0-9_-]{0,63}", value) else None
-    if attr_name == "class":
-        classes = [cls for cls in value.split() if re.fullmatch(r"[A-Za-z0-9_-]{1,64}", cls)]
-        return " ".join(classes)
-    if attr_name == "style":
-        return _sanitize_inline_style(value)
-    if attr_name == "alt":
-        return value[:160]
-    return value
+    return _ATTR_SANITIZERS.get(attr_name.lower(), _keep_attr)(tag, str(value).strip())
 
 
 def _sanitize_url_attr(tag, attr_name, value):
@@ -651,20 +1405,16 @@ def _sanitize_url_attr(tag, attr_name, value):
 def _sanitize_inline_style(style_value):
     if not style_value:
         return ""
-    dangerous = re.compile(
-        r"(?i)(expression\s*\(|javascript\s*:|data\s*:|url\s*\(|@import|behavior\s*:|binding\s*:)"
-    )
     safe_declarations = []
     for declaration in style_value.split(";"):
-        declaration = declaration.strip()
-        if not declaration or ":" not in declaration:
+        prop, sep, raw_val = declaration.partition(":")
+        if not sep:
             continue
-        prop, raw_val = declaration.split(":", 1)
         prop = prop.strip().lower()
         raw_val = raw_val.strip()
-        if not re.fullmatch(r"[a-z-]{1,40}", prop):
+        if not _STYLE_PROPERTY_RE.fullmatch(prop):
             continue
-        if dangerous.search(raw_val):
+        if _STYLE_DANGEROUS_RE.search(raw_val):
             continue
         safe_declarations.append(f"{prop}:{raw_val}")
     return ";".join(safe_declarations) + (";" if safe_declarations else "")
@@ -682,57 +1432,169 @@ def _merge_styles(existing_style, extra_style):
     return ""
 
 
+_CLASS_STYLE_MEMO = (None, {})
+
+
 def _style_for_classes(class_name):
+    """Concatenated inline styles of the brief classes in `class_name`, memoized per class string."""
+    global _CLASS_STYLE_MEMO
     if not class_name:
         return ""
-    styles = []
-    for cls in class_name.split():
-        style = EMAIL_CLASS_STYLES.get(cls)
-        if style:
-            styles.append(style)
-    return "".join(styles)
+    styles, memo = _CLASS_STYLE_MEMO
+    if styles is not _email_class_styles():
+        styles = _email_class_styles()
+        memo = {}
+        _CLASS_STYLE_MEMO = (styles, memo)
+    style = memo.get(class_name)
+    if style is None:
+        style = "".join(styles.get(cls, "") for cls in class_name.split())
+        if len(memo) < SANITIZER_MEMO_LIMIT:
+            memo[class_name] = style
+    return style
+
+
+SANITIZER_ALLOWED_TAGS = {
+    "div", "p", "ul", "li", "strong", "em", "span", "a", "br", "img",
+    "table", "tbody", "tr", "td",
+    "h2", "h3", "h4",
+}
+SANITIZER_ALLOWED_ATTRS = {
+    "div": {"class", "id", "style"},
+    "p": {"style"},
+    "ul": {"class"},
+    "li": {"class"},
+    "span": {"class", "style"},
+    "a": {"href", "target", "style", "class"},
+    "img": {"src", "alt", "width", "height", "style"},
+    "table": {"class", "style", "width", "cellpadding", "cellspacing", "border", "role"},
+    "tbody": {"class", "style"},
+    "tr": {"class", "style"},
+    "td": {"class", "style", "width", "colspan", "rowspan", "align", "valign"},
+    "h2": {"class"},
+    "h3": {"class"},
+    "h4": {"class"},
+}
 
-def _sanitize_html(raw_html):
-    allowed_tags = {
-        "div", "p", "ul", "li", "strong", "em", "span", "a", "br", "img",
-        "table", "tbody", "tr", "td",
-        "h2", "h3", "h4",
-    }
-    allowed_attrs = {
-        "div": {"class", "id", "style"},
-        "p": {"style"},
-        "ul": {"class"},
-        "li": {"class"},
-        "span": {"class", "style"},
-        "a": {"href", "target", "style", "class"},
-        "img": {"src", "alt", "width", "height", "style"},
-        "table": {"class", "style", "width", "cellpadding", "cellspacing", "border", "role"},
-        "tbody": {"class", "style"},
-        "tr": {"class", "style"},
-        "td": {"class", "style", "width", "colspan", "rowspan", "align", "valign"},
-        "h2": {"class"},
-        "h3": {"class"},
-        "h4": {"class"},
+
+def _compile_sanitizer_policy(allowed_tags, allowed_attrs):
+    """`{tag: (attr_sanitizers, open_tag, close_tag)}` lookup table for `_HTMLSanitizer`.
+
+    Tags without allowed attributes get no sanitizers, so the parser emits
+    the precomputed open tag without looking at the attributes.
+    """
+    return {
+        tag: (
+            {attr: _ATTR_SANITIZERS.get(attr, _keep_attr) for attr in allowed_attrs.get(tag, ())},
+            f"<{tag}>",
+            f"</{tag}>",
+        )
+        for tag in allowed_tags
     }
-    parser = _HTMLSanitizer(allowed_tags, allowed_attrs)
+
+
+SANITIZER_POLICY = _compile_sanitizer_policy(SANITIZER_ALLOWED_TAGS, SANITIZER_ALLOWED_ATTRS)
+BRIEF_SECTION_IDS = ["odak", "hava", "astro", "karar", "is", "todoist", "finans"]
+
+_MARKUP_DECLARATION_RE = re.compile(r"<[!?]")
+_COMMENT_CLOSE_RE = re.compile(r"--\s*>")
+
+
+def _neutralize_markup_declarations(raw_html):
+    """Drop comments, declarations and processing instructions before `HTMLParser` sees them.
+
+    The sanitizer discards these anyway, but `HTMLParser` rescans the rest
+    of the input for each unterminated one (quadratic on adversarial input)
+    and raises on unknown `<![...[` sections. Unterminated constructs, and
+    any `<` with no `>` after it, are escaped to text, which is how the
+    parser would have emitted them. Runs in linear time.
+    """
+    text = raw_html
+    if "<!" in raw_html or "<?" in raw_html:
+        parts = []
+        pos = 0
+        comments_closable = True
+        last_gt = raw_html.rfind(">")
+        while True:
+            match = _MARKUP_DECLARATION_RE.search(raw_html, pos)
+            if not match:
+                break
+            start = match.start()
+            parts.append(raw_html[pos:start])
+            if raw_html.startswith("<!--", start):
+                close = _COMMENT_CLOSE_RE.search(raw_html, start + 4) if comments_closable else None
+                end = close.end() if close else -1
+                # With no closing `-->` left, no later comment can be closed either.
+                comments_closable = close is not None
+            elif start + 2 <= last_gt:
+                end = raw_html.find(">", start + 2) + 1
+            else:
+                end = -1
+            if end < 0:
+                parts.append("&lt;")
+                pos = start + 1
+            else:
+                pos = end
+        parts.append(raw_html[pos:])
+        text = "".join(parts)
+    cut = text.rfind(">") + 1
+    if text.find("<", cut) >= 0:
+        text = text[:cut] + text[cut:].replace("<", "&lt;")
+    return text
+
+
+def _sanitize_html(raw_html):
+    parser = _HTMLSanitizer(SANITIZER_POLICY)
     parser.feed(raw_html)
+    parser.close()
     return "".join(parser.parts)
 
+
+def _missing_section_html(section_id):
+    return (
+        f'<div class="section-wrapper" id="{section_id}"><div class="card"><p>Bu bölüm şu an üretilemedi. '
+        'Lütfen tekrar deneyin.</p></div></div>'
+    )
+
+
+def _postprocess_brief_html(raw_html, enabled_sections=None, section_replacements=None):
+    """Sanitize model output and assemble the brief body in one streaming pass.
+
+    Sections in `section_replacements` are swapped for the given HTML,
+    disabled sections are dropped and enabled sections the model skipped are
+    appended (using their replacement when one was given, otherwise a short
+    placeholder card). Returns `(body_html, plain_text)`; the text feeds
+    `_score_brief_text` and `_extract_themes_from_text`.
+    """
+    enabled = _config().brief_enabled_sections if enabled_sections is None else enabled_sections
+    replacements = dict(section_replacements or {})
+    for section_id in BRIEF_SECTION_IDS:
+        if section_id not in enabled:
+            replacements[section_id] = ""
+
+    parser = _HTMLSanitizer(SANITIZER_POLICY, section_replacements=replacements, collect_text=True)
+    parser.feed(raw_html)
+    parser.close()
+
+    seen = set(parser.section_ids)
+    for section_id in enabled:
+        if section_id in seen:
+            continue
+        block = replacements.get(section_id) or _missing_section_html(section_id)
+        parser.parts.append("\n" + block)
+        parser.text_parts.append(f" {_strip_html_tags(block)} ")
+    return "".join(parser.parts), parser.text()
+
+
 def _escape_template_like_sequences(text):
     # Prevent accidental `${...}` sequences from surviving into templates or emails.
     return text.replace("${", "&#36;{")
 
-def _ensure_required_sections(raw_html):
-    required_ids = BRIEF_ENABLED_SECTIONS
+def _ensure_required_sections(raw_html, enabled_sections=None):
+    required_ids = _config().brief_enabled_sections if enabled_sections is None else enabled_sections
     missing = [sec for sec in required_ids if f'id="{sec}"' not in raw_html]
     if not missing:
         return raw_html
-    fallback_blocks = []
-    for sec in missing:
-        fallback_blocks.append(
-            f'<div class="section-wrapper" id="{sec}"><div class="card"><p>Bu bölüm şu an üretilemedi. Lütfen tekrar deneyin.</p></div></div>'
-        )
-    return raw_html + "\n" + "\n".join(fallback_blocks)
+    return raw_html + "\n" + "\n".join(_missing_section_html(sec) for sec in missing)
 
 def _replace_section_by_id(raw_html, section_id, replacement_html):
     pattern = re.compile(
@@ -760,15 +1622,38 @@ def _replace_section_by_id(raw_html, section_id, replacement_html):
     return raw_html[:match.start()] + replacement_html + raw_html[scan_pos:]
 
 
-def _filter_enabled_sections(raw_html):
-    known_ids = ["odak", "hava", "astro", "karar", "is", "todoist", "finans"]
-    for section_id in known_ids:
-        if section_id not in BRIEF_ENABLED_SECTIONS:
-            raw_html = _replace_section_by_id(raw_html, section_id, "")
-    return raw_html
+def _filter_enabled_sections(raw_html, enabled_sections=None):
+    """Drop disabled sections from trusted HTML in a single scan over its div tags."""
+    enabled = _config().brief_enabled_sections if enabled_sections is None else enabled_sections
+    drop_ids = {section_id for section_id in BRIEF_SECTION_IDS if section_id not in enabled}
+    if not drop_ids:
+        return raw_html
+
+    token_pattern = re.compile(r"<div\b[^>]*>|</div>", flags=re.IGNORECASE)
+    id_pattern = re.compile(r"\bid=[\"']([^\"']+)[\"']", flags=re.IGNORECASE)
+    kept = []
+    pos = 0
+    depth = 0
+    for token in token_pattern.finditer(raw_html):
+        is_close = token.group(0)[:2] == "</"
+        if depth:
+            depth += -1 if is_close else 1
+            if depth == 0:
+                pos = token.end()
+            continue
+        if is_close:
+            continue
+        match = id_pattern.search(token.group(0))
+        if match and match.group(1) in drop_ids:
+            drop_ids.discard(match.group(1))
+            kept.append(raw_html[pos:token.start()])
+            depth = 1
+    if not depth:
+        kept.append(raw_html[pos:])
+    return "".join(kept)
 
 
-def _build_nav_links():
+def _build_nav_links(enabled_sections=None):
     labels = {
         "odak": "🎯 Odak",
         "hava": "🌤️ Hava",
@@ -780,7 +1665,7 @@ def _build_nav_links():
     }
     links = [
         f'<a href="#{section_id}" style="color:#2B7CAB; text-decoration:none;">{labels[section_id]}</a>'
-        for section_id in BRIEF_ENABLED_SECTIONS
+        for section_id in (_config().brief_enabled_sections if enabled_sections is None else enabled_sections)
         if section_id in labels
     ]
     return " · ".join(links)
@@ -812,7 +1697,7 @@ def _todoist_rows_html(items):
     return "".join(rows)
 
 
-def _build_todoist_section_html(todoist_struct, todoist_time_display):
+def _build_todoist_section_html(todoist_struct, todoist_time_display, tz_name=DOHA_TZ):
     struct = todoist_struct if isinstance(todoist_struct, dict) else {}
     total_matched = struct.get("total_matched", 0)
     displayed = struct.get("displayed_count", 0)
@@ -842,7 +1727,7 @@ def _build_todoist_section_html(todoist_struct, todoist_time_display):
       <span class="tag tag-lavender">TODOIST</span>
       <span class="card-title" style="margin-left:8px;">Görev Durumu</span>
     </div>
-    <p style="margin:0 0 8px 0; font-size:12px; color:#4B5563;">Veri zamanı: {html.escape(todoist_time_display)} (Asia/Qatar)</p>
+    <p style="margin:0 0 8px 0; font-size:12px; color:#4B5563;">Veri zamanı: {html.escape(todoist_time_display)} ({html.escape(tz_name)})</p>
     <p style="margin:0 0 10px 0; font-size:13px; color:#1F2933;">
       Toplam görev (filtre): <strong>{total_matched}</strong> · Gösterilen: <strong>{displayed}</strong> ·
       Gecikmiş: <strong style="color:#EE763A;">{overdue_count}</strong> ·
@@ -876,46 +1761,230 @@ def _build_todoist_section_html(todoist_struct, todoist_time_display):
 """.strip()
 
 
+class _PlainTextRenderer(HTMLParser):
+    """Single-pass HTML to text converter for the plain-text email part and brief scoring.
+
+    Structured mode keeps the layout readable: block tags start new lines,
+    list items get bullets, data tables become aligned columns and links are
+    numbered `[n]` with their URLs listed as footnotes. Flat mode separates
+    tags with spaces and collapses whitespace, like the sanitizer's collected
+    text. Contents of `head`, `script` and `style` are skipped in both.
+    """
+
+    SKIPPED_TAGS = frozenset({"head", "script", "style", "title"})
+    PARAGRAPH_TAGS = frozenset({"p", "h1", "h2", "h3", "h4", "ul", "ol", "table", "blockquote"})
+    LINE_TAGS = frozenset({"div", "li", "tr", "br", "section", "header", "footer"})
+    TABLE_CELL_GAP = "  "
+    TABLE_CELL_MAX_WIDTH = 40
+
+    def __init__(self, structured=True):
+        super().__init__(convert_charrefs=True)
+        self.structured = structured
+        self.lines = []
+        self._inline = []
+        self._skip_depth = 0
+        self._lists = []
+        self._tables = []
+        self._links = []
+        self._link_numbers = {}
+        self._open_links = []
+
+    # --- output helpers ---
+
+    def _open_cell(self):
+        if self._tables and self._tables[-1]["cell"] is not None:
+            return self._tables[-1]["cell"]
+        return None
+
+    def _write(self, lines, blank=False):
+        cell = self._open_cell()
+        target = self.lines if cell is None else cell
+        target.extend(lines)
+        if blank and target and target[-1]:
+            target.append("")
+
+    def _flush(self, blank=False):
+        if not self._inline:
+            if blank:
+                self._write((), blank=True)
+            return
+        text = " ".join("".join(self._inline).split())
+        self._inline = []
+        prefix = "  " * max(0, len(self._lists) - 1)
+        self._write([prefix + text] if text else (), blank=blank)
+
+    def _close_cell(self):
+        self._flush()
+        table = self._tables[-1]
+        if table["cell"] is not None:
+            table["rows"][-1].append((table["cell"], table["span"]))
+            table["cell"] = None
+
+    def _close_table(self):
+        if self._tables[-1]["cell"] is not None:
+            self._close_cell()
+        table = self._tables.pop()
+        rows = [[(lines, span) for lines, span in row if any(lines)] for row in table["rows"]]
+        rows = [row for row in rows if row]
+        if not rows:
+            return
+        # Tables holding other tables, or only one cell per row, are email layout
+        # scaffolding: their cells read top to bottom.
+        if table["nested"] or max(len(row) for row in rows) < 2:
+            self._write([line for row in rows for lines, _ in row for line in lines], blank=True)
+            return
+        rows = [[(" ".join(line for line in lines if line), span) for lines, span in row] for row in rows]
+        columns = max(len(row) for row in rows)
+        widths = [0] * columns
+        for row in rows:
+            for i, (text, span) in enumerate(row):
+                if span == 1:
+                    widths[i] = min(self.TABLE_CELL_MAX_WIDTH, max(widths[i], len(text)))
+        self._write(
+            [self.TABLE_CELL_GAP.join(text.ljust(widths[i]) for i, (text, _) in enumerate(row)).rstrip() for row in rows],
+            blank=True,
+        )
+
+    # --- HTMLParser callbacks ---
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self._skip_depth += 1
+            return
+        if self._skip_depth:
+            return
+        if not self.structured:
+            self._inline.append(" ")
+            return
+        attrs = dict(attrs)
+        if tag == "a":
+            self._open_links.append(((attrs.get("href") or "").strip(), len(self._inline)))
+        elif tag == "img":
+            alt = (attrs.get("alt") or "").strip()
+            if alt:
+                self._inline.append(f" {alt} ")
+        elif tag in ("ul", "ol"):
+            self._flush()
+            self._lists.append([tag, 0])
+        elif tag == "li":
+            self._flush()
+            bullet = "-"
+            if self._lists:
+                self._lists[-1][1] += 1
+                if self._lists[-1][0] == "ol":
+                    bullet = f"{self._lists[-1][1]}."
+            self._inline.append(f"{bullet} ")
+        elif tag == "table":
+            self._flush()
+            if self._open_cell() is not None:
+                self._tables[-1]["nested"] = True
+            self._tables.append({"rows": [], "cell": None, "span": 1, "nested": False})
+        elif tag == "tr" and self._tables:
+            if self._tables[-1]["cell"] is not None:
+                self._close_cell()
+            self._flush()
+            self._tables[-1]["rows"].append([])
+        elif tag in ("td", "th") and self._tables:
+            table = self._tables[-1]
+            if table["cell"] is not None:
+                self._close_cell()
+            self._flush()
+            if not table["rows"]:
+                table["rows"].append([])
+            table["cell"] = []
+            table["span"] = int(attrs["colspan"]) if (attrs.get("colspan") or "").isdigit() else 1
+        elif tag in self.PARAGRAPH_TAGS or tag in self.LINE_TAGS:
+            self._flush(blank=tag in self.PARAGRAPH_TAGS)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in ("br", "img"):
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if self._skip_depth:
+            return
+        if not self.structured:
+            self._inline.append(" ")
+            return
+        if tag == "a" and self._open_links:
+            href, start = self._open_links.pop()
+            label = " ".join("".join(self._inline[start:]).split())
+            if href and not href.startswith("#") and href not in (label, f"mailto:{label}"):
+                number = self._link_numbers.get(href)
+                if number is None:
+                    self._links.append(href)
+                    number = self._link_numbers[href] = len(self._links)
+                self._inline.append(f" [{number}]")
+        elif tag in ("ul", "ol"):
+            self._flush(blank=len(self._lists) == 1)
+            if self._lists:
+                self._lists.pop()
+        elif tag in ("td", "th") and self._tables:
+            self._close_cell()
+        elif tag == "table" and self._tables:
+            self._flush()
+            self._close_table()
+        elif tag in self.PARAGRAPH_TAGS or tag in self.LINE_TAGS:
+            self._flush(blank=tag in self.PARAGRAPH_TAGS)
+
+    def handle_data(self, data):
+        # Indentation between block tags would only be collapsed away again.
+        if not self._skip_depth and (self._inline or not data.isspace()):
+            self._inline.append(data)
+
+    def text(self):
+        if not self.structured:
+            return " ".join("".join(self._inline).split())
+        self._flush()
+        while self._tables:
+            self._close_table()
+        lines = []
+        for line in self.lines:
+            if line or (lines and lines[-1]):
+                lines.append(line)
+        while lines and not lines[-1]:
+            lines.pop()
+        if self._links:
+            lines.extend(["", "Bağlantılar:"])
+            lines.extend(f"[{number}] {href}" for number, href in enumerate(self._links, start=1))
+        return "\n".join(lines).strip()
+
+
+def _render_plain_text(raw_html, structured):
+    renderer = _PlainTextRenderer(structured=structured)
+    renderer.feed(_neutralize_markup_declarations(raw_html))
+    renderer.close()
+    return renderer.text()
+
+
 def _html_to_plain_text(html_content):
-    text = re.sub(r"(?i)<br\s*/?>", "\n", html_content)
-    text = re.sub(r"(?i)</(p|div|tr|td|li|h1|h2|h3|h4)>", "\n", text)
-    text = re.sub(r"(?i)<li[^>]*>", "- ", text)
-    text = re.sub(r"(?i)<[^>]+>", "", text)
-    text = html.unescape(text)
-    lines = []
-    prev_blank = False
-    for raw_line in text.splitlines():
-        line = re.sub(r"\s+", " ", raw_line).strip()
-        if not line:
-            if not prev_blank:
-                lines.append("")
-            prev_blank = True
-            continue
-        lines.append(line)
-        prev_blank = False
-    return "\n".join(lines).strip()
+    return _render_plain_text(html_content, structured=True)
 
 
 def _log_payload_size(html_content):
     payload = len(html_content.encode("utf-8"))
     print(f"📦 HTML içeriği boyutu: {payload} bayt")
-    if payload > EMAIL_HTML_BUDGET_BYTES:
+    if payload > _config().email_html_budget_bytes:
         print(
-            f"⚠️ HTML içeriği bütçeyi aşıyor ({EMAIL_HTML_BUDGET_BYTES} bayt). "
+            f"⚠️ HTML içeriği bütçeyi aşıyor ({_config().email_html_budget_bytes} bayt). "
             "Bazı istemciler uzun e-postaları kesebilir."
         )
 
 
 def _strip_html_tags(raw_html):
-    text = re.sub(r"(?i)<br\s*/?>", "\n", raw_html)
-    text = re.sub(r"(?i)</(p|div|li|h2|h3|h4)>", "\n", text)
-    text = re.sub(r"(?i)<[^>]+>", " ", text)
-    return html.unescape(re.sub(r"\s+", " ", text)).strip()
+    return _render_plain_text(raw_html, structured=False)
 
 
 def _extract_themes(raw_html, limit=5):
-    text = _strip_html_tags(raw_html).lower()
-    words = re.findall(r"[a-zçğıöşü]{4,}", text, flags=re.IGNORECASE)
+    return _extract_themes_from_text(_strip_html_tags(raw_html), limit=limit)
+
+
+def _extract_themes_from_text(text, limit=5):
+    words = re.findall(r"[a-zçğıöşü]{4,}", text.lower(), flags=re.IGNORECASE)
     stop = {
         "içinde", "olarak", "günün", "genel", "ancak", "birlikte", "şimdi", "çünkü",
         "sonra", "kadar", "daha", "gibi", "çok", "yine", "olan", "olanlar", "için",
@@ -950,7 +2019,11 @@ WARNING_WORDS = {
 
 
 def _score_brief_mood(raw_html):
-    text = _strip_html_tags(raw_html).lower()
+    return _score_brief_text(_strip_html_tags(raw_html))
+
+
+def _score_brief_text(text):
+    text = text.lower()
     score = 0
     for word in POSITIVE_WORDS:
         score += text.count(word)
@@ -1010,27 +2083,96 @@ def _image_extension_for_mime(mime):
     return "png"
 
 
+HEADER_MANIFEST_FILE = "manifest.json"
+# Encoder per extension; the label of these settings is stored in the
+# manifest, so changing them re-normalizes every header once.
+HEADER_ENCODERS = {
+    ".jpg": ("JPEG", "RGB", {"quality": 92, "optimize": True}),
+    ".jpeg": ("JPEG", "RGB", {"quality": 92, "optimize": True}),
+    ".webp": ("WEBP", "RGB", {"quality": 92, "method": 6}),
+    ".png": ("PNG", None, {"optimize": True}),
+}
+_HEADER_MANIFEST_LOCK = threading.Lock()
+
+
+def _header_encoder(image_path):
+    return HEADER_ENCODERS.get(os.path.splitext(image_path)[1].lower(), HEADER_ENCODERS[".png"])
+
+
+def _header_encoder_label(image_path):
+    image_format, _, options = _header_encoder(image_path)
+    return " ".join([image_format, *(f"{key}={value}" for key, value in sorted(options.items()))])
+
+
+def _header_manifest_path():
+    return os.path.join(HEADER_IMAGE_DIR, HEADER_MANIFEST_FILE)
+
+
+def _load_header_manifest():
+    try:
+        with open(_header_manifest_path(), "r", encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+    files = manifest.get("files") if isinstance(manifest, dict) else None
+    return dict(files) if isinstance(files, dict) else {}
+
+
+def _save_header_manifest(files):
+    path = _header_manifest_path()
+    payload = json.dumps({"version": 1, "files": files}, indent=2, sort_keys=True, ensure_ascii=False) + "\n"
+    try:
+        with open(path, "r", encoding="utf-8") as manifest_file:
+            if manifest_file.read() == payload:
+                return
+    except OSError:
+        pass
+    _atomic_write_bytes(path, payload.encode("utf-8"))
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _header_manifest_current(entry, digest, image_path, target_w, target_h):
+    return bool(entry) and entry.get("sha256") == digest and entry.get("encoder") == _header_encoder_label(image_path) \
+        and (entry.get("width"), entry.get("height")) == (target_w, target_h)
+
+
 def _header_reference_dimensions():
-    Image = _get_pil_image()
     reference = os.path.join(HEADER_IMAGE_DIR, "mood-5-5.png")
     if os.path.exists(reference):
+        # A manifest entry for the unchanged reference avoids opening the image.
+        entry = _load_header_manifest().get(os.path.basename(reference)) or {}
         try:
-            with Image.open(reference) as img:
+            if entry.get("sha256") == _header_content_hash(reference) and entry.get("width") and entry.get("height"):
+                return entry["width"], entry["height"]
+            with _get_pil_image().open(reference) as img:
                 w, h = img.size
             if w > 0 and h > 0:
                 return w, h
         except Exception as err:
             print(f"⚠️ Header referans ölçüsü okunamadı ({reference}): {err}")
-    return HEADER_TARGET_WIDTH, HEADER_TARGET_HEIGHT
+    return _config().header_target_width, _config().header_target_height
 
 
 def _normalize_header_image(image_path, target_w, target_h):
+    """Center-crop and resize `image_path` in place; return True when it has the target size.
+
+    An image that already has the target size is left byte-for-byte as is.
+    """
     try:
         Image = _get_pil_image()
         with Image.open(image_path) as src:
             src_w, src_h = src.size
             if src_w <= 0 or src_h <= 0:
-                return
+                return False
+            if (src_w, src_h) == (target_w, target_h):
+                return True
 
             target_ratio = target_w / float(target_h)
             src_ratio = src_w / float(src_h)
@@ -1050,26 +2192,72 @@ def _normalize_header_image(image_path, target_w, target_h):
             cropped = src.crop((left, top, right, bottom))
             resized = cropped.resize((target_w, target_h), Image.Resampling.LANCZOS)
 
-            extension = os.path.splitext(image_path)[1].lower()
-            if extension in (".jpg", ".jpeg"):
-                resized = resized.convert("RGB")
-                resized.save(image_path, format="JPEG", quality=92, optimize=True)
-            elif extension == ".webp":
-                resized = resized.convert("RGB")
-                resized.save(image_path, format="WEBP", quality=92, method=6)
-            else:
-                if resized.mode not in ("RGB", "RGBA"):
-                    resized = resized.convert("RGBA")
-                resized.save(image_path, format="PNG", optimize=True)
+            image_format, mode, options = _header_encoder(image_path)
+            if mode:
+                resized = resized.convert(mode)
+            elif resized.mode not in ("RGB", "RGBA"):
+                resized = resized.convert("RGBA")
+            resized.save(image_path, format=image_format, **options)
+        return True
     except Exception as err:
         print(f"⚠️ Header normalizasyonu başarısız ({image_path}): {err}")
+        return False
 
 
-def _normalize_mood_header_variants(mood_level, target_w, target_h):
-    variants = _existing_mood_header_variants(mood_level)
-    for _, image_path in sorted(variants.items()):
-        _normalize_header_image(image_path, target_w, target_h)
-    return variants
+def _record_header_manifest(paths, target_w, target_h):
+    """Store hash, size and encoder settings of normalized `paths` in the manifest.
+
+    File length and mtime are stored too, so `_header_content_hash` can tell
+    whether the file changed after it was indexed.
+    """
+    if not paths:
+        return
+    with _HEADER_MANIFEST_LOCK:
+        files = _load_header_manifest()
+        for image_path in paths:
+            stat = os.stat(image_path)
+            files[os.path.basename(image_path)] = {
+                "sha256": _file_sha256(image_path),
+                "width": target_w,
+                "height": target_h,
+                "encoder": _header_encoder_label(image_path),
+                "bytes": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            }
+        _save_header_manifest(files)
+
+
+def _normalize_header_files(paths, target_w, target_h):
+    """Normalize the files among `paths` that are new or changed since the manifest was written.
+
+    Unchanged files are only hashed. Stale files are normalized in a process
+    pool of `HEADER_NORMALIZE_WORKERS` (in-process for a single file or when
+    the pool is unavailable) and recorded in the manifest afterwards.
+    """
+    with _HEADER_MANIFEST_LOCK:
+        files = _load_header_manifest()
+    stale = [
+        path for path in paths
+        if not _header_manifest_current(files.get(os.path.basename(path)), _file_sha256(path), path, target_w, target_h)
+    ]
+    if not stale:
+        return
+
+    workers = min(_config().header_normalize_workers, len(stale))
+    results = None
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(
+                    _normalize_header_image, stale, [target_w] * len(stale), [target_h] * len(stale),
+                ))
+        except Exception as err:
+            print(f"⚠️ Header normalizasyon süreç havuzu kullanılamadı, tek süreçte devam ediliyor: {err}")
+    if results is None:
+        results = [_normalize_header_image(path, target_w, target_h) for path in stale]
+    normalized = [path for path, ok in zip(stale, results) if ok]
+    _record_header_manifest(normalized, target_w, target_h)
+    print(f"🖼️ {len(normalized)}/{len(stale)} yeni veya değişmiş header normalize edildi.")
 
 
 def _all_mood_levels_in_headers():
@@ -1089,12 +2277,15 @@ def _all_mood_levels_in_headers():
 
 def _normalize_all_mood_headers():
     target_w, target_h = _header_reference_dimensions()
+    paths = []
     for level in _all_mood_levels_in_headers():
-        _normalize_mood_header_variants(level, target_w, target_h)
+        variants = _existing_mood_header_variants(level)
+        paths.extend(variants[key] for key in sorted(variants))
+    _normalize_header_files(paths, target_w, target_h)
 
 
-def _build_header_image_prompt(mood, raw_html, date_str, variant_index):
-    themes = _extract_themes(raw_html, limit=5)
+def _build_header_image_prompt(mood, brief_text, date_str, variant_index):
+    themes = _extract_themes_from_text(brief_text, limit=5)
     theme_text = ", ".join(themes) if themes else "astroloji, finans, hava, odak"
     return f"""
 Türkçe sabah özeti için modern ve soyut bir kapak görseli üret.
@@ -1115,15 +2306,199 @@ Kurallar:
 """
 
 
+def _header_content_hash(image_path):
+    """sha256 of a header file, read from the header manifest when it indexes the file.
+
+    The manifest hash is used only while the file keeps the length and mtime
+    recorded with it; otherwise the file is hashed again.
+    """
+    if os.path.dirname(os.path.abspath(image_path)) == os.path.abspath(HEADER_IMAGE_DIR):
+        with _HEADER_MANIFEST_LOCK:
+            entry = _load_header_manifest().get(os.path.basename(image_path)) or {}
+        stat = os.stat(image_path)
+        if entry.get("sha256") and (entry.get("bytes"), entry.get("mtime_ns")) == (stat.st_size, stat.st_mtime_ns):
+            return entry["sha256"]
+    return _file_sha256(image_path)
+
+
+def _publish_static_asset(image_path, digest):
+    """Copy `image_path` to `STATIC_ASSET_DIR` as `<stem>.<hash><ext>` once; return the published path.
+
+    Published files are immutable: an existing name is never rewritten.
+    """
+    stem, ext = os.path.splitext(os.path.basename(image_path))
+    target_dir = _config().static_asset_dir
+    published = os.path.join(target_dir, f"{stem}.{digest[:12]}{ext.lower()}")
+    if not os.path.exists(published):
+        os.makedirs(target_dir, exist_ok=True)
+        part_path = f"{published}.part"
+        with open(image_path, "rb") as src, open(part_path, "wb") as dst:
+            dst.write(src.read())
+        os.replace(part_path, published)
+        print(f"📤 Statik görsel yayımlandı: {published}")
+    return published
+
+
 def _hero_image_public_url(image_path):
+    """Public URL of a header file, versioned by its content hash.
+
+    With `STATIC_ASSET_DIR` the file is published under a hash-named,
+    immutable path and served from `STATIC_ASSET_BASE_URL` (or the raw
+    GitHub URL of that path) without a query string. Otherwise the raw
+    GitHub URL of the file gets `?v=<hash>`, so a variant picked again on a
+    later day keeps the same URL and stays cacheable.
+    """
+    config = _config()
     repo = os.environ.get("GITHUB_REPOSITORY") or "ustunfatih/morning-brief"
     branch = os.environ.get("GITHUB_REF_NAME") or "main"
+    digest = _header_content_hash(image_path)
+    if config.static_asset_dir:
+        published = _publish_static_asset(image_path, digest)
+        if config.static_asset_base_url:
+            return f"{config.static_asset_base_url.rstrip('/')}/{urllib.parse.quote(os.path.basename(published))}"
+        rel_path = published.replace(os.sep, "/")
+        return f"https://raw.githubusercontent.com/{repo}/{branch}/{rel_path}"
     rel_path = image_path.replace(os.sep, "/")
-    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d%H%M%S")
-    return f"https://raw.githubusercontent.com/{repo}/{branch}/{rel_path}?v={stamp}"
+    return f"https://raw.githubusercontent.com/{repo}/{branch}/{rel_path}?v={digest[:12]}"
+
+
+HERO_DISPLAY_WIDTH = 680
+HEADER_DERIVATIVE_DENSITIES = (1, 2)
+# Derivative encoders; `quality` is searched per image to fit HEADER_IMAGE_BUDGET_KB.
+HEADER_DERIVATIVE_FORMATS = {
+    "webp": ("WEBP", {"method": 6}),
+    "jpg": ("JPEG", {"optimize": True, "progressive": True}),
+}
+HEADER_DERIVATIVE_QUALITY_RANGE = (30, 90)
+
+
+def _header_derived_dir():
+    return os.path.join(HEADER_IMAGE_DIR, "derived")
+
+
+def _encode_under_budget(image, image_format, options, budget_bytes):
+    """Encode `image` at the highest quality that fits `budget_bytes`; return `(bytes, quality)`.
+
+    When even the lowest quality is over budget, the lowest-quality encoding
+    is returned.
+    """
+    def _encode(quality):
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, quality=quality, **options)
+        return buffer.getvalue()
+
+    low, high = HEADER_DERIVATIVE_QUALITY_RANGE
+    best = None
+    while low <= high:
+        quality = (low + high) // 2
+        data = _encode(quality)
+        if len(data) <= budget_bytes:
+            best = (data, quality)
+            low = quality + 1
+        else:
+            high = quality - 1
+    return best or (_encode(HEADER_DERIVATIVE_QUALITY_RANGE[0]), HEADER_DERIVATIVE_QUALITY_RANGE[0])
+
+
+def _header_derivative_key(sha256, budget_bytes):
+    settings = json.dumps(
+        [HEADER_DERIVATIVE_FORMATS, HEADER_DERIVATIVE_QUALITY_RANGE, budget_bytes, HERO_DISPLAY_WIDTH], sort_keys=True,
+    )
+    return hashlib.sha256(f"{sha256}\x00{settings}".encode("utf-8")).hexdigest()[:12]
+
+
+def _header_derivatives(image_path):
+    """1x/2x WebP and progressive JPEG renditions of a header variant.
+
+    Renditions live in `assets/headers/derived/` under names carrying a hash
+    of the source and the encoder settings, so they are reused (and their
+    URLs stay valid) until either changes; renditions of an older version of
+    the same variant are removed. Densities wider than
+    the source are skipped. Each entry is a dict with `path`, `format`,
+    `density`, `width`, `height` and `bytes`, sorted by density and size.
+    """
+    config = _config()
+    Image = _get_pil_image()
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    sha256 = _file_sha256(image_path)
+    derived_dir = _header_derived_dir()
+    budget_bytes = config.header_image_budget_kb * 1024
+    digest = _header_derivative_key(sha256, budget_bytes)
+
+    entry = _load_header_manifest().get(os.path.basename(image_path)) or {}
+    if entry.get("sha256") == sha256 and entry.get("width") and entry.get("height"):
+        source_w, source_h = entry["width"], entry["height"]
+    else:
+        with Image.open(image_path) as src:
+            source_w, source_h = src.size
+
+    renditions = []
+    pending = []
+    for density in HEADER_DERIVATIVE_DENSITIES:
+        width = HERO_DISPLAY_WIDTH * density
+        if width > source_w:
+            continue
+        height = max(1, int(round(source_h * width / float(source_w))))
+        for ext in HEADER_DERIVATIVE_FORMATS:
+            rendition = {
+                "path": os.path.join(derived_dir, f"{stem}-{digest}@{density}x.{ext}"),
+                "format": ext, "density": density, "width": width, "height": height,
+            }
+            if os.path.exists(rendition["path"]):
+                rendition["bytes"] = os.path.getsize(rendition["path"])
+                renditions.append(rendition)
+            else:
+                pending.append(rendition)
+
+    if pending:
+        os.makedirs(derived_dir, exist_ok=True)
+        with Image.open(image_path) as src:
+            source = src.convert("RGB")
+        for rendition in pending:
+            image_format, options = HEADER_DERIVATIVE_FORMATS[rendition["format"]]
+            resized = source.resize((rendition["width"], rendition["height"]), Image.Resampling.LANCZOS)
+            data, quality = _encode_under_budget(resized, image_format, options, budget_bytes)
+            name = os.path.basename(rendition["path"])
+            part_path = f"{rendition['path']}.part"
+            with open(part_path, "wb") as out:
+                out.write(data)
+            os.replace(part_path, rendition["path"])
+            rendition["bytes"] = len(data)
+            renditions.append(rendition)
+            if len(data) > budget_bytes:
+                print(f"⚠️ Header türevi bütçeyi aşıyor, e-postada kullanılmayacak ({name}: {len(data)} > {budget_bytes} bayt).")
+            else:
+                print(f"🖼️ Header türevi üretildi: {name} ({len(data)} bayt, kalite {quality})")
+
+        pattern = re.compile(rf"^{re.escape(stem)}-([0-9a-f]+)@\d+x\.\w+$")
+        for filename in os.listdir(derived_dir):
+            match = pattern.match(filename)
+            if match and match.group(1) != digest:
+                os.remove(os.path.join(derived_dir, filename))
 
+    return sorted(renditions, key=lambda r: (r["density"], r["bytes"]))
 
-def _build_hero_image_markup(image_url, mood, date_str, todoist_struct=None):
+
+def _pick_hero_renditions(renditions, budget_bytes):
+    """`(fallback, by_density)`: the smallest 1x JPEG and the smallest in-budget rendition per density."""
+    jpegs = [r for r in renditions or [] if r["format"] == "jpg"]
+    fallback = min(jpegs, key=lambda r: (r["density"], r["bytes"])) if jpegs else None
+    by_density = {}
+    for rendition in sorted(renditions or [], key=lambda r: r["bytes"]):
+        if rendition["bytes"] <= budget_bytes or rendition is fallback:
+            by_density.setdefault(rendition["density"], rendition)
+    return fallback, by_density
+
+
+def _build_hero_image_markup(image_url, mood, date_str, todoist_struct=None,
+                             recipient_name=None, location_label=DOHA_LABEL, renditions=None):
+    """Hero block for `image_url`, or for the best fitting of its `renditions`.
+
+    With renditions, Outlook (VML), the `background` attribute and clients
+    without CSS `image-set()` get the smallest 1x JPEG; other clients pick
+    the smallest WebP/JPEG rendition for their pixel density.
+    """
+    recipient_name = recipient_name or _config().recipient_name
     struct = todoist_struct if isinstance(todoist_struct, dict) else {}
     task_count = _safe_int(struct.get("displayed_count"), 0)
     overdue_count = _safe_int(struct.get("overdue_count"), 0)
@@ -1153,6 +2528,8 @@ def _build_hero_image_markup(image_url, mood, date_str, todoist_struct=None):
         "margin:6px 0 0 0; font-size:13px; color:#F6F6F7; "
         "text-shadow:0 1px 4px rgba(0,0,0,0.45); line-height:1.35; mso-line-height-rule:exactly;"
     )
+    greeting = html.escape(f"Günaydın, {recipient_name}.")
+    location_text = html.escape(location_label)
     text_wrap_style = (
         "display:inline-block; background-color:#1F2933; background-color:rgba(31,41,51,0.55); "
         "padding:10px 12px; border-radius:10px; font-size:16px; line-height:1.45;"
@@ -1168,8 +2545,8 @@ def _build_hero_image_markup(image_url, mood, date_str, todoist_struct=None):
           <td align="left" valign="bottom" style="padding:18px; font-size:14px; line-height:1.3;">
             <div style="{text_wrap_style}">
               <p style="{badge_style}">📅 {date_str}</p><span style="{mood_badge_style}">Ruh Skoru: {mood_score}/5</span><span style="{task_badge_style}">{task_badge_text}</span>
-              <p style="{title_style}">Günaydın, Fatih.</p>
-              <p style="{subtitle_style}">📍 Doha, Katar · {mood['label']}</p>
+              <p style="{title_style}">{greeting}</p>
+              <p style="{subtitle_style}">📍 {location_text} · {mood['label']}</p>
             </div>
           </td>
         </tr>
@@ -1179,10 +2556,17 @@ def _build_hero_image_markup(image_url, mood, date_str, todoist_struct=None):
 </table>
 """.strip()
 
+    image_set_css = ""
+    fallback, by_density = _pick_hero_renditions(renditions, _config().header_image_budget_kb * 1024)
+    if fallback:
+        image_url = fallback["url"]
+        if len(by_density) > 1 or by_density.get(1, fallback) is not fallback:
+            candidates = ", ".join(f"url('{r['url']}') {density}x" for density, r in sorted(by_density.items()))
+            image_set_css = f"background-image:image-set({candidates}); "
     background_style = (
         f"height:220px; vertical-align:top; "
         f"background-color:{mood['overlay']}; "
-        f"background-image:url('{image_url}'); background-size:cover; background-position:center center; background-repeat:no-repeat; "
+        f"background-image:url('{image_url}'); {image_set_css}background-size:cover; background-position:center center; background-repeat:no-repeat; "
         f"font-size:0; line-height:0; mso-line-height-rule:exactly; overflow:hidden;"
     )
     return f"""
@@ -1199,8 +2583,8 @@ def _build_hero_image_markup(image_url, mood, date_str, todoist_struct=None):
           <td align="left" valign="bottom" style="padding:18px; font-size:14px; line-height:1.3;">
             <div style="{text_wrap_style}">
               <p style="{badge_style}">📅 {date_str}</p><span style="{mood_badge_style}">Ruh Skoru: {mood_score}/5</span><span style="{task_badge_style}">{task_badge_text}</span>
-              <p style="{title_style}">Günaydın, Fatih.</p>
-              <p style="{subtitle_style}">📍 Doha, Katar · {mood['label']}</p>
+              <p style="{title_style}">{greeting}</p>
+              <p style="{subtitle_style}">📍 {location_text} · {mood['label']}</p>
             </div>
           </td>
         </tr>
@@ -1236,47 +2620,104 @@ def _header_model_candidates():
     model_candidates = []
     if requested:
         model_candidates.append(requested)
-    model_candidates.extend([GEMINI_IMAGE_MODEL, "gemini-3.1-flash-image-preview"])
+    model_candidates.extend([_config().gemini_image_model, "gemini-3.1-flash-image-preview"])
     seen = set()
     return [m for m in model_candidates if not (m in seen or seen.add(m))]
 
 
-def _ensure_mood_header_pool(client, mood, raw_html, date_str):
+def _generate_mood_header_variant(client, mood, brief_text, date_str, variant_index, target_w, target_h):
+    """Generate, normalize and store one pool variant; return `(path, model)` or `(None, "")`.
+
+    The image is written to a `.part` file first so concurrent readers of
+    the pool never see a half-written or not yet normalized header.
+    """
+    mood_level = _safe_int(mood.get("level"), 3)
+    prompt = _build_header_image_prompt(mood, brief_text, date_str, variant_index)
+    for model_name in _header_model_candidates():
+        try:
+            response = client.models.generate_content(model=model_name, contents=[prompt])
+            image_bytes, mime = _extract_image_payload(response)
+            if not image_bytes:
+                continue
+            ext = _image_extension_for_mime(mime)
+            image_path = os.path.join(HEADER_IMAGE_DIR, f"mood-{mood_level}-{variant_index}.{ext}")
+            part_path = os.path.join(HEADER_IMAGE_DIR, f"mood-{mood_level}-{variant_index}.part.{ext}")
+            with open(part_path, "wb") as img_file:
+                img_file.write(image_bytes)
+            normalized = _normalize_header_image(part_path, target_w, target_h)
+            os.replace(part_path, image_path)
+            if normalized:
+                _record_header_manifest([image_path], target_w, target_h)
+            print(f"🖼️ Mood header üretildi ({model_name}) -> {image_path}")
+            return image_path, model_name
+        except Exception as err:
+            print(f"⚠️ Mood header üretimi başarısız ({model_name}, varyasyon {variant_index}): {err}")
+    print(f"⚠️ Mood={mood_level} varyasyon={variant_index} üretilemedi.")
+    return None, ""
+
+
+# (mood level, variant index) pairs currently being generated, so batch
+# workers and background fills never request the same variant twice.
+_HEADER_POOL_PENDING = set()
+
+
+def _ensure_mood_header_pool(client, mood, brief_text, date_str):
+    """Fill the variant pool of `mood`'s level; return `(variants, model_used)`.
+
+    Missing variants are generated concurrently by up to
+    `HEADER_POOL_WORKERS` threads. With `HEADER_POOL_BACKGROUND` the pool
+    returns as soon as one variant exists and the rest keep generating in
+    the background; the worker threads are joined when the process exits.
+    Existing variants are expected to be normalized already by
+    `_normalize_all_mood_headers`.
+    """
+    config = _config()
     mood_level = _safe_int(mood.get("level"), 3)
     target_w, target_h = _header_reference_dimensions()
-    variants = _normalize_mood_header_variants(mood_level, target_w, target_h)
-    if len(variants) >= HEADER_POOL_SIZE:
+    variants = _existing_mood_header_variants(mood_level)
+    if len(variants) >= config.header_pool_size:
+        return variants, "pool-cache"
+
+    missing = [
+        index for index in range(1, config.header_pool_size + 1)
+        if index not in variants and (mood_level, index) not in _HEADER_POOL_PENDING
+    ]
+    if not missing:
         return variants, "pool-cache"
 
     os.makedirs(HEADER_IMAGE_DIR, exist_ok=True)
-    used_model = ""
-    for variant_index in range(1, HEADER_POOL_SIZE + 1):
-        if variant_index in variants:
-            continue
+    _HEADER_POOL_PENDING.update((mood_level, index) for index in missing)
 
-        prompt = _build_header_image_prompt(mood, raw_html, date_str, variant_index)
-        generated = False
-        for model_name in _header_model_candidates():
-            try:
-                response = client.models.generate_content(model=model_name, contents=[prompt])
-                image_bytes, mime = _extract_image_payload(response)
-                if not image_bytes:
-                    continue
-                ext = _image_extension_for_mime(mime)
-                image_path = os.path.join(HEADER_IMAGE_DIR, f"mood-{mood_level}-{variant_index}.{ext}")
-                with open(image_path, "wb") as img_file:
-                    img_file.write(image_bytes)
-                _normalize_header_image(image_path, target_w, target_h)
-                variants[variant_index] = image_path
-                used_model = model_name
-                generated = True
-                print(f"🖼️ Mood header üretildi ({model_name}) -> {image_path}")
+    def _generate(variant_index):
+        try:
+            return _generate_mood_header_variant(
+                client, mood, brief_text, date_str, variant_index, target_w, target_h,
+            )
+        finally:
+            _HEADER_POOL_PENDING.discard((mood_level, variant_index))
+
+    executor = ThreadPoolExecutor(
+        max_workers=min(config.header_pool_workers, len(missing)), thread_name_prefix="header-pool",
+    )
+    used_model = ""
+    try:
+        pending = {executor.submit(_generate, index) for index in missing}
+        if config.header_pool_background and variants:
+            print(f"🖼️ Mood={mood_level} havuzundaki {len(missing)} eksik varyasyon arka planda üretilecek.")
+            return variants, "pool-cache"
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                image_path, model_name = future.result()
+                if image_path:
+                    used_model = used_model or model_name
+            if used_model and config.header_pool_background:
+                if pending:
+                    print(f"🖼️ Mood={mood_level} havuzundaki {len(pending)} varyasyon arka planda üretilmeye devam ediyor.")
                 break
-            except Exception as err:
-                print(f"⚠️ Mood header üretimi başarısız ({model_name}, varyasyon {variant_index}): {err}")
-        if not generated:
-            print(f"⚠️ Mood={mood_level} varyasyon={variant_index} üretilemedi.")
-    variants = _normalize_mood_header_variants(mood_level, target_w, target_h)
+    finally:
+        executor.shutdown(wait=False)
+    variants = _existing_mood_header_variants(mood_level)
     return variants, used_model
 
 
@@ -1289,13 +2730,27 @@ def _select_mood_header_path(variants, now_qatar):
     return ordered[selected_index]
 
 
-def _generate_daily_header_image(client, raw_html, date_str, mood, now_qatar):
-    _normalize_all_mood_headers()
-    variants, model_used = _ensure_mood_header_pool(client, mood, raw_html, date_str)
-    selected_path = _select_mood_header_path(variants, now_qatar.date())
+_HEADER_POOL_LOCK = threading.Lock()
+
+
+def _generate_daily_header_image(client, brief_text, date_str, mood, now_qatar, normalize_all=True):
+    # Batch workers share assets/headers; only one may normalize or fill the pool at a time.
+    with _HEADER_POOL_LOCK:
+        if normalize_all:
+            _normalize_all_mood_headers()
+        variants, model_used = _ensure_mood_header_pool(client, mood, brief_text, date_str)
+        selected_path = _select_mood_header_path(variants, now_qatar.date())
+        renditions = []
+        if selected_path and _config().header_derivatives:
+            try:
+                renditions = _header_derivatives(selected_path)
+            except Exception as err:
+                print(f"⚠️ Header türevleri üretilemedi ({selected_path}): {err}")
     if selected_path:
-        return _hero_image_public_url(selected_path), model_used or "pool-cache"
-    return "", ""
+        for rendition in renditions:
+            rendition["url"] = _hero_image_public_url(rendition["path"])
+        return _hero_image_public_url(selected_path), model_used or "pool-cache", renditions
+    return "", "", []
 
 def format_date_str(now):
     months = ["", "Ocak", "Şubat", "Mart", "Nisan", "Mayıs", "Haziran", "Temmuz", "Ağustos", "Eylül", "Ekim", "Kasım", "Aralık"]
@@ -1304,7 +2759,8 @@ def format_date_str(now):
 
 
 def _text_model_candidates():
-    candidates = [GEMINI_MODEL] + GEMINI_FALLBACK_MODELS
+    config = _config()
+    candidates = [config.gemini_model, *config.gemini_fallback_models]
     seen = set()
     return [model for model in candidates if model and not (model in seen or seen.add(model))]
 
@@ -1325,6 +2781,14 @@ def _get_astrological_subject_factory():
     return AstrologicalSubjectFactory
 
 
+def _get_swisseph():
+    try:
+        import swisseph
+    except ImportError as err:
+        raise RuntimeError("pyswisseph paketi kurulu değil. `pip install -r requirements.txt` çalıştırılmalı.") from err
+    return swisseph
+
+
 def _get_yfinance():
     try:
         import yfinance as yf
@@ -1333,12 +2797,21 @@ def _get_yfinance():
     return yf
 
 
+def _get_numpy():
+    try:
+        import numpy
+    except ImportError as err:
+        raise RuntimeError("numpy paketi kurulu değil. `pip install -r requirements.txt` çalıştırılmalı.") from err
+    return numpy
+
+
 def _create_genai_client(api_key):
     try:
         from google import genai
     except ImportError as err:
         raise RuntimeError("google-genai paketi kurulu değil. `pip install -r requirements.txt` çalıştırılmalı.") from err
-    return genai.Client(api_key=api_key)
+    # Bounds each HTTP call, including ones a hedge or section deadline already gave up on.
+    return genai.Client(api_key=api_key, http_options={"timeout": int(_config().gemini_http_timeout_sec * 1000)})
 
 
 def _is_transient_gemini_error(err):
@@ -1356,264 +2829,1157 @@ def _is_transient_gemini_error(err):
     return any(marker in err_text for marker in transient_markers)
 
 
-def _generate_content_with_retry(client, prompt):
-    last_err = None
-    for model_name in _text_model_candidates():
-        for attempt in range(1, GEMINI_MAX_RETRIES + 1):
-            try:
-                if model_name != GEMINI_MODEL:
-                    print(f"ℹ️ Yedek model deneniyor: {model_name}")
-                return client.models.generate_content(model=model_name, contents=prompt)
-            except Exception as err:
-                last_err = err
-                if not _is_transient_gemini_error(err) or attempt >= GEMINI_MAX_RETRIES:
-                    break
-                wait_seconds = GEMINI_RETRY_BASE_SEC * (2 ** (attempt - 1))
-                print(
-                    f"⚠️ Gemini geçici hata ({model_name}, deneme {attempt}/{GEMINI_MAX_RETRIES}): {err}. "
-                    f"{wait_seconds:.1f}s sonra tekrar denenecek."
-                )
-                time.sleep(wait_seconds)
-    raise last_err if last_err else RuntimeError("Gemini yanıtı alınamadı.")
-
-def send_email(html_content, date_str):
-    print("--- 📧 E-POSTA GÖNDERİM SÜRECİ BAŞLADI ---")
-    
-    # Debug Checks
-    if not EMAIL_USER:
-        print("❌ HATA: 'EMAIL_USER' secret tanımlı değil!")
-        return
-    if not EMAIL_PASS:
-        print("❌ HATA: 'EMAIL_PASS' secret tanımlı değil!")
-        return
-    if not EMAIL_TO:
-        print("❌ HATA: 'EMAIL_TO' secret tanımlı değil!")
-        return
+GEMINI_HEALTH_CACHE = "gemini-health.json"
+GEMINI_LATENCY_SAMPLES = 20
+GEMINI_MIN_LATENCY_SAMPLES = 5
+GEMINI_MAX_BACKOFF_SEC = 60.0
 
-    print(f"✅ Kimlik bilgileri bulundu. Gönderen: {_mask_for_log(EMAIL_USER)} -> Alıcı: {_mask_for_log(EMAIL_TO)}")
 
-    msg = MIMEMultipart("alternative")
-    msg["Subject"] = f"Sabah Özeti: {date_str}"
-    msg["From"] = EMAIL_USER
-    msg["To"] = EMAIL_TO
+class _ModelHealth:
+    """Per-model latency history and circuit breaker, persisted in the cache between runs.
 
-    plain_text = _html_to_plain_text(html_content)
-    msg.attach(MIMEText(plain_text, "plain", "utf-8"))
-    msg.attach(MIMEText(html_content, "html", "utf-8"))
+    State per model: the last `GEMINI_LATENCY_SAMPLES` successful call
+    latencies, the count of consecutive failures and `open_until` (epoch
+    seconds). A breaker opens after `GEMINI_BREAKER_THRESHOLD` consecutive
+    failed calls (a call fails once its retries are exhausted) and lets one
+    trial request through once the cooldown has passed. Updates passing a
+    set `cancelled` event are dropped: they come from hedged calls that lost
+    after the caller already saved the state.
+    """
 
-    try:
-        print("🔌 Gmail SMTP sunucusuna (smtp.gmail.com:465) bağlanılıyor...")
-        server = smtplib.SMTP_SSL("smtp.gmail.com", 465)
-        
-        print("🔐 Giriş yapılıyor...")
-        server.login(EMAIL_USER, EMAIL_PASS)
-        
-        print("📨 Mesaj gönderiliyor...")
-        server.sendmail(EMAIL_USER, EMAIL_TO, msg.as_string())
-        
-        server.quit()
-        print("✅ BAŞARILI: E-posta başarıyla gönderildi!")
-    except smtplib.SMTPAuthenticationError:
-        print("❌ HATA: Kullanıcı adı veya şifre yanlış! (App Password kullandığından emin misin?)")
-    except Exception as e:
-        print(f"❌ BEKLENMEYEN HATA: {str(e)}")
+    def __init__(self, state=None):
+        self.state = state if isinstance(state, dict) else {}
+        self._lock = threading.Lock()
+
+    def _model(self, model_name):
+        entry = self.state.get(model_name)
+        if not isinstance(entry, dict):
+            entry = self.state[model_name] = {}
+        entry.setdefault("latencies", [])
+        entry.setdefault("failures", 0)
+        entry.setdefault("open_until", 0.0)
+        return entry
+
+    def is_open(self, model_name):
+        with self._lock:
+            return self._model(model_name)["open_until"] > time.time()
+
+    def hedge_delay(self, model_name):
+        """Seconds to wait on `model_name` before hedging: its latency percentile, or the default."""
+        config = _config()
+        with self._lock:
+            latencies = sorted(self._model(model_name)["latencies"])
+        if len(latencies) < GEMINI_MIN_LATENCY_SAMPLES:
+            return config.gemini_hedge_after_sec
+        rank = -(-config.gemini_hedge_percentile * len(latencies) // 100)
+        return max(0.1, latencies[min(len(latencies), rank) - 1])
+
+    def record_success(self, model_name, latency, cancelled=None):
+        with self._lock:
+            if cancelled is not None and cancelled.is_set():
+                return
+            entry = self._model(model_name)
+            entry["latencies"] = (entry["latencies"] + [round(latency, 3)])[-GEMINI_LATENCY_SAMPLES:]
+            entry["failures"] = 0
+            entry["open_until"] = 0.0
+
+    def record_failure(self, model_name, cancelled=None):
+        """Count a failed call; returns True when this opens the breaker."""
+        config = _config()
+        with self._lock:
+            if cancelled is not None and cancelled.is_set():
+                return False
+            entry = self._model(model_name)
+            entry["failures"] += 1
+            if entry["failures"] < config.gemini_breaker_threshold:
+                return False
+            entry["open_until"] = time.time() + config.gemini_breaker_cooldown_min * 60
+        print(
+            f"🔌 {model_name} için devre kesici açıldı ({config.gemini_breaker_threshold} ardışık hata); "
+            f"{config.gemini_breaker_cooldown_min} dk atlanacak."
+        )
+        return True
 
-def _weather_icon_class(code):
-    """Map WMO weather code to icon class: sunny, partly-cloudy, cloudy, rainy, stormy."""
-    if code in (0, 1):
-        return "sunny"
-    elif code in (2, 3):
-        return "cloudy"
-    elif code in (45, 48):
-        return "cloudy"
-    elif code in (51, 53, 55, 61, 63, 65, 80, 81, 82):
-        return "rainy"
-    elif code in (71, 73, 75):
-        return "cloudy"
-    elif code in (95, 96, 99):
-        return "stormy"
-    return "partly-cloudy"
+    def save(self):
+        with self._lock:
+            snapshot = json.loads(json.dumps(self.state))
+        try:
+            _save_cache(GEMINI_HEALTH_CACHE, snapshot)
+        except Exception as err:
+            print(f"⚠️ Gemini model sağlık durumu kaydedilemedi: {err}")
 
 
-WEATHER_ICON_IMAGES = {
-    "sunny": ("https://cdn.jsdelivr.net/gh/twitter/twemoji@14.0.2/assets/72x72/2600.png", "Güneşli"),
-    "partly-cloudy": ("https://cdn.jsdelivr.net/gh/twitter/twemoji@14.0.2/assets/72x72/26c5.png", "Parçalı bulutlu"),
-    "cloudy": ("https://cdn.jsdelivr.net/gh/twitter/twemoji@14.0.2/assets/72x72/2601.png", "Bulutlu"),
-    "rainy": ("https://cdn.jsdelivr.net/gh/twitter/twemoji@14.0.2/assets/72x72/1f327.png", "Yağmurlu"),
-    "stormy": ("https://cdn.jsdelivr.net/gh/twitter/twemoji@14.0.2/assets/72x72/26c8.png", "Fırtınalı"),
-}
+_GEMINI_HEALTH = None
+_GEMINI_HEALTH_LOCK = threading.Lock()
 
 
-def _weather_icon_image_html(icon_key):
-    src, alt = WEATHER_ICON_IMAGES.get(icon_key, WEATHER_ICON_IMAGES["partly-cloudy"])
-    return (
-        f'<img src="{src}" alt="{alt}" width="40" height="40" '
-        'style="display:block;width:40px;height:40px;border:0;outline:none;margin:0 0 8px 0;" />'
-    )
+def _gemini_health():
+    global _GEMINI_HEALTH
+    with _GEMINI_HEALTH_LOCK:
+        if _GEMINI_HEALTH is None:
+            entry = _load_cache_any(GEMINI_HEALTH_CACHE)
+            _GEMINI_HEALTH = _ModelHealth(entry.get("data") if isinstance(entry, dict) else None)
+        return _GEMINI_HEALTH
 
 
-def get_weather_data():
-    """Fetch hourly weather forecast for Doha using Open-Meteo API (no API key needed)."""
-    try:
-        cached = _load_cache("weather.json", ttl_minutes=60)
-        if cached:
-            return cached["data"]["text"], cached["data"]["icon"], cached["data"]["fetched_at"]
-
-        # WMO weather code descriptions in Turkish
-        wmo_codes = {
-            0: "Açık", 1: "Az bulutlu", 2: "Parçalı bulutlu", 3: "Bulutlu",
-            45: "Sisli", 48: "Kırağılı sis",
-            51: "Hafif çisenti", 53: "Çisenti", 55: "Yoğun çisenti",
-            61: "Hafif yağmur", 63: "Yağmur", 65: "Şiddetli yağmur",
-            71: "Hafif kar", 73: "Kar", 75: "Yoğun kar",
-            80: "Hafif sağanak", 81: "Sağanak", 82: "Şiddetli sağanak",
-            95: "Gök gürültülü fırtına", 96: "Dolu ile fırtına", 99: "Şiddetli dolu fırtınası",
-        }
+def _gemini_retry_hint(err):
+    """Server-suggested wait in seconds (`Retry-After` header or RetryInfo `retryDelay`), if any."""
+    headers = getattr(getattr(err, "response", None), "headers", None)
+    if headers is not None:
+        try:
+            return max(0.0, float(headers.get("Retry-After")))
+        except (TypeError, ValueError):
+            pass
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", str(err))
+    return float(match.group(1)) if match else None
 
-        params = urllib.parse.urlencode({
-            "latitude": DOHA_LAT,
-            "longitude": DOHA_LNG,
-            "hourly": "temperature_2m,relative_humidity_2m,apparent_temperature,weather_code,wind_speed_10m",
-            "timezone": "Asia/Qatar",
-            "forecast_days": 1,
-        })
-        url = f"https://api.open-meteo.com/v1/forecast?{params}"
 
-        req = urllib.request.Request(url, headers={"User-Agent": "MorningBrief/1.0"})
-        with urllib.request.urlopen(req, timeout=15) as resp:
-            data = json.loads(resp.read().decode())
+def _jittered_backoff(base_sec, attempt, max_sec=GEMINI_MAX_BACKOFF_SEC):
+    """Exponential backoff with equal jitter, so callers that failed together do not retry together."""
+    ceiling = min(max_sec, base_sec * (2 ** (attempt - 1)))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
 
-        hourly = data.get("hourly", {})
-        times = hourly.get("time", [])
-        temps = hourly.get("temperature_2m", [])
-        feels = hourly.get("apparent_temperature", [])
-        humidity = hourly.get("relative_humidity_2m", [])
-        codes = hourly.get("weather_code", [])
-        wind = hourly.get("wind_speed_10m", [])
 
-        if not times:
-            return "(Hava durumu verisi alınamadı.)", "partly-cloudy", datetime.datetime.now(datetime.timezone.utc).isoformat()
+def _gemini_retry_delay(err, attempt):
+    """Exponential backoff with equal jitter, never shorter than the server's retry hint."""
+    delay = _jittered_backoff(_config().gemini_retry_base_sec, attempt)
+    hint = _gemini_retry_hint(err)
+    if hint is not None:
+        delay = max(delay, min(hint, GEMINI_MAX_BACKOFF_SEC))
+    return delay
 
-        lines = []
-        for i in range(len(times)):
-            hour = times[i].split("T")[1][:5]
-            desc = wmo_codes.get(codes[i], f"Kod:{codes[i]}")
-            lines.append(
-                f"  {hour} | {temps[i]:.0f}°C (hissedilen {feels[i]:.0f}°C) | {desc} | "
-                f"Nem %{humidity[i]:.0f} | Rüzgar {wind[i]:.0f} km/s"
-            )
 
-        # Determine dominant weather condition (daytime hours 6-20)
-        daytime_codes = [codes[i] for i in range(len(times)) if 6 <= int(times[i].split("T")[1][:2]) <= 20]
-        if daytime_codes:
-            from collections import Counter
-            most_common_code = Counter(daytime_codes).most_common(1)[0][0]
-            dominant = _weather_icon_class(most_common_code)
-        else:
-            dominant = _weather_icon_class(codes[0])
+GEMINI_CONTEXT_CACHE_REFRESH_FRACTION = 0.25
 
-        # Summary stats
-        temp_max = max(temps)
-        temp_min = min(temps)
-        summary = f"  Gün özeti: Min {temp_min:.0f}°C / Max {temp_max:.0f}°C"
 
-        weather_text = f"""DOHA HAVA DURUMU (Open-Meteo - Saatlik Tahmin):
-{summary}
+def _gemini_context_registry_name(model_name):
+    return f"gemini-context-{re.sub(r'[^A-Za-z0-9_.-]', '_', model_name)}.json"
 
-Saatlik detay:
-""" + "\n".join(lines)
 
-        fetched_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
-        _save_cache("weather.json", {"text": weather_text, "icon": dominant, "fetched_at": fetched_at})
-        return weather_text, dominant, fetched_at
+def _gemini_context_cache(client, model_name, prefix):
+    """Name of a cached-content handle holding `prefix` for `model_name`, or None.
 
-    except Exception as e:
-        print(f"⚠️ Hava durumu hatası: {e}")
-        return "(Hava durumu verisi alınamadı.)", "partly-cloudy", datetime.datetime.now(datetime.timezone.utc).isoformat()
+    The handle is tracked in the engine cache together with the prefix hash
+    and its expiry. A matching handle is reused and its TTL is extended once
+    less than a quarter of `GEMINI_CONTEXT_CACHE_TTL_MIN` remains; a changed
+    prefix deletes the old handle and registers a new one. Prefixes below
+    `GEMINI_CONTEXT_CACHE_MIN_TOKENS` and failed registrations are remembered
+    for one TTL so they are not retried on every run.
+    """
+    config = _config()
+    ttl_sec = config.gemini_context_cache_ttl_min * 60
+    digest = hashlib.sha256(f"{model_name}\x00{prefix}".encode("utf-8")).hexdigest()
+    registry = _gemini_context_registry_name(model_name)
+    with _FileLock("gemini-context"):
+        entry = (_load_cache_any(registry) or {}).get("data") or {}
+        now = time.time()
+        name = entry.get("name")
+        if entry.get("hash") == digest:
+            if entry.get("skip_until", 0) > now:
+                return None
+            remaining = entry.get("expire_at", 0) - now
+            if name and remaining > ttl_sec * GEMINI_CONTEXT_CACHE_REFRESH_FRACTION:
+                return name
+            if name and remaining > 60:
+                try:
+                    client.caches.update(name=name, config={"ttl": f"{ttl_sec}s"})
+                except Exception as err:
+                    print(f"⚠️ Gemini bağlam önbelleği süresi uzatılamadı ({name}): {err}")
+                else:
+                    _save_cache(registry, dict(entry, expire_at=now + ttl_sec))
+                    print(f"⏳ Gemini bağlam önbelleği süresi uzatıldı ({name}).")
+                    return name
+        elif name:
+            try:
+                client.caches.delete(name=name)
+                print(f"🗑️ Önek değiştiği için eski Gemini bağlam önbelleği silindi ({name}).")
+            except Exception as err:
+                print(f"⚠️ Eski Gemini bağlam önbelleği silinemedi ({name}): {err}")
 
+        if _estimate_tokens(prefix) < config.gemini_context_cache_min_tokens:
+            print(
+                f"ℹ️ Prompt öneki (~{_estimate_tokens(prefix)} token) bağlam önbelleği için çok kısa "
+                f"(GEMINI_CONTEXT_CACHE_MIN_TOKENS={config.gemini_context_cache_min_tokens})."
+            )
+            _save_cache(registry, {"hash": digest, "skip_until": now + ttl_sec})
+            return None
+        try:
+            cached = client.caches.create(
+                model=model_name,
+                config={"contents": [prefix], "ttl": f"{ttl_sec}s", "display_name": f"morning-brief-{digest[:12]}"},
+            )
+        except Exception as err:
+            print(f"⚠️ Gemini bağlam önbelleği oluşturulamadı ({model_name}): {err}")
+            _save_cache(registry, {"hash": digest, "skip_until": now + ttl_sec})
+            return None
+        expire_time = getattr(cached, "expire_time", None)
+        expire_at = expire_time.timestamp() if isinstance(expire_time, datetime.datetime) else now + ttl_sec
+        _save_cache(registry, {"hash": digest, "name": cached.name, "expire_at": expire_at})
+        print(f"📌 Gemini bağlam önbelleği oluşturuldu ({cached.name}, ~{_estimate_tokens(prefix)} token önek).")
+        return cached.name
 
-_ETF_FALLBACK_WHITELIST = _brief_settings_tickers(["SCHD", "QQQI", "AIS", "SCHG", "ROKT", "ARKX"])
-_resolved_etf_tickers: list[str] = []  # populated by get_financial_data()
-_portfolio_display_tickers: dict[str, str] = {}
 
+def _forget_gemini_context_cache(model_name):
+    registry = _gemini_context_registry_name(model_name)
+    with _FileLock("gemini-context"):
+        _cache_backend().delete(registry)
 
-def _parse_decimal_number(value, default=0.0):
-    if value is None:
-        return default
-    text = str(value).strip()
-    if not text:
-        return default
-    text = re.sub(r"[^0-9,.\-]", "", text)
-    if not text or text in {"-", ".", ","}:
-        return default
-    if "," in text and "." in text:
-        if text.rfind(",") > text.rfind("."):
-            text = text.replace(".", "").replace(",", ".")
-        else:
-            text = text.replace(",", "")
-    elif "," in text:
-        text = text.replace(",", ".")
-    try:
-        return float(text)
-    except ValueError:
-        return default
 
+def _gemini_context_request(client, prompt, prefix):
+    """`{model, name, contents}` for sending only the suffix of `prompt` to the primary model, or None."""
+    config = _config()
+    if not prefix or not config.gemini_context_cache or not prompt.startswith(prefix):
+        return None
+    name = _gemini_context_cache(client, config.gemini_model, prefix)
+    if not name:
+        return None
+    return {"model": config.gemini_model, "name": name, "contents": prompt[len(prefix):]}
 
-def _normalize_market_ticker(raw_ticker):
-    ticker = str(raw_ticker or "").strip().upper()
-    if not ticker or ticker == "TOTAL":
-        return "", ""
-    display = ticker
-    if ":" in ticker:
-        ticker = ticker.split(":", 1)[1].strip()
-    ticker = ticker.replace(" ", "")
-    if not re.fullmatch(r"[A-Z0-9.\-]{1,12}", ticker):
-        return "", ""
-    return ticker, display
 
+def _generate_with_model(client, prompt, model_name, health, cancelled, generation_config=None, context_cache=None):
+    """Retry one model until it answers, its retries run out or `cancelled` is set.
 
-def _extract_portfolio_tickers_from_rows(rows, header_row_num, ticker_col, holdings_col):
-    header_index = header_row_num - 1
-    if len(rows) <= header_index:
-        raise ValueError(f"Header row {header_row_num} okunamadı.")
+    Only the exhausted call counts as one breaker failure, not each attempt.
+    When `context_cache` targets this model only its `contents` are sent,
+    referencing the cached prefix; if the handle is rejected the full
+    `prompt` is sent instead.
+    """
+    config = _config()
+    use_cache = bool(context_cache) and context_cache["model"] == model_name
+    if use_cache:
+        contents = context_cache["contents"]
+        generation_config = dict(generation_config or {}, cached_content=context_cache["name"])
+    else:
+        contents = prompt
+    extra = {"config": generation_config} if generation_config else {}
+    for attempt in range(1, config.gemini_max_retries + 1):
+        started = time.monotonic()
+        try:
+            response = client.models.generate_content(model=model_name, contents=contents, **extra)
+        except Exception as err:
+            if use_cache and not _is_transient_gemini_error(err):
+                print(f"⚠️ Gemini bağlam önbelleği kullanılamadı ({model_name}): {err}. Tam prompt gönderiliyor.")
+                _forget_gemini_context_cache(model_name)
+                generation_config = {k: v for k, v in generation_config.items() if k != "cached_content"}
+                return _generate_with_model(client, prompt, model_name, health, cancelled, generation_config or None)
+            if not _is_transient_gemini_error(err) or attempt >= config.gemini_max_retries:
+                health.record_failure(model_name, cancelled)
+                raise
+            wait_seconds = _gemini_retry_delay(err, attempt)
+            print(
+                f"⚠️ Gemini geçici hata ({model_name}, deneme {attempt}/{config.gemini_max_retries}): {err}. "
+                f"{wait_seconds:.1f}s sonra tekrar denenecek."
+            )
+            if cancelled.wait(wait_seconds):
+                raise
+            continue
+        health.record_success(model_name, time.monotonic() - started, cancelled)
+        return response
+    raise RuntimeError(f"Gemini yanıtı alınamadı: {model_name}")
+
+
+def _generate_content_with_retry(client, prompt, generation_config=None, context_cache=None, deadline=None):
+    """Generate with the primary model, hedging to the next candidate when it is slow.
+
+    Models whose circuit breaker is open are skipped (all of them are tried
+    if every breaker is open). When the running request has not answered
+    within its model's latency percentile (`GEMINI_HEDGE_PERCENTILE`), the
+    next candidate starts in parallel; a model that gives up hands over at
+    once. The first successful response wins and the rest are cancelled
+    between attempts; their late outcomes no longer touch the saved health.
+    Past `deadline` (a `time.monotonic()` value) it raises `TimeoutError`;
+    calls still in flight then end with their HTTP timeout and do not retry.
+    """
+    config = _config()
+    health = _gemini_health()
+    candidates = _text_model_candidates()
+    pending = [model for model in candidates if not health.is_open(model)]
+    for model_name in candidates:
+        if model_name not in pending:
+            print(f"⏭️ {model_name} devre kesici açık olduğu için atlanıyor.")
+    if not pending:
+        pending = list(candidates)
+
+    cancelled = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="gemini")
+    running = {}
+    last_err = None
 
-    header = [str(h).strip() for h in rows[header_index]]
-    ticker_idx = header.index(ticker_col)
-    holdings_idx = header.index(holdings_col)
+    def launch():
+        model_name = pending.pop(0)
+        if model_name != config.gemini_model:
+            print(f"ℹ️ Yedek model deneniyor: {model_name}")
+        future = executor.submit(
+            _generate_with_model, client, prompt, model_name, health, cancelled, generation_config, context_cache,
+        )
+        running[future] = model_name
+        return health.hedge_delay(model_name)
 
-    tickers = []
-    display_map = {}
-    for raw_row in rows[header_index + 1:]:
-        row = list(raw_row)
-        while len(row) <= max(ticker_idx, holdings_idx):
-            row.append("")
-        ticker, display_ticker = _normalize_market_ticker(row[ticker_idx])
-        if not ticker:
-            continue
-        holdings = _parse_decimal_number(row[holdings_idx])
-        if holdings > 0:
-            tickers.append(ticker)
-            display_map[ticker] = display_ticker
-    return tickers, display_map
+    try:
+        hedge_after = launch()
+        while running:
+            timeout = hedge_after if pending else None
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done and deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Gemini yanıtı süre sınırında gelmedi ({', '.join(running.values())}).")
+            if not done:
+                slow = list(running.values())[-1]
+                print(f"⏱️ {slow} {hedge_after:.1f}s içinde yanıt vermedi; {pending[0]} paralel başlatılıyor.")
+                hedge_after = launch()
+                continue
+            for future in done:
+                running.pop(future)
+                try:
+                    return future.result()
+                except Exception as err:
+                    last_err = err
+            if pending:
+                hedge_after = launch()
+        raise last_err if last_err else RuntimeError("Gemini yanıtı alınamadı.")
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        health.save()
+
+
+def _normalize_prompt(prompt):
+    """Strip indentation and collapse blank runs so formatting-only edits keep the same key."""
+    lines = [line.strip() for line in prompt.strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+def _settings_fingerprint():
+    """Hash of the settings that shape a generated brief (no secrets)."""
+    config = _config()
+    settings = {
+        "brief_settings": config.brief_settings,
+        "fallback_models": list(config.gemini_fallback_models),
+        "email_render_mode": config.email_render_mode,
+        "theme_profile": config.theme_profile,
+    }
+    encoded = json.dumps(settings, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
 
 
-def _get_portfolio_tickers_from_sheets():
-    """Read current ETF/stock tickers from Google Sheets where holdings > 0.
+# Display timestamps and ephemeris degrees move every few minutes; the cache key
+# keeps only their date and the signs so a re-run the same day still hits.
+_PROMPT_TIMESTAMP_RE = re.compile(r"\b(\d{2}\.\d{2}\.\d{4}) \d{2}:\d{2}\b")
+_PROMPT_DEGREE_RE = re.compile(r"\d+(?:\.\d+)?°(?!C)")
 
-    Requires env vars:
-      GSHEETS_SPREADSHEET_ID       - ID from the spreadsheet URL
-      GOOGLE_SERVICE_ACCOUNT_JSON  - base64-encoded service account JSON key
-    Optional:
-      GSHEETS_SHEET_NAME           - tab name (default: Dashboard v2)
-      GSHEETS_HEADER_ROW           - 1-based row containing headers (default: 6)
-      GSHEETS_TICKER_COLUMN        - column header (default: Ticker)
-      GSHEETS_HOLDINGS_COLUMN      - column header (default: Shares)
-      GSHEETS_READ_RANGE           - bounded range to read (default: sheet data range)
 
-    Returns a list of ticker strings, or None if the integration is not
+def _prompt_fingerprint(prompt):
+    text = _PROMPT_TIMESTAMP_RE.sub(r"\1", _normalize_prompt(prompt))
+    return _PROMPT_DEGREE_RE.sub("°", text)
+
+
+def _prompt_timestamps(prompt):
+    return [match.group(0) for match in _PROMPT_TIMESTAMP_RE.finditer(prompt)]
+
+
+def _restamp_cached_text(text, old_stamps, new_stamps):
+    """Replace the timestamps a cached reply copied from its prompt with the current ones."""
+    mapping = {}
+    for old, new in zip(old_stamps, new_stamps):
+        if old != new:
+            mapping.setdefault(old, new)
+    if not mapping:
+        return text
+    pattern = re.compile("|".join(re.escape(old) for old in mapping))
+    return pattern.sub(lambda match: mapping[match.group(0)], text)
+
+
+def _gemini_cache_name(model_name, prompt, generation_config=None):
+    parts = [model_name, _settings_fingerprint(), _prompt_fingerprint(prompt)]
+    if generation_config:
+        parts.append(json.dumps(generation_config, sort_keys=True, ensure_ascii=False))
+    digest = hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+    return f"gemini-{digest[:32]}.json"
+
+
+def _valid_reply(text, validate):
+    if not text:
+        return False
+    if validate is None:
+        return True
+    try:
+        validate(text)
+    except Exception as err:
+        print(f"⚠️ Gemini yanıtı doğrulanamadı, önbelleğe alınmıyor: {err}")
+        return False
+    return True
+
+
+def _generate_brief_content(client, prompt, day, generation_config=None, cached_prefix=None, validate=None,
+                            deadline=None):
+    """`_generate_content_with_retry` behind a content-addressed response cache.
+
+    The key covers the primary model, the normalized prompt (display times
+    reduced to their date, ephemeris degrees dropped), the settings
+    fingerprint and any `generation_config` (response schema). A stored
+    response is reused while it is younger than `GEMINI_CACHE_TTL_MIN` and
+    was generated on the same calendar `day` (ISO date in the recipient's
+    time zone). `GEMINI_CACHE_BYPASS=1` always calls the API; the fresh
+    response still replaces the stored one. On a miss, a `cached_prefix` of
+    `prompt` is served from Gemini context caching when it is enabled.
+    A `validate` callable that raises keeps a reply out of the cache (and
+    skips a stored one), so a malformed answer is not replayed all day.
+    `deadline` is passed on to `_generate_content_with_retry`.
+    """
+    config = _config()
+    if config.gemini_cache_ttl_min <= 0:
+        return _generate_content_with_retry(
+            client, prompt, generation_config, _gemini_context_request(client, prompt, cached_prefix), deadline,
+        )
+
+    cache_name = _gemini_cache_name(config.gemini_model, prompt, generation_config)
+    if not config.gemini_cache_bypass:
+        entry = _load_cache(cache_name, ttl_minutes=config.gemini_cache_ttl_min)
+        data = entry.get("data") if entry else None
+        if isinstance(data, dict) and data.get("day") == day and _valid_reply(data.get("text"), validate):
+            print(f"♻️ Gemini yanıtı önbellekten kullanıldı ({data.get('model')}, {cache_name}).")
+            text = _restamp_cached_text(data["text"], data.get("stamps") or [], _prompt_timestamps(prompt))
+            return types.SimpleNamespace(text=text)
+
+    response = _generate_content_with_retry(
+        client, prompt, generation_config, _gemini_context_request(client, prompt, cached_prefix), deadline,
+    )
+    text = getattr(response, "text", None)
+    if _valid_reply(text, validate):
+        _save_cache(
+            cache_name,
+            {
+                "text": text,
+                "day": day,
+                "stamps": _prompt_timestamps(prompt),
+                "model": getattr(response, "model_version", None) or config.gemini_model,
+            },
+            ttl_minutes=config.gemini_cache_ttl_min,
+        )
+    return response
+
+class EmailDeliveryError(RuntimeError):
+    def __init__(self, message, transient=False):
+        self.transient = transient
+        super().__init__(message)
+
+
+class _TokenBucket:
+    """Thread-safe token bucket: `rate_per_sec` tokens refill up to `capacity`."""
+
+    def __init__(self, rate_per_sec, capacity=1):
+        self.rate_per_sec = float(rate_per_sec)
+        self.capacity = max(1.0, float(capacity))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_sec)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_seconds = (tokens - self._tokens) / self.rate_per_sec
+            time.sleep(wait_seconds)
+
+
+def _is_transient_smtp_error(err):
+    import smtplib
+
+    if isinstance(err, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(err, smtplib.SMTPResponseException):
+        return 400 <= err.smtp_code < 500
+    if isinstance(err, (smtplib.SMTPRecipientsRefused, smtplib.SMTPNotSupportedError)):
+        return False
+    # SMTPServerDisconnected, SMTPConnectError, socket timeouts and resets.
+    return isinstance(err, OSError)
+
+
+def _smtp_error_message(err):
+    import smtplib
+
+    if isinstance(err, smtplib.SMTPAuthenticationError):
+        return "Kullanıcı adı veya şifre yanlış! (App Password kullandığından emin misin?)"
+    return f"SMTP gönderimi başarısız: {err}"
+
+
+class _EmailTransport:
+    """Delivers `email.message.Message` objects; `send_many` may reuse connections."""
+
+    name = "base"
+
+    def send(self, message):
+        raise NotImplementedError
+
+    def send_many(self, messages):
+        """Send each message; returns one `None` (delivered) or exception per message."""
+        return [self._try_send(message) for message in messages]
+
+    def _try_send(self, message):
+        try:
+            self.send(message)
+        except Exception as err:
+            return err
+        return None
+
+    def close(self):
+        pass
+
+
+class _FileEmailTransport(_EmailTransport):
+    """Writes each message as an `.eml` file into `directory` (local runs and tests)."""
+
+    name = "file"
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def send(self, message):
+        digest = hashlib.sha256(message.as_bytes()).hexdigest()[:12]
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        path = os.path.join(self.directory, f"{stamp}-{digest}.eml")
+        _atomic_write_bytes(path, message.as_bytes())
+        return path
+
+
+class _SMTPConnection:
+    def __init__(self, server):
+        self.server = server
+        self.sent = 0
+
+
+class _SMTPEmailTransport(_EmailTransport):
+    """Pool of authenticated SMTP connections shared by all sending threads.
+
+    Connections are reused for up to `max_per_connection` messages, sends
+    are paced by `limiter` and transient failures (4xx replies, dropped
+    connections, timeouts) are retried on a fresh connection with
+    exponential backoff.
+    """
+
+    name = "smtp"
+
+    def __init__(self, host, port, user, password, security="ssl", timeout=30, pool_size=2,
+                 max_per_connection=50, limiter=None, max_retries=3, retry_base_sec=2.0, connect=None):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.security = security
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_per_connection = max_per_connection
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.retry_base_sec = retry_base_sec
+        self._connect_fn = connect or self._open_server
+        self._idle = collections.deque()
+        self._idle_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _open_server(self):
+        import smtplib
+
+        if self.security == "ssl":
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == "starttls":
+                server.starttls()
+        if self.user and self.password:
+            server.login(self.user, self.password)
+        return server
+
+    def _checkout(self):
+        self._slots.acquire()
+        with self._idle_lock:
+            if self._idle:
+                return self._idle.popleft()
+        try:
+            print(f"🔌 SMTP sunucusuna ({self.host}:{self.port}) bağlanılıyor...")
+            return _SMTPConnection(self._connect_fn())
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, connection, healthy):
+        if healthy and connection.sent < self.max_per_connection:
+            with self._idle_lock:
+                self._idle.append(connection)
+        else:
+            self._quit(connection)
+        self._slots.release()
+
+    @staticmethod
+    def _quit(connection):
+        try:
+            connection.server.quit()
+        except Exception:
+            pass
+
+    def send(self, message):
+        last_err = None
+        for attempt in range(1, self.max_retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                connection = self._checkout()
+            except Exception as err:
+                last_err = err
+            else:
+                try:
+                    connection.server.send_message(message)
+                except Exception as err:
+                    self._checkin(connection, healthy=False)
+                    last_err = err
+                else:
+                    connection.sent += 1
+                    self._checkin(connection, healthy=True)
+                    return None
+            transient = _is_transient_smtp_error(last_err)
+            if not transient or attempt >= self.max_retries:
+                raise EmailDeliveryError(_smtp_error_message(last_err), transient=transient) from last_err
+            wait_seconds = _jittered_backoff(self.retry_base_sec, attempt)
+            print(
+                f"⚠️ SMTP geçici hata (deneme {attempt}/{self.max_retries}): {last_err}. "
+                f"{wait_seconds:.1f}s sonra tekrar denenecek."
+            )
+            time.sleep(wait_seconds)
+        return None
+
+    def send_many(self, messages):
+        messages = list(messages)
+        if len(messages) <= 1 or self.pool_size <= 1:
+            return super().send_many(messages)
+        workers = min(self.pool_size, len(messages))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="smtp-send") as executor:
+            return list(executor.map(self._try_send, messages))
+
+    def close(self):
+        with self._idle_lock:
+            idle, self._idle = list(self._idle), collections.deque()
+        for connection in idle:
+            self._quit(connection)
+
+
+_EMAIL_TRANSPORT = None
+_EMAIL_TRANSPORT_LOCK = threading.Lock()
+
+
+def _email_transport():
+    global _EMAIL_TRANSPORT
+    config = _config()
+    with _EMAIL_TRANSPORT_LOCK:
+        if _EMAIL_TRANSPORT is None:
+            if config.email_backend == "file":
+                _EMAIL_TRANSPORT = _FileEmailTransport(config.email_outbox_dir)
+            else:
+                if config.email_backend != "smtp":
+                    print(f"⚠️ Desteklenmeyen EMAIL_BACKEND='{config.email_backend}'. smtp kullanılıyor.")
+                _EMAIL_TRANSPORT = _SMTPEmailTransport(
+                    config.email_smtp_host,
+                    config.email_smtp_port,
+                    config.email_user,
+                    config.email_pass,
+                    security=config.email_smtp_security,
+                    timeout=config.email_smtp_timeout_sec,
+                    pool_size=config.email_pool_size,
+                    max_per_connection=config.email_max_per_connection,
+                    limiter=_TokenBucket(config.email_rate_per_min / 60.0, capacity=config.email_pool_size),
+                    max_retries=config.email_max_retries,
+                    retry_base_sec=config.email_retry_base_sec,
+                )
+        return _EMAIL_TRANSPORT
+
+
+def close_email_transport():
+    """Log out of pooled SMTP connections; the next send reconnects."""
+    global _EMAIL_TRANSPORT
+    with _EMAIL_TRANSPORT_LOCK:
+        transport, _EMAIL_TRANSPORT = _EMAIL_TRANSPORT, None
+    if transport is not None:
+        transport.close()
+
+
+def _build_email_message(html_content, date_str, email_to, sender, plain_text=None):
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = f"Sabah Özeti: {date_str}"
+    msg["From"] = sender
+    msg["To"] = email_to
+
+    if plain_text is None:
+        plain_text = _html_to_plain_text(html_content)
+    msg.attach(MIMEText(plain_text, "plain", "utf-8"))
+    msg.attach(MIMEText(html_content, "html", "utf-8"))
+    return msg
+
+
+def _email_credentials_ready(email_to):
+    config = _config()
+    needs_login = config.email_backend != "file"
+    if needs_login and not config.email_user:
+        print("❌ HATA: 'EMAIL_USER' secret tanımlı değil!")
+        return False
+    if needs_login and not config.email_pass:
+        print("❌ HATA: 'EMAIL_PASS' secret tanımlı değil!")
+        return False
+    if not email_to:
+        print("❌ HATA: 'EMAIL_TO' secret tanımlı değil!")
+        return False
+    return True
+
+
+def send_emails(items, default_to=None):
+    """Send `(html_content, date_str, email_to[, plain_text])` items over the shared transport.
+
+    Returns one bool per item. Items without `plain_text` derive it from the HTML.
+    Only items without `email_to` use `default_to`; batch mode passes none,
+    so a recipient's brief is never redirected to the operator. Batch mode
+    uses this to deliver every brief over the same pooled, rate-limited
+    connections.
+    """
+    config = _config()
+    items = list(items)
+    print(f"--- 📧 E-POSTA GÖNDERİM SÜRECİ BAŞLADI ({len(items)} ileti) ---")
+    sender = config.email_user or "morning-brief@localhost"
+    results = [False] * len(items)
+    pending = []
+    for index, (html_content, date_str, email_to, *plain_text) in enumerate(items):
+        email_to = email_to or default_to
+        if not _email_credentials_ready(email_to):
+            continue
+        print(f"✅ Kimlik bilgileri bulundu. Gönderen: {_mask_for_log(config.email_user)} -> Alıcı: {_mask_for_log(email_to)}")
+        message = _build_email_message(html_content, date_str, email_to, sender, *plain_text[:1])
+        pending.append((index, message))
+    if not pending:
+        return results
+
+    transport = _email_transport()
+    errors = transport.send_many([message for _, message in pending])
+    for (index, message), err in zip(pending, errors):
+        recipient = _mask_for_log(message["To"])
+        if err is None:
+            results[index] = True
+            print(f"✅ BAŞARILI: E-posta gönderildi ({transport.name}) -> {recipient}")
+        else:
+            print(f"❌ HATA ({recipient}): {err}")
+    return results
+
+
+def send_email(html_content, date_str, email_to=None, plain_text=None):
+    return send_emails([(html_content, date_str, email_to, plain_text)], default_to=_config().email_to)[0]
+
+
+def _weather_icon_class(code):
+    """Map WMO weather code to icon class: sunny, partly-cloudy, cloudy, rainy, stormy."""
+    if code in (0, 1):
+        return "sunny"
+    elif code in (2, 3):
+        return "cloudy"
+    elif code in (45, 48):
+        return "cloudy"
+    elif code in (51, 53, 55, 61, 63, 65, 80, 81, 82):
+        return "rainy"
+    elif code in (71, 73, 75):
+        return "cloudy"
+    elif code in (95, 96, 99):
+        return "stormy"
+    return "partly-cloudy"
+
+
+WEATHER_ICON_IMAGES = {
+    "sunny": ("https://cdn.jsdelivr.net/gh/twitter/twemoji@14.0.2/assets/72x72/2600.png", "Güneşli"),
+    "partly-cloudy": ("https://cdn.jsdelivr.net/gh/twitter/twemoji@14.0.2/assets/72x72/26c5.png", "Parçalı bulutlu"),
+    "cloudy": ("https://cdn.jsdelivr.net/gh/twitter/twemoji@14.0.2/assets/72x72/2601.png", "Bulutlu"),
+    "rainy": ("https://cdn.jsdelivr.net/gh/twitter/twemoji@14.0.2/assets/72x72/1f327.png", "Yağmurlu"),
+    "stormy": ("https://cdn.jsdelivr.net/gh/twitter/twemoji@14.0.2/assets/72x72/26c8.png", "Fırtınalı"),
+}
+
+
+def _weather_icon_image_html(icon_key):
+    src, alt = WEATHER_ICON_IMAGES.get(icon_key, WEATHER_ICON_IMAGES["partly-cloudy"])
+    return (
+        f'<img src="{src}" alt="{alt}" width="40" height="40" '
+        'style="display:block;width:40px;height:40px;border:0;outline:none;margin:0 0 8px 0;" />'
+    )
+
+
+def _location_cache_key(location):
+    return f"{float(location['lat']):.3f}_{float(location['lng']):.3f}"
+
+
+_WMO_CODES_TR = {
+    0: "Açık", 1: "Az bulutlu", 2: "Parçalı bulutlu", 3: "Bulutlu",
+    45: "Sisli", 48: "Kırağılı sis",
+    51: "Hafif çisenti", 53: "Çisenti", 55: "Yoğun çisenti",
+    61: "Hafif yağmur", 63: "Yağmur", 65: "Şiddetli yağmur",
+    71: "Hafif kar", 73: "Kar", 75: "Yoğun kar",
+    80: "Hafif sağanak", 81: "Sağanak", 82: "Şiddetli sağanak",
+    95: "Gök gürültülü fırtına", 96: "Dolu ile fırtına", 99: "Şiddetli dolu fırtınası",
+}
+
+
+WEATHER_HOURLY_FIELDS = (
+    ("temperature_2m", "temp"),
+    ("apparent_temperature", "feels"),
+    ("relative_humidity_2m", "humidity"),
+    ("weather_code", "code"),
+    ("wind_speed_10m", "wind"),
+)
+WEATHER_MAX_CELLS_PER_REQUEST = 50
+
+
+def _weather_cell(location):
+    """Snap a location to the `WEATHER_GRID_DEG` grid; nearby recipients share one forecast."""
+    grid = _config().weather_grid_deg
+    lat = round(round(float(location["lat"]) / grid) * grid, 4)
+    lng = round(round(float(location["lng"]) / grid) * grid, 4)
+    return {"key": f"{lat:.4f}_{lng:.4f}_{location['tz']}", "lat": lat, "lng": lng, "tz": location["tz"]}
+
+
+def _weather_cell_cache_name(key):
+    return f"weather-cell-{re.sub(r'[^A-Za-z0-9_.-]', '_', key)}.json"
+
+
+def _weather_query_cache_name(cells):
+    digest = hashlib.sha256("|".join(cell["key"] for cell in cells).encode("utf-8")).hexdigest()[:16]
+    return f"weather-query-{digest}.json"
+
+
+def _compact_hourly(hourly):
+    """Store Open-Meteo hourly arrays as a start time, a step and rounded value columns."""
+    times = hourly.get("time") or []
+    if not times:
+        raise ValueError("Open-Meteo saatlik veri döndürmedi")
+    start = datetime.datetime.fromisoformat(times[0])
+    step = (datetime.datetime.fromisoformat(times[1]) - start) if len(times) > 1 else datetime.timedelta(hours=1)
+    forecast = {"start": times[0], "step_min": int(step.total_seconds() // 60)}
+    for source, column in WEATHER_HOURLY_FIELDS:
+        values = hourly.get(source) or []
+        if len(values) != len(times):
+            raise ValueError(f"Open-Meteo '{source}' dizisi eksik")
+        if column in ("code", "humidity"):
+            forecast[column] = [int(value) if value is not None else None for value in values]
+        else:
+            forecast[column] = [round(value, 1) if value is not None else None for value in values]
+    return forecast
+
+
+def _weather_request(cells, validators=None):
+    """One Open-Meteo request for every cell in `cells` (multi-coordinate query).
+
+    Returns `(status, payloads, validators)`: status 304 means the stored
+    forecasts are still current and `payloads` is None.
+    """
+    params = urllib.parse.urlencode({
+        "latitude": ",".join(f"{cell['lat']:g}" for cell in cells),
+        "longitude": ",".join(f"{cell['lng']:g}" for cell in cells),
+        "hourly": ",".join(source for source, _ in WEATHER_HOURLY_FIELDS),
+        "timezone": ",".join(cell["tz"] for cell in cells),
+        "forecast_days": 1,
+    })
+    headers = {"User-Agent": "MorningBrief/1.0"}
+    if validators and validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators and validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    req = urllib.request.Request(f"https://api.open-meteo.com/v1/forecast?{params}", headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=15) as resp:
+            data = json.loads(resp.read().decode())
+            response_headers = resp.headers
+    except urllib.error.HTTPError as err:
+        if err.code == 304:
+            return 304, None, validators
+        raise
+    payloads = data if isinstance(data, list) else [data]
+    if len(payloads) != len(cells):
+        raise ValueError(f"Open-Meteo {len(cells)} konum yerine {len(payloads)} yanıt döndürdü")
+    return 200, payloads, {
+        "etag": response_headers.get("ETag"),
+        "last_modified": response_headers.get("Last-Modified"),
+    }
+
+
+def _refresh_weather_cells(cells):
+    """Fetch forecasts for `cells` in multi-coordinate batches; returns `{cell_key: forecast}`."""
+    ttl_minutes = _config().weather_cache_ttl_min
+    forecasts = {}
+    for offset in range(0, len(cells), WEATHER_MAX_CELLS_PER_REQUEST):
+        chunk = cells[offset:offset + WEATHER_MAX_CELLS_PER_REQUEST]
+        query_name = _weather_query_cache_name(chunk)
+        stored = {cell["key"]: _load_cache_any(_weather_cell_cache_name(cell["key"])) for cell in chunk}
+        # Validators are only useful while every forecast they vouch for is still stored.
+        validators = None
+        if all(entry is not None for entry in stored.values()):
+            validators = (_load_cache_any(query_name) or {}).get("data")
+
+        status, payloads, validators = _weather_request(chunk, validators)
+        if status == 304:
+            print(f"ℹ️ Open-Meteo: {len(chunk)} konum değişmedi (304).")
+            chunk_forecasts = {key: entry["data"] for key, entry in stored.items()}
+        else:
+            fetched_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            chunk_forecasts = {
+                cell["key"]: dict(_compact_hourly(payload.get("hourly", {})), fetched_at=fetched_at)
+                for cell, payload in zip(chunk, payloads)
+            }
+            if validators.get("etag") or validators.get("last_modified"):
+                _save_cache(query_name, validators)
+        for key, forecast in chunk_forecasts.items():
+            _save_cache(_weather_cell_cache_name(key), forecast, ttl_minutes)
+        forecasts.update(chunk_forecasts)
+    return forecasts
+
+
+def _weather_forecasts(locations):
+    """Cached forecasts for `locations`, keyed by grid cell.
+
+    Missing cells, and cells that expired more than `WEATHER_CACHE_STALE_MIN`
+    ago, are fetched together before returning. Cells inside the stale
+    window are served from the cache and revalidated in the background.
+    """
+    config = _config()
+    ttl_seconds = config.weather_cache_ttl_min * 60
+    stale_seconds = ttl_seconds + config.weather_cache_stale_min * 60
+    cells = {}
+    for location in locations:
+        cell = _weather_cell(location)
+        cells.setdefault(cell["key"], cell)
+
+    def _age(key):
+        entry = _load_cache_any(_weather_cell_cache_name(key))
+        return (_cache_entry_age_seconds(entry) if entry else None), entry
+
+    forecasts, due, revalidate = {}, [], []
+    for key, cell in cells.items():
+        age, entry = _age(key)
+        if age is None or age > stale_seconds:
+            due.append(cell)
+            continue
+        forecasts[key] = entry["data"]
+        if age > ttl_seconds:
+            revalidate.append(cell)
+
+    if due:
+        with _FileLock("weather"):
+            # Another process may have fetched these cells while we waited.
+            pending = []
+            for cell in due:
+                age, entry = _age(cell["key"])
+                if age is not None and age <= ttl_seconds:
+                    forecasts[cell["key"]] = entry["data"]
+                else:
+                    pending.append(cell)
+            if pending:
+                print(f"ℹ️ Open-Meteo: {len(pending)} ızgara hücresi için istek ({len(locations)} konum).")
+                forecasts.update(_refresh_weather_cells(pending))
+
+    if revalidate:
+        def _revalidate():
+            with _FileLock("weather", blocking=False) as lock:
+                if not lock.acquired:
+                    return
+                try:
+                    _refresh_weather_cells(revalidate)
+                except Exception as err:
+                    print(f"⚠️ Hava durumu arka plan yenilemesi başarısız: {err}")
+
+        _start_cache_refresh(_revalidate, "weather-refresh")
+
+    return {location_key: forecasts[cell["key"]] for location_key, cell in (
+        (_location_cache_key(location), _weather_cell(location)) for location in locations
+    )}
+
+
+def _weather_text(location, forecast):
+    """Render the prompt block for one location from a compact forecast."""
+    start = datetime.datetime.fromisoformat(forecast["start"])
+    step = datetime.timedelta(minutes=forecast["step_min"])
+    temps, feels, humidity = forecast["temp"], forecast["feels"], forecast["humidity"]
+    codes, wind = forecast["code"], forecast["wind"]
+
+    lines = []
+    daytime_codes = []
+    for i in range(len(temps)):
+        moment = start + i * step
+        desc = _WMO_CODES_TR.get(codes[i], f"Kod:{codes[i]}")
+        lines.append(
+            f"  {moment:%H:%M} | {temps[i]:.0f}°C (hissedilen {feels[i]:.0f}°C) | {desc} | "
+            f"Nem %{humidity[i]:.0f} | Rüzgar {wind[i]:.0f} km/s"
+        )
+        if 6 <= moment.hour <= 20:
+            daytime_codes.append(codes[i])
+
+    # Determine dominant weather condition (daytime hours 6-20)
+    if daytime_codes:
+        dominant = _weather_icon_class(collections.Counter(daytime_codes).most_common(1)[0][0])
+    else:
+        dominant = _weather_icon_class(codes[0])
+
+    summary = f"  Gün özeti: Min {min(temps):.0f}°C / Max {max(temps):.0f}°C"
+    place = location["label"].split(",", 1)[0].strip().upper()
+    weather_text = f"""{place} HAVA DURUMU (Open-Meteo - Saatlik Tahmin):
+{summary}
+
+Saatlik detay:
+""" + "\n".join(lines)
+    return weather_text, dominant, forecast["fetched_at"]
+
+
+def _weather_fallback():
+    return "(Hava durumu verisi alınamadı.)", "partly-cloudy", datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def get_weather_for_locations(locations):
+    """Weather for several locations, keyed by `_location_cache_key`.
+
+    Locations in the same grid cell share one cached forecast and all
+    expired cells are fetched in a single Open-Meteo request.
+    """
+    try:
+        forecasts = _weather_forecasts(locations)
+    except Exception as e:
+        print(f"⚠️ Hava durumu hatası: {e}")
+        return {_location_cache_key(location): _weather_fallback() for location in locations}
+    results = {}
+    for location in locations:
+        key = _location_cache_key(location)
+        try:
+            results[key] = _weather_text(location, forecasts[key])
+        except Exception as e:
+            print(f"⚠️ Hava durumu hatası ({location['label']}): {e}")
+            results[key] = _weather_fallback()
+    return results
+
+
+def get_weather_data(location=None):
+    """Fetch hourly weather forecast using Open-Meteo API (no API key needed).
+
+    `location` is a `{"label", "lat", "lng", "tz"}` dict; defaults to Doha.
+    A forecast that expired less than `WEATHER_CACHE_STALE_MIN` ago is
+    served immediately while a fresh copy is fetched in the background.
+    """
+    location = location or _default_location()
+    return get_weather_for_locations([location])[_location_cache_key(location)]
+
+
+_resolved_etf_tickers: list[str] = []  # populated by get_financial_data()
+_portfolio_display_tickers: dict[str, str] = {}
+_portfolio_shares: dict[str, float] = {}
+
+
+def _parse_decimal_number(value, default=0.0):
+    if value is None:
+        return default
+    text = str(value).strip()
+    if not text:
+        return default
+    text = re.sub(r"[^0-9,.\-]", "", text)
+    if not text or text in {"-", ".", ","}:
+        return default
+    if "," in text and "." in text:
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    elif "," in text:
+        text = text.replace(",", ".")
+    try:
+        return float(text)
+    except ValueError:
+        return default
+
+
+def _normalize_market_ticker(raw_ticker):
+    ticker = str(raw_ticker or "").strip().upper()
+    if not ticker or ticker == "TOTAL":
+        return "", ""
+    display = ticker
+    if ":" in ticker:
+        ticker = ticker.split(":", 1)[1].strip()
+    ticker = ticker.replace(" ", "")
+    if not re.fullmatch(r"[A-Z0-9.\-]{1,12}", ticker):
+        return "", ""
+    return ticker, display
+
+
+def _extract_portfolio_tickers_from_rows(rows, header_row_num, ticker_col, holdings_col):
+    tickers, display_map, _ = _extract_portfolio_holdings_from_rows(rows, header_row_num, ticker_col, holdings_col)
+    return tickers, display_map
+
+
+def _extract_portfolio_holdings_from_rows(rows, header_row_num, ticker_col, holdings_col):
+    """Like `_extract_portfolio_tickers_from_rows`, plus `{ticker: shares}` for position sizing."""
+    header_index = header_row_num - 1
+    if len(rows) <= header_index:
+        raise ValueError(f"Header row {header_row_num} okunamadı.")
+
+    header = [str(h).strip() for h in rows[header_index]]
+    ticker_idx = header.index(ticker_col)
+    holdings_idx = header.index(holdings_col)
+
+    tickers = []
+    display_map = {}
+    shares = {}
+    for raw_row in rows[header_index + 1:]:
+        row = list(raw_row)
+        while len(row) <= max(ticker_idx, holdings_idx):
+            row.append("")
+        ticker, display_ticker = _normalize_market_ticker(row[ticker_idx])
+        if not ticker:
+            continue
+        holdings = _parse_decimal_number(row[holdings_idx])
+        if holdings <= 0:
+            continue
+        if ticker not in shares:
+            tickers.append(ticker)
+            display_map[ticker] = display_ticker
+        # The same ticker held in several rows (accounts/lots) is one position.
+        shares[ticker] = shares.get(ticker, 0.0) + holdings
+    return tickers, display_map, shares
+
+
+def _shares_from_holdings(holdings):
+    """`{ticker: shares}` for settings-style holdings entries that carry a positive `shares` value."""
+    shares = {}
+    for item in holdings if isinstance(holdings, list) else []:
+        if not isinstance(item, dict) or item.get("include") is False:
+            continue
+        ticker, _ = _normalize_market_ticker(item.get("ticker"))
+        amount = _parse_decimal_number(item.get("shares"))
+        if ticker and amount > 0:
+            shares.setdefault(ticker, amount)
+    return shares
+
+
+def _get_portfolio_tickers_from_sheets():
+    """Read current ETF/stock tickers from Google Sheets where holdings > 0.
+
+    Requires env vars:
+      GSHEETS_SPREADSHEET_ID       - ID from the spreadsheet URL
+      GOOGLE_SERVICE_ACCOUNT_JSON  - base64-encoded service account JSON key
+    Optional:
+      GSHEETS_SHEET_NAME           - tab name (default: Dashboard v2)
+      GSHEETS_HEADER_ROW           - 1-based row containing headers (default: 6)
+      GSHEETS_TICKER_COLUMN        - column header (default: Ticker)
+      GSHEETS_HOLDINGS_COLUMN      - column header (default: Shares)
+      GSHEETS_READ_RANGE           - bounded range to read (default: sheet data range)
+
+    Returns a list of ticker strings, or None if the integration is not
     configured or an error occurs (caller should fall back to hardcoded list).
     """
-    global _portfolio_display_tickers
+    global _portfolio_display_tickers, _portfolio_shares
     spreadsheet_id = _env_str("GSHEETS_SPREADSHEET_ID", "")
     sa_json_b64 = _env_str("GOOGLE_SERVICE_ACCOUNT_JSON", "")
 
@@ -1656,7 +4022,7 @@ def _get_portfolio_tickers_from_sheets():
             return None
 
         try:
-            tickers, display_map = _extract_portfolio_tickers_from_rows(
+            tickers, display_map, shares = _extract_portfolio_holdings_from_rows(
                 rows, header_row_num, ticker_col, holdings_col
             )
         except ValueError as exc:
@@ -1664,90 +4030,462 @@ def _get_portfolio_tickers_from_sheets():
             print(f"⚠️ Google Sheets: Sütun bulunamadı – {exc}. Başlıklar: {header}")
             return None
 
-        if tickers:
-            _portfolio_display_tickers = display_map
-            print(f"✅ Google Sheets'ten {len(tickers)} aktif pozisyon okundu: {tickers}")
-        else:
-            print("⚠️ Google Sheets: Shares/Holdings > 0 olan aktif pozisyon bulunamadı.")
-        return tickers if tickers else None
+        if tickers:
+            _portfolio_display_tickers = display_map
+            _portfolio_shares = shares
+            print(f"✅ Google Sheets'ten {len(tickers)} aktif pozisyon okundu: {tickers}")
+        else:
+            print("⚠️ Google Sheets: Shares/Holdings > 0 olan aktif pozisyon bulunamadı.")
+        return tickers if tickers else None
+
+    except Exception as e:
+        print(f"⚠️ Google Sheets hatası: {e}")
+        return None
+
+
+def _resolve_portfolio_tickers():
+    """Return the active holdings from Google Sheets, or the configured fallback list."""
+    global _resolved_etf_tickers, _portfolio_display_tickers, _portfolio_shares
+    tickers = _get_portfolio_tickers_from_sheets()
+    if tickers is None:
+        tickers = list(_config().etf_fallback_tickers)
+        _portfolio_display_tickers = {ticker: ticker for ticker in tickers}
+        _portfolio_shares = _shares_from_holdings(_brief_setting(["holdings"], []))
+        print(f"ℹ️ Sabit ETF listesi kullanılıyor: {tickers}")
+    _resolved_etf_tickers = tickers
+    return tickers
+
+
+PRICE_STORE_FIELDS = ("open", "high", "low", "close", "volume")
+PRICE_STORE_MAX_BARS = 400
+# New symbols start with ~4 months of bars so volatility and drawdown have history to work with.
+PRICE_STORE_BOOTSTRAP_DAYS = 120
+PORTFOLIO_VOL_WINDOW = 20
+TRADING_DAYS_PER_YEAR = 252
+
+
+def _price_store_path(symbol):
+    safe_symbol = re.sub(r"[^A-Za-z0-9_.-]", "_", symbol)
+    return os.path.join(_config().price_store_dir, f"{safe_symbol}.npz")
+
+
+def _load_price_history(symbol):
+    """Stored daily bars for `symbol`: `ts` (epoch seconds) plus OHLCV columns, or None."""
+    np = _get_numpy()
+    try:
+        with np.load(_price_store_path(symbol), allow_pickle=False) as data:
+            history = {key: data[key] for key in ("ts",) + PRICE_STORE_FIELDS}
+            history["fetched_at"] = float(data["fetched_at"])
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        # A missing, partial or corrupt file is refetched in full.
+        return None
+    return history
+
+
+def _save_price_history(symbol, history):
+    np = _get_numpy()
+    buffer = io.BytesIO()
+    np.savez(buffer, **history)
+    _atomic_write_bytes(_price_store_path(symbol), buffer.getvalue())
+
+
+def _history_from_frame(hist):
+    """Convert a yfinance OHLCV frame into store columns, dropping rows without a close."""
+    np = _get_numpy()
+    timestamps = []
+    for stamp in hist.index:
+        if getattr(stamp, "tzinfo", None) is None:
+            stamp = stamp.tz_localize("UTC")
+        timestamps.append(int(stamp.timestamp()))
+    history = {"ts": np.asarray(timestamps, dtype=np.int64)}
+    for field in PRICE_STORE_FIELDS:
+        column = field.capitalize()
+        values = hist[column].to_numpy(dtype=np.float64) if column in hist else np.full(len(timestamps), np.nan)
+        history[field] = values
+    keep = ~np.isnan(history["close"])
+    return {key: values[keep] for key, values in history.items()}
+
+
+def _merge_price_history(stored, fresh, fetched_at):
+    """Append `fresh` bars to `stored`; overlapping bars are replaced by the fresh ones."""
+    np = _get_numpy()
+    if stored is None:
+        merged = {key: fresh[key] for key in ("ts",) + PRICE_STORE_FIELDS}
+    else:
+        keep = stored["ts"] < fresh["ts"][0] if len(fresh["ts"]) else np.ones(len(stored["ts"]), dtype=bool)
+        merged = {
+            key: np.concatenate([stored[key][keep], fresh[key]])
+            for key in ("ts",) + PRICE_STORE_FIELDS
+        }
+    merged = {key: values[-PRICE_STORE_MAX_BARS:] for key, values in merged.items()}
+    merged["fetched_at"] = np.float64(fetched_at)
+    return merged
+
+
+def _download_price_bars(yf, symbols, start_date):
+    """One batched yfinance request for `symbols` from `start_date`; returns `{symbol: history}`."""
+    try:
+        data = yf.download(
+            symbols,
+            start=start_date.isoformat(),
+            interval="1d",
+            group_by="ticker",
+            auto_adjust=False,
+            progress=False,
+            threads=True,
+        )
+    except Exception as err:
+        print(f"⚠️ Fiyat indirme hatası ({', '.join(symbols)}): {err}")
+        return {}
+    bars = {}
+    for symbol in symbols:
+        if hasattr(data.columns, "levels"):
+            hist = data[symbol] if symbol in data.columns.levels[0] else None
+        else:
+            hist = data if len(symbols) == 1 else None
+        if hist is None or hist.empty:
+            continue
+        history = _history_from_frame(hist)
+        if len(history["ts"]):
+            bars[symbol] = history
+    return bars
+
+
+def _refresh_price_histories(symbols, histories):
+    """Fetch only the bars after each symbol's last stored bar, batching symbols that share a start date."""
+    yf = _get_yfinance()
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    groups = {}
+    for symbol in symbols:
+        stored = histories.get(symbol)
+        if stored is None or not len(stored["ts"]):
+            start_date = today - datetime.timedelta(days=PRICE_STORE_BOOTSTRAP_DAYS)
+        else:
+            # The last stored bar may have been captured intraday, so it is fetched again.
+            start_date = datetime.datetime.fromtimestamp(int(stored["ts"][-1]), datetime.timezone.utc).date()
+        groups.setdefault(start_date, []).append(symbol)
+
+    print(f"ℹ️ Fiyat deposu: {len(symbols)} sembol için {len(groups)} toplu istek.")
+    fetched_at = time.time()
+    for start_date, group in sorted(groups.items()):
+        bars = _download_price_bars(yf, group, start_date)
+        for symbol in group:
+            fresh = bars.get(symbol)
+            if fresh is None:
+                print(f"⚠️ Fiyat deposu: {symbol} için yeni bar alınamadı.")
+                stored = histories.get(symbol)
+                if stored is not None:
+                    # Stamp the check so a holiday or delisted symbol is not re-downloaded on every run.
+                    stored = dict(stored, fetched_at=_get_numpy().float64(fetched_at))
+                    _save_price_history(symbol, stored)
+                    histories[symbol] = stored
+                continue
+            merged = _merge_price_history(histories.get(symbol), fresh, fetched_at)
+            _save_price_history(symbol, merged)
+            histories[symbol] = merged
+    return histories
+
+
+def _quote_from_history(history):
+    if history is None or not len(history["ts"]):
+        return {"error": "Veri alınamadı"}
+    close = history["close"]
+    current = float(close[-1])
+    prev = float(close[-2]) if len(close) >= 2 else current
+    week_change = None
+    if len(close) >= 5:
+        week_start = float(close[-5])
+        week_change = ((current - week_start) / week_start) * 100
+    ts = datetime.datetime.fromtimestamp(int(history["ts"][-1]), datetime.timezone.utc)
+    return {
+        "price": current,
+        "change_pct": ((current - prev) / prev) * 100,
+        "week_change_pct": week_change,
+        "volume": float(history["volume"][-1]),
+        "ts": ts.isoformat(),
+    }
+
+
+def _fetch_market_quotes(tickers):
+    """Summarize recent daily bars for `tickers` from the local price store.
+
+    Symbols whose bars were fetched more than `FINANCE_CACHE_TTL_MIN` ago
+    (or that are not stored yet) are refreshed incrementally in batched
+    requests. Returns `{"quotes": {symbol: quote}, "histories": {symbol:
+    history}, "fetched_at": iso}`. A quote holds `price`, `change_pct`,
+    `week_change_pct` (or None), `volume` and `ts`, or an `error` string
+    when the symbol could not be read.
+    """
+    ttl_seconds = _config().finance_cache_ttl_min * 60
+
+    def _stale(history):
+        return history is None or time.time() - history["fetched_at"] > ttl_seconds
+
+    histories = {symbol: _load_price_history(symbol) for symbol in tickers}
+    if any(_stale(histories[symbol]) for symbol in tickers):
+        with _FileLock("price-store"):
+            # Another process may have refreshed the store while we waited.
+            stale = []
+            for symbol in tickers:
+                histories[symbol] = _load_price_history(symbol)
+                if _stale(histories[symbol]):
+                    stale.append(symbol)
+            if stale:
+                _refresh_price_histories(stale, histories)
+
+    quotes = {}
+    fetched_times = []
+    for symbol in tickers:
+        history = histories.get(symbol)
+        try:
+            quotes[symbol] = _quote_from_history(history)
+        except Exception as e:
+            quotes[symbol] = {"error": f"Hata - {str(e)[:50]}"}
+        if history is not None:
+            fetched_times.append(float(history["fetched_at"]))
+    fetched_at = datetime.datetime.fromtimestamp(
+        min(fetched_times) if fetched_times else time.time(), datetime.timezone.utc
+    ).isoformat()
+    return {"quotes": quotes, "histories": histories, "fetched_at": fetched_at}
+
+
+def _format_financial_text(tickers, market, display_map=None):
+    """Render the prompt block for `tickers` from a `_fetch_market_quotes` result."""
+    display_map = display_map or {}
+    quotes = market.get("quotes", {})
+    lines = []
+    latest_ts = None
+    for symbol in tickers:
+        quote = quotes.get(symbol) or {"error": "Veri alınamadı"}
+        if quote.get("error"):
+            lines.append(f"  {symbol}: {quote['error']}")
+            continue
+        ts = _parse_iso_datetime(quote.get("ts"))
+        if ts is not None and (latest_ts is None or ts > latest_ts):
+            latest_ts = ts
+        change_pct = quote["change_pct"]
+        week_change = quote.get("week_change_pct")
+        week_str = f" | 5g: {week_change:+.2f}%" if week_change is not None else ""
+        direction = "yukarı" if change_pct >= 0 else "aşağı"
+        display_symbol = display_map.get(symbol, symbol)
+        lines.append(
+            f"  {display_symbol}: ${quote['price']:.2f} ({change_pct:+.2f}% {direction}){week_str} | Hacim: {quote['volume']:,.0f}"
+        )
+    fetched_at = market.get("fetched_at") or datetime.datetime.now(datetime.timezone.utc).isoformat()
+    latest_ts_str = latest_ts.isoformat() if latest_ts is not None else fetched_at
+    return "GERÇEK PİYASA VERİLERİ (Yahoo Finance):\n" + "\n".join(lines), fetched_at, latest_ts_str
+
+
+def _price_matrix(tickers, histories):
+    """Align stored closes into a `(days, symbols)` matrix on a shared calendar.
+
+    Returns `(symbols, days, prices)` where `days` are UTC day numbers and
+    gaps (holidays on one exchange, a late listing) are forward-filled;
+    rows before a symbol's first bar stay NaN.
+    """
+    np = _get_numpy()
+    symbols = [s for s in tickers if histories.get(s) is not None and len(histories[s]["ts"])]
+    if not symbols:
+        return [], np.empty(0, dtype=np.int64), np.empty((0, 0))
+    # Daily bars are stamped at exchange-local midnight; rounding to the
+    # nearest UTC day puts every session on its calendar date.
+    symbol_days = [(histories[s]["ts"] + 43200) // 86400 for s in symbols]
+    days = np.unique(np.concatenate(symbol_days))
+    prices = np.full((len(days), len(symbols)), np.nan)
+    for col, symbol in enumerate(symbols):
+        prices[np.searchsorted(days, symbol_days[col]), col] = histories[symbol]["close"]
+
+    rows = np.arange(len(days))[:, None]
+    last_seen = np.where(np.isnan(prices), 0, rows)
+    np.maximum.accumulate(last_seen, axis=0, out=last_seen)
+    return symbols, days, prices[last_seen, np.arange(len(symbols))]
+
+
+def _portfolio_analytics(tickers, histories, shares=None, window=PORTFOLIO_VOL_WINDOW):
+    """Position-weighted analytics over the stored daily closes of `tickers`.
+
+    `shares` maps tickers to share counts (missing entries count as one
+    share). Everything is computed on the aligned price matrix in a few
+    array operations. Returns None when no common price history exists.
+    """
+    np = _get_numpy()
+    symbols, days, prices = _price_matrix(tickers, histories)
+    if not symbols:
+        return None
+    complete = ~np.isnan(prices).any(axis=1)
+    if not complete.any():
+        return None
+    # Start where every holding has a price so the total is comparable day to day.
+    start = int(np.argmax(complete))
+    days, prices = days[start:], prices[start:]
+
+    shares = shares or {}
+    units = np.array([float(shares.get(symbol, 1.0)) for symbol in symbols])
+    values = prices * units
+    total = values.sum(axis=1)
+    portfolio_returns = total[1:] / total[:-1] - 1.0
+    asset_returns = prices[1:] / prices[:-1] - 1.0
+
+    daily_pnl = float(total[-1] - total[-2]) if len(total) >= 2 else 0.0
+    daily_pnl_pct = float(portfolio_returns[-1] * 100) if len(portfolio_returns) else 0.0
+
+    annualize = np.sqrt(TRADING_DAYS_PER_YEAR) * 100
+    volatility_window = min(window, len(portfolio_returns))
+    rolling_volatility = []
+    if volatility_window >= 2:
+        windows = np.lib.stride_tricks.sliding_window_view(portfolio_returns, volatility_window)
+        rolling_volatility = (windows.std(axis=1, ddof=1) * annualize).tolist()
+
+    drawdown = (total / np.maximum.accumulate(total) - 1.0) * 100
+
+    correlation = None
+    top_pairs = []
+    if len(symbols) >= 2 and len(asset_returns) >= 3:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            matrix = np.corrcoef(asset_returns, rowvar=False)
+        upper_i, upper_j = np.triu_indices(len(symbols), k=1)
+        pair_values = matrix[upper_i, upper_j]
+        order = [k for k in np.argsort(-pair_values) if not np.isnan(pair_values[k])]
+        top_pairs = [
+            (symbols[upper_i[k]], symbols[upper_j[k]], float(pair_values[k]))
+            for k in order[:3]
+        ]
+        correlation = [[None if np.isnan(v) else round(float(v), 4) for v in row] for row in matrix]
+
+    weights = values[-1] / total[-1]
+    change_pct = asset_returns[-1] * 100 if len(asset_returns) else np.zeros(len(symbols))
+    positions = [
+        {
+            "symbol": symbol,
+            "shares": float(units[col]),
+            "price": float(prices[-1, col]),
+            "value": float(values[-1, col]),
+            "weight_pct": float(weights[col] * 100),
+            "change_pct": float(change_pct[col]),
+        }
+        for col, symbol in enumerate(symbols)
+    ]
+    positions.sort(key=lambda item: item["value"], reverse=True)
+
+    return {
+        "symbols": symbols,
+        "as_of": datetime.datetime.fromtimestamp(int(days[-1]) * 86400, datetime.timezone.utc).date().isoformat(),
+        "days": len(days),
+        "total_value": float(total[-1]),
+        "daily_pnl": daily_pnl,
+        "daily_pnl_pct": daily_pnl_pct,
+        "volatility_window": volatility_window,
+        "volatility_pct": rolling_volatility[-1] if rolling_volatility else None,
+        "rolling_volatility_pct": rolling_volatility,
+        "max_drawdown_pct": float(drawdown.min()),
+        "current_drawdown_pct": float(drawdown[-1]),
+        "positions": positions,
+        "correlation": correlation,
+        "top_correlations": top_pairs,
+    }
+
+
+def _signed_usd(value):
+    return f"{'+' if value >= 0 else '-'}${abs(value):,.2f}"
+
+
+def _format_portfolio_analytics(analytics, display_map=None):
+    """Prompt block summarizing a `_portfolio_analytics` result."""
+    display_map = display_map or {}
+
+    def name(symbol):
+        return display_map.get(symbol, symbol)
+
+    lines = [
+        f"PORTFÖY ANALİTİĞİ ({analytics['days']} işlem günü, hisse adedine göre ağırlıklı, {analytics['as_of']}):",
+        f"  Toplam değer: ${analytics['total_value']:,.2f} | Günlük K/Z: "
+        f"{_signed_usd(analytics['daily_pnl'])} ({analytics['daily_pnl_pct']:+.2f}%)",
+    ]
+    risk = [
+        f"Maks. düşüş: {analytics['max_drawdown_pct']:.2f}%",
+        f"Zirveden uzaklık: {analytics['current_drawdown_pct']:.2f}%",
+    ]
+    if analytics["volatility_pct"] is not None:
+        risk.insert(0, f"{analytics['volatility_window']}g yıllık volatilite: {analytics['volatility_pct']:.1f}%")
+    lines.append("  " + " | ".join(risk))
+    lines.append("  Ağırlıklar: " + ", ".join(
+        f"{name(item['symbol'])} {item['weight_pct']:.1f}%" for item in analytics["positions"]
+    ))
+    if analytics["top_correlations"]:
+        lines.append("  En yüksek korelasyon: " + ", ".join(
+            f"{name(a)}/{name(b)} {value:.2f}" for a, b, value in analytics["top_correlations"]
+        ))
+    return "\n".join(lines)
+
+
+def _portfolio_summary_html(analytics, display_map=None):
+    """Email-safe table of the portfolio analytics for the finance card."""
+    if not analytics:
+        return ""
+    display_map = display_map or {}
+    cell = "padding:4px 6px; font-size:12px; border-bottom:1px solid #E5E7EB;"
+    text_color = "#1F2933"
+    pnl_color = "#166534" if analytics["daily_pnl"] >= 0 else "#B91C1C"
+    volatility = analytics["volatility_pct"]
+    summary = [
+        ("Toplam değer", f"${analytics['total_value']:,.2f}", text_color),
+        ("Günlük K/Z", f"{_signed_usd(analytics['daily_pnl'])} ({analytics['daily_pnl_pct']:+.2f}%)", pnl_color),
+        (f"{analytics['volatility_window']}g volatilite", f"{volatility:.1f}%" if volatility is not None else "—", text_color),
+        ("Maks. düşüş", f"{analytics['max_drawdown_pct']:.2f}%", text_color),
+    ]
+    summary.extend(
+        (display_map.get(item["symbol"], item["symbol"]), f"{item['weight_pct']:.1f}% · ${item['value']:,.2f}", text_color)
+        for item in analytics["positions"]
+    )
+    rows = [
+        f'<tr><td style="{cell} color:{text_color};">{html.escape(label)}</td>'
+        f'<td style="{cell} color:{color}; text-align:right;">{html.escape(value)}</td></tr>'
+        for label, value, color in summary
+    ]
+    return (
+        '<table role="presentation" width="100%" cellpadding="0" cellspacing="0" '
+        'style="border-collapse:collapse; margin:0 0 10px 0;">'
+        f'<tbody>{"".join(rows)}</tbody></table>'
+    )
+
+
+def _financial_fallback():
+    now_utc_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    return "(Finansal veri alınamadı, genel bilgi kullan.)", now_utc_iso, now_utc_iso, None
+
 
+def _financial_inputs(tickers, market, display_map=None, shares=None):
+    """Quote text plus portfolio analytics: `(text, fetched_at, latest_ts, analytics)`."""
+    text, fetched_at, latest_ts = _format_financial_text(tickers, market, display_map)
+    analytics = None
+    try:
+        analytics = _portfolio_analytics(tickers, market.get("histories") or {}, shares)
     except Exception as e:
-        print(f"⚠️ Google Sheets hatası: {e}")
-        return None
+        print(f"⚠️ Portföy analitiği hesaplanamadı: {e}")
+    if analytics:
+        text = f"{text}\n{_format_portfolio_analytics(analytics, display_map)}"
+    return text, fetched_at, latest_ts, analytics
 
 
-def get_financial_data():
+def get_financial_data(tickers=None, display_map=None, shares=None):
     """Fetch real market data for portfolio tickers via Yahoo Finance.
 
     The ticker list is loaded dynamically from Google Sheets (holdings > 0).
     Falls back to a hardcoded whitelist when Sheets integration is not
-    configured or unavailable.
+    configured or unavailable. Batch mode passes `tickers` explicitly.
+    Returns `(text, fetched_at, latest_ts, analytics)`.
     """
-    global _resolved_etf_tickers, _portfolio_display_tickers
-    tickers = _get_portfolio_tickers_from_sheets()
     if tickers is None:
-        tickers = _ETF_FALLBACK_WHITELIST
-        _portfolio_display_tickers = {ticker: ticker for ticker in tickers}
-        print(f"ℹ️ Sabit ETF listesi kullanılıyor: {tickers}")
-    _resolved_etf_tickers = tickers
+        tickers = _resolve_portfolio_tickers()
+        display_map = _portfolio_display_tickers
+        shares = _portfolio_shares
 
     try:
-        yf = _get_yfinance()
-        cached = _load_cache("finance.json", ttl_minutes=30)
-        if cached:
-            cached_data = cached.get("data", {})
-            if cached_data.get("tickers") == tickers:
-                return cached_data["text"], cached_data["fetched_at"], cached_data["latest_ts"]
-            print("ℹ️ Finans önbelleği aktif pozisyon listesi değiştiği için yenileniyor.")
-
-        lines = []
-        latest_ts = None
-        data = yf.download(tickers, period="5d", group_by="ticker", auto_adjust=False, progress=False)
-        for symbol in tickers:
-            try:
-                if hasattr(data.columns, "levels"):
-                    hist = data[symbol] if symbol in data.columns.levels[0] else None
-                else:
-                    hist = data[symbol] if symbol in data else None
-                if hist is None or hist.empty:
-                    ticker = yf.Ticker(symbol)
-                    hist = ticker.history(period="5d")
-                if hist.empty:
-                    lines.append(f"  {symbol}: Veri alınamadı")
-                    continue
-
-                current = hist["Close"].iloc[-1]
-                prev = hist["Close"].iloc[-2] if len(hist) >= 2 else current
-                change_pct = ((current - prev) / prev) * 100
-
-                if hist.index is not None and len(hist.index) > 0:
-                    ts = hist.index[-1]
-                    if latest_ts is None or ts > latest_ts:
-                        latest_ts = ts
-
-                if len(hist) >= 5:
-                    week_start = hist["Close"].iloc[0]
-                    week_change = ((current - week_start) / week_start) * 100
-                    week_str = f" | 5g: {week_change:+.2f}%"
-                else:
-                    week_str = ""
-
-                direction = "yukarı" if change_pct >= 0 else "aşağı"
-                display_symbol = _portfolio_display_tickers.get(symbol, symbol)
-                lines.append(
-                    f"  {display_symbol}: ${current:.2f} ({change_pct:+.2f}% {direction}){week_str} | Hacim: {hist['Volume'].iloc[-1]:,.0f}"
-                )
-            except Exception as e:
-                lines.append(f"  {symbol}: Hata - {str(e)[:50]}")
-
-        fetched_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
-        latest_ts_str = latest_ts.isoformat() if latest_ts is not None else fetched_at
-        text = "GERÇEK PİYASA VERİLERİ (Yahoo Finance):\n" + "\n".join(lines)
-        _save_cache("finance.json", {"text": text, "fetched_at": fetched_at, "latest_ts": latest_ts_str, "tickers": tickers})
-        return text, fetched_at, latest_ts_str
+        market = _fetch_market_quotes(tickers)
+        return _financial_inputs(tickers, market, display_map, shares)
     except Exception as e:
         print(f"⚠️ Finansal veri hatası: {e}")
-        return "(Finansal veri alınamadı, genel bilgi kullan.)", datetime.datetime.now(datetime.timezone.utc).isoformat(), datetime.datetime.now(datetime.timezone.utc).isoformat()
+        return _financial_fallback()
 
 
 def _parse_iso_datetime(value):
@@ -1765,39 +4503,212 @@ def _parse_iso_datetime(value):
         return None
 
 
-def _todoist_request(path, params=None, allow_retry=True, phase="request"):
-    if not TODOIST_API_TOKEN:
+TODOIST_HTTP_TIMEOUT_SEC = 20
+TODOIST_POOL_SIZE = 3
+TODOIST_RATE_PER_SEC = 4.0
+TODOIST_MAX_RETRY_AFTER_SEC = 15
+
+
+class _HTTPSConnectionPool:
+    """A few keep-alive `http.client` connections to one host, shared by threads.
+
+    Responses are requested with gzip and decoded transparently. A request
+    on a reused connection that the server already closed is retried once
+    on a fresh connection.
+    """
+
+    def __init__(self, host, size=TODOIST_POOL_SIZE, timeout=TODOIST_HTTP_TIMEOUT_SEC, connect=None):
+        self.host = host
+        self._connect = connect or (lambda: http.client.HTTPSConnection(host, timeout=timeout))
+        self._idle = collections.deque()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _send(conn, method, path, headers, body):
+        conn.request(method, path, body=body, headers=headers)
+        resp = conn.getresponse()
+        data = resp.read()
+        if (resp.getheader("Content-Encoding") or "").lower() == "gzip":
+            data = gzip.decompress(data)
+        return resp.status, resp.headers, data, not resp.will_close
+
+    def request(self, method, path, headers=None, body=None):
+        """Send one request; returns `(status, headers, body)`."""
+        headers = dict(headers or {}, **{"Accept-Encoding": "gzip"})
+        with self._slots:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            reused = conn is not None
+            if conn is None:
+                conn = self._connect()
+            try:
+                try:
+                    status, response_headers, data, keep_alive = self._send(conn, method, path, headers, body)
+                except (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionResetError, BrokenPipeError):
+                    if not reused:
+                        raise
+                    conn.close()
+                    conn = self._connect()
+                    status, response_headers, data, keep_alive = self._send(conn, method, path, headers, body)
+            except BaseException:
+                conn.close()
+                raise
+            if keep_alive:
+                with self._lock:
+                    self._idle.append(conn)
+            else:
+                conn.close()
+        return status, response_headers, data
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
+
+
+class _TodoistClient:
+    """Todoist API client over a shared connection pool with per-token rate limiting.
+
+    Every token gets a token bucket. A 429 pauses all in-flight and queued
+    calls for that token until `Retry-After` has passed, instead of each
+    request sleeping on its own.
+    """
+
+    def __init__(self, base_url=TODOIST_API_BASE, pool=None):
+        parts = urllib.parse.urlsplit(base_url)
+        self.base_path = parts.path.rstrip("/")
+        self.pool = pool or _HTTPSConnectionPool(parts.netloc)
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def _limit(self, token):
+        key = _todoist_account_key(token)
+        with self._lock:
+            if key not in self._limits:
+                bucket = _TokenBucket(TODOIST_RATE_PER_SEC, capacity=TODOIST_RATE_PER_SEC * 2)
+                self._limits[key] = {"bucket": bucket, "resume_at": 0.0}
+            return self._limits[key]
+
+    def pause(self, token, seconds):
+        limit = self._limit(token)
+        with self._lock:
+            limit["resume_at"] = max(limit["resume_at"], time.monotonic() + seconds)
+
+    def request(self, token, method, path, form=None):
+        limit = self._limit(token)
+        while True:
+            delay = limit["resume_at"] - time.monotonic()
+            if delay <= 0:
+                break
+            time.sleep(delay)
+        limit["bucket"].acquire()
+        headers = {"Authorization": f"Bearer {token}", "User-Agent": "MorningBrief/1.0"}
+        body = None
+        if form is not None:
+            body = urllib.parse.urlencode(form).encode("utf-8")
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        return self.pool.request(method, f"{self.base_path}{path}", headers, body)
+
+    def close(self):
+        self.pool.close()
+
+
+_TODOIST_CLIENT = None
+_TODOIST_CLIENT_LOCK = threading.Lock()
+
+
+def _todoist_client():
+    global _TODOIST_CLIENT
+    with _TODOIST_CLIENT_LOCK:
+        if _TODOIST_CLIENT is None:
+            _TODOIST_CLIENT = _TodoistClient()
+        return _TODOIST_CLIENT
+
+
+def _todoist_request(path, params=None, allow_retry=True, phase="request", token=None, data=None):
+    """GET `path` (or POST `data` as a form when given) and return the decoded JSON."""
+    token = token or _config().todoist_api_token
+    if not token:
         raise TodoistAPIError(phase=phase, path=path, status=401, details="TODOIST_API_TOKEN bulunamadı veya geçersiz.")
 
     query = urllib.parse.urlencode(params or {})
-    url = f"{TODOIST_API_BASE}{path}"
-    if query:
-        url = f"{url}?{query}"
-
-    req = urllib.request.Request(
-        url,
-        headers={
-            "Authorization": f"Bearer {TODOIST_API_TOKEN}",
-            "User-Agent": "MorningBrief/1.0",
-        },
-    )
-
+    target = f"{path}?{query}" if query else path
+    client = _todoist_client()
     try:
-        with urllib.request.urlopen(req, timeout=20) as resp:
-            payload = resp.read().decode("utf-8")
-            return json.loads(payload)
-    except urllib.error.HTTPError as err:
-        body = err.read().decode("utf-8", errors="ignore")
-        if err.code == 429 and allow_retry:
-            wait_seconds = _safe_int(err.headers.get("Retry-After"), 2)
-            wait_seconds = max(1, min(wait_seconds, 15))
-            print(f"⚠️ Todoist[phase={phase}] hız sınırı ({path}): {wait_seconds} sn sonra tekrar denenecek.")
-            time.sleep(wait_seconds)
-            return _todoist_request(path, params=params, allow_retry=False, phase=phase)
-        raise TodoistAPIError(phase=phase, path=path, status=err.code, details=body[:180])
+        while True:
+            status, headers, body = client.request(token, "POST" if data is not None else "GET", target, form=data)
+            if status == 429 and allow_retry:
+                wait_seconds = _safe_int(headers.get("Retry-After"), 2)
+                wait_seconds = max(1, min(wait_seconds, TODOIST_MAX_RETRY_AFTER_SEC))
+                print(f"⚠️ Todoist[phase={phase}] hız sınırı ({path}): {wait_seconds} sn sonra tekrar denenecek.")
+                client.pause(token, wait_seconds)
+                allow_retry = False
+                continue
+            break
+        if status >= 400:
+            raise TodoistAPIError(phase=phase, path=path, status=status, details=body.decode("utf-8", errors="ignore")[:180])
+        return json.loads(body.decode("utf-8"))
+    except TodoistAPIError:
+        raise
     except Exception as err:
         raise TodoistAPIError(phase=phase, path=path, details=str(err))
 
+
+class _Prefetcher:
+    """Iterate `iterable` on a background thread, buffering at most `depth` items ahead.
+
+    The producer starts immediately, so several paginated streams can be
+    in flight while the caller consumes them one after another. `close()`
+    stops the producer at its next item.
+    """
+
+    _DONE = object()
+
+    def __init__(self, iterable, depth, name="prefetch"):
+        self._buffer = queue.Queue(maxsize=depth)
+        self._cancelled = threading.Event()
+        self._finished = False
+        threading.Thread(target=self._produce, args=(iterable,), name=name, daemon=True).start()
+
+    def _put(self, entry):
+        while not self._cancelled.is_set():
+            try:
+                self._buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, iterable):
+        try:
+            for item in iterable:
+                if not self._put((item, None)):
+                    return
+        except BaseException as err:
+            self._put((self._DONE, err))
+        else:
+            self._put((self._DONE, None))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished:
+            raise StopIteration
+        item, err = self._buffer.get()
+        if item is self._DONE:
+            self.close()
+            if err is not None:
+                raise err
+            raise StopIteration
+        return item
+
+    def close(self):
+        self._finished = True
+        self._cancelled.set()
+
+
 def _todoist_results(payload):
     if isinstance(payload, list):
         return payload
@@ -1807,6 +4718,23 @@ def _todoist_results(payload):
             return results
     return []
 
+
+TODOIST_PAGE_LIMIT = 200
+TODOIST_MAX_PAGES = 100
+
+
+def _todoist_paginate(path, params=None, phase="request", token=None):
+    """Yield every result of a paginated API v1 list endpoint, following `next_cursor`."""
+    params = dict(params or {}, limit=TODOIST_PAGE_LIMIT)
+    for _ in range(TODOIST_MAX_PAGES):
+        payload = _todoist_request(path, params=params, phase=phase, token=token)
+        yield from _todoist_results(payload)
+        cursor = payload.get("next_cursor") if isinstance(payload, dict) else None
+        if not cursor:
+            return
+        params["cursor"] = cursor
+    print(f"⚠️ Todoist[phase={phase}] {TODOIST_MAX_PAGES} sayfa sınırına ulaşıldı, kalan görevler atlandı.")
+
 def _parse_todoist_due(due_obj, qatar_tz, now_qatar):
     due = due_obj or {}
     due_raw = (due.get("date") or "").strip()
@@ -1853,10 +4781,8 @@ def _parse_todoist_due(due_obj, qatar_tz, now_qatar):
         return due_raw, due_sort, is_overdue, has_time, is_today
 
 
-def get_todoist_data(now_qatar):
-    """Fetch today's Todoist tasks/events in a non-blocking way."""
-    now_utc_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    empty_struct = {
+def _empty_todoist_struct():
+    return {
         "total_matched": 0,
         "displayed_count": 0,
         "overdue_count": 0,
@@ -1865,10 +4791,214 @@ def get_todoist_data(now_qatar):
         "overdue_items": [],
         "today_items": [],
     }
-    if not TODOIST_API_TOKEN:
+
+
+class _TodoistMirror:
+    """Local SQLite copy of Todoist tasks and projects, kept current with incremental sync.
+
+    Several accounts share one database; rows are keyed by a hash of the
+    token. Completed and deleted tasks are dropped, so the mirror only
+    holds open tasks, indexed by due day.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state ("
+                "account TEXT PRIMARY KEY, sync_token TEXT NOT NULL, synced_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS projects ("
+                "account TEXT NOT NULL, id TEXT NOT NULL, name TEXT NOT NULL, PRIMARY KEY (account, id))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "account TEXT NOT NULL, id TEXT NOT NULL, content TEXT NOT NULL, priority INTEGER, "
+                "project_id TEXT, due TEXT, due_day TEXT, PRIMARY KEY (account, id))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_due_day ON tasks (account, due_day)")
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        return sqlite3.connect(self.path, timeout=30)
+
+    def sync_token(self, account):
+        with self._connect() as conn:
+            row = conn.execute("SELECT sync_token FROM sync_state WHERE account = ?", (account,)).fetchone()
+        return row[0] if row else "*"
+
+    def apply(self, account, payload):
+        """Apply one `/sync` response; returns the number of task and project changes."""
+        items = [item for item in payload.get("items") or [] if isinstance(item, dict) and item.get("id")]
+        projects = [item for item in payload.get("projects") or [] if isinstance(item, dict) and item.get("id")]
+        with self._connect() as conn:
+            if payload.get("full_sync"):
+                conn.execute("DELETE FROM tasks WHERE account = ?", (account,))
+                conn.execute("DELETE FROM projects WHERE account = ?", (account,))
+            for item in items:
+                if item.get("is_deleted") or item.get("checked"):
+                    conn.execute("DELETE FROM tasks WHERE account = ? AND id = ?", (account, str(item["id"])))
+                    continue
+                due = item.get("due") if isinstance(item.get("due"), dict) else None
+                due_day = (due.get("date") or "")[:10] if due else ""
+                conn.execute(
+                    "INSERT OR REPLACE INTO tasks (account, id, content, priority, project_id, due, due_day) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        account,
+                        str(item["id"]),
+                        item.get("content") or "",
+                        _safe_int(item.get("priority"), 1),
+                        str(item.get("project_id") or ""),
+                        json.dumps(due, ensure_ascii=False) if due else None,
+                        due_day or None,
+                    ),
+                )
+            for project in projects:
+                if project.get("is_deleted"):
+                    conn.execute("DELETE FROM projects WHERE account = ? AND id = ?", (account, str(project["id"])))
+                else:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO projects (account, id, name) VALUES (?, ?, ?)",
+                        (account, str(project["id"]), project.get("name") or "Genel"),
+                    )
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (account, sync_token, synced_at) VALUES (?, ?, ?)",
+                (account, str(payload.get("sync_token") or "*"), time.time()),
+            )
+        return len(items) + len(projects)
+
+    def projects(self, account):
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT id, name FROM projects WHERE account = ?", (account,)))
+
+    def tasks_due_by(self, account, last_day):
+        """Open tasks due on or before `last_day` (ISO date), as API-shaped dicts."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, content, priority, project_id, due FROM tasks "
+                "WHERE account = ? AND due_day IS NOT NULL AND due_day <= ? ORDER BY due_day",
+                (account, last_day),
+            ).fetchall()
+        return [
+            {"id": task_id, "content": content, "priority": priority, "project_id": project_id,
+             "due": json.loads(due) if due else None}
+            for task_id, content, priority, project_id, due in rows
+        ]
+
+
+def _todoist_account_key(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+
+
+def _sync_todoist_mirror(token):
+    """Bring the local mirror up to date with Todoist's incremental sync and return it."""
+    mirror = _TodoistMirror(os.path.join(CACHE_DIR, "todoist-mirror.sqlite3"))
+    account = _todoist_account_key(token)
+    with _FileLock(f"todoist-sync-{account}"):
+        sync_token = mirror.sync_token(account)
+        request = {"resource_types": json.dumps(["items", "projects"])}
+        try:
+            payload = _todoist_request("/sync", data=dict(request, sync_token=sync_token), phase="sync", token=token)
+        except TodoistAPIError as err:
+            if sync_token == "*" or err.status != 400:
+                raise
+            print("⚠️ Todoist[phase=sync] sync_token reddedildi, tam senkronizasyon yapılıyor.")
+            payload = _todoist_request("/sync", data=dict(request, sync_token="*"), phase="sync", token=token)
+        if not isinstance(payload, dict) or not payload.get("sync_token"):
+            raise TodoistAPIError(phase="sync", path="/sync", details="Yanıtta sync_token yok.")
+        changes = mirror.apply(account, payload)
+    kind = "tam" if payload.get("full_sync") else "artımlı"
+    print(f"🔄 Todoist[phase=sync] {kind} senkronizasyon: {changes} değişiklik.")
+    return mirror, account
+
+
+def _todoist_mirror_tasks(token, local_tz, now_local):
+    """Overdue and today tasks from the synced mirror: `(project_map, [(task, False), ...])`.
+
+    Unlike the filter mode, tasks are classified from their stored due
+    date, so a date-only task Todoist has rolled forward counts as today.
+    """
+    mirror, account = _sync_todoist_mirror(token)
+    # A UTC due time can fall on the next local day, so read one day ahead and classify locally.
+    last_day = (now_local.date() + datetime.timedelta(days=1)).isoformat()
+    tasks = []
+    for task in mirror.tasks_due_by(account, last_day):
+        _, _, is_overdue, _, is_today = _parse_todoist_due(task["due"], local_tz, now_local)
+        if is_overdue or is_today:
+            tasks.append((task, False))
+    return mirror.projects(account), tasks
+
+
+TODOIST_PRIORITY_LABELS = {4: "P1", 3: "P2", 2: "P3", 1: "P4"}
+
+
+def _normalize_todoist_task(task, project_map, local_tz, now_local, in_overdue_filter):
+    """Display fields for one API task, or None when it has no content."""
+    content = (task.get("content") or "").strip()
+    if not content:
+        return None
+    if len(content) > 120:
+        content = content[:117] + "..."
+
+    due_text, due_sort, is_overdue, has_time, is_today = _parse_todoist_due(task.get("due"), local_tz, now_local)
+
+    # Trust Todoist's own "overdue" filter over local date arithmetic.
+    # Todoist rolls date-only tasks forward each day, so a task
+    # originally due yesterday may come back with today's date — yet
+    # Todoist still considers it overdue.
+    if in_overdue_filter:
+        is_overdue = True
+
+    priority_num = _safe_int(task.get("priority"), 1)
+    project_id = str(task.get("project_id") or "")
+    default_project_label = f"Proje {project_id}" if project_id else "Genel"
+    return {
+        "content": content,
+        "priority": TODOIST_PRIORITY_LABELS.get(priority_num, "P4"),
+        "priority_num": priority_num,
+        "project": project_map.get(project_id, default_project_label),
+        "due_text": due_text,
+        "due_sort": due_sort,
+        "is_overdue": is_overdue,
+        "has_time": has_time,
+        "is_today": is_today,
+    }
+
+
+def _todoist_rank(item):
+    """Display order: overdue first, then today, then the rest; earliest due and highest priority first."""
+    bucket = 0 if item["is_overdue"] else 1 if item.get("is_today") else 2
+    return bucket, item["due_sort"], -item["priority_num"]
+
+
+def _todoist_cache_name(token):
+    if not token or token == _config().todoist_api_token:
+        return "todoist.json"
+    return f"todoist-{_todoist_account_key(token)}.json"
+
+
+def get_todoist_data(now_qatar, token=None, max_items=None, tz_name=None):
+    """Fetch today's Todoist tasks/events in a non-blocking way.
+
+    Every page of the overdue and today filters is streamed; the summary
+    counts cover all matched tasks while only the best `max_items` are
+    kept for display. `token`, `max_items` and `tz_name` default to the
+    single-brief settings; batch mode passes each recipient's own values.
+    """
+    config = _config()
+    token = config.todoist_api_token if token is None else token
+    max_items = config.todoist_max_items if max_items is None else max_items
+    tz_name = tz_name or config.timezone
+    cache_name = _todoist_cache_name(token)
+    now_utc_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    empty_struct = _empty_todoist_struct()
+    if not token:
         return "(Todoist bağlantısı yapılandırılmamış.)", now_utc_iso, empty_struct
 
-    fresh_cache = _load_cache("todoist.json", ttl_minutes=TODOIST_CACHE_TTL_MIN)
+    fresh_cache = _load_cache(cache_name, ttl_minutes=config.todoist_cache_ttl_min)
     if fresh_cache:
         cached_data = fresh_cache.get("data", {}) if isinstance(fresh_cache, dict) else {}
         cached_struct = cached_data.get("structured")
@@ -1879,133 +5009,111 @@ def get_todoist_data(now_qatar):
         else:
             print("⚠️ Todoist[phase=cache_read] güncel önbellek yapısı bozuk, canlı veriye geçiliyor.")
 
-    stale_cache = _load_cache_any("todoist.json")
-    priority_map = {4: "P1", 3: "P2", 2: "P3", 1: "P4"}
-    qatar_tz = pytz.timezone(TIMEZONE)
-    print(f"ℹ️ Todoist[phase=init] entegrasyon aktif. Token: {_mask_for_log(TODOIST_API_TOKEN)}, filtre: '{TODOIST_FILTER}'")
+    stale_cache = _load_cache_any(cache_name)
+    qatar_tz = pytz.timezone(tz_name)
+    print(f"ℹ️ Todoist[phase=init] entegrasyon aktif. Token: {_mask_for_log(token)}, filtre: '{config.todoist_filter}'")
+
+    sync_mode = config.todoist_sync_mode
+    if sync_mode not in ("filter", "sync"):
+        print(f"⚠️ Desteklenmeyen TODOIST_SYNC_MODE='{sync_mode}'. filter kullanılıyor.")
+        sync_mode = "filter"
 
     try:
-        # Fetch overdue and today tasks with separate API calls so we can use
-        # Todoist's own filter classification instead of re-deriving it from the
-        # due date. This is necessary because Todoist rolls date-only tasks
-        # forward each day, making previously-overdue tasks appear with today's
-        # date — which would incorrectly classify them as "today" if we relied
-        # solely on date comparison.
-        def _fetch_filter(query, phase):
+        failed_filters = []
+        counts = collections.Counter()
+
+        def _fetch_project_map():
             try:
-                payload = _todoist_request("/tasks/filter", params={"query": query}, phase=phase)
-                return _todoist_results(payload)
+                return {
+                    str(item.get("id")): item.get("name", "Genel")
+                    for item in _todoist_paginate("/projects", phase="projects_fetch", token=token)
+                    if isinstance(item, dict)
+                }
+            except TodoistAPIError as err:
+                print(
+                    f"⚠️ Todoist[phase=projects_fetch] proje adları alınamadı "
+                    f"(status={err.status}). Görevler proje kimliğiyle devam edecek."
+                )
+                return {}
+
+        def _filter_tasks(query, phase):
+            try:
+                yield from _todoist_paginate("/tasks/filter", params={"query": query}, phase=phase, token=token)
             except TodoistAPIError as err:
                 if err.status == 400:
                     print(f"⚠️ Todoist[phase={phase}] filtre geçersiz ('{query}'), atlanıyor.")
-                    return None
+                    failed_filters.append(query)
+                    return
                 raise
 
-        overdue_raw = _fetch_filter("overdue", "tasks_fetch_overdue")
-        today_raw = _fetch_filter("today", "tasks_fetch_today")
+        streams = []
+        if sync_mode == "sync":
+            project_map, source = _todoist_mirror_tasks(token, qatar_tz, now_qatar)
+        else:
+            # Fetch overdue and today tasks with separate filter queries so we can
+            # use Todoist's own filter classification instead of re-deriving it
+            # from the due date. This is necessary because Todoist rolls date-only
+            # tasks forward each day, making previously-overdue tasks appear with
+            # today's date — which would incorrectly classify them as "today" if we
+            # relied solely on date comparison.
+            # Both filters page in the background (a couple of pages ahead) while
+            # projects load, so the phase costs about as much as its slowest call.
+            streams = [
+                (query, _Prefetcher(_filter_tasks(query, phase), 2 * TODOIST_PAGE_LIMIT, name=f"todoist-{query}"))
+                for query, phase in (("overdue", "tasks_fetch_overdue"), ("today", "tasks_fetch_today"))
+            ]
+            project_map = _fetch_project_map()
+            source = ((task, query == "overdue") for query, stream in streams for task in stream)
+
+        def _stream_tasks():
+            # Pages are consumed as they arrive; only task ids are kept for
+            # de-duplication (overdue is read first, so it takes priority).
+            seen_ids = set()
+            for task, in_overdue_filter in source:
+                if not isinstance(task, dict) or not task.get("id"):
+                    continue
+                task_id = str(task["id"])
+                if task_id in seen_ids:
+                    continue
+                seen_ids.add(task_id)
+                try:
+                    item = _normalize_todoist_task(task, project_map, qatar_tz, now_qatar, in_overdue_filter)
+                except Exception as err:
+                    print(f"⚠️ Todoist[phase=normalize] bir görev atlandı: {err}")
+                    continue
+                if item is None:
+                    continue
+                counts["total"] += 1
+                counts["overdue_total"] += item["is_overdue"]
+                counts["today_total"] += bool(item.get("is_today")) and not item["is_overdue"]
+                counts["timed_total"] += item["has_time"]
+                yield item
+
+        max_items = max(1, max_items)
+        # nsmallest keeps a heap of `max_items` entries and is stable for ties.
+        try:
+            selected_items = heapq.nsmallest(max_items, _stream_tasks(), key=_todoist_rank)
+        finally:
+            for _, stream in streams:
+                stream.close()
 
-        if overdue_raw is None and today_raw is None:
+        if len(failed_filters) == 2:
             raise TodoistAPIError(
                 phase="tasks_fetch",
                 path="/tasks/filter",
                 details="Hem 'overdue' hem 'today' filtreleri başarısız oldu.",
             )
 
-        overdue_raw = overdue_raw or []
-        today_raw = today_raw or []
-
-        # Build a set of task IDs that Todoist itself considers overdue.
-        overdue_ids = {str(t.get("id")) for t in overdue_raw if isinstance(t, dict) and t.get("id")}
-
-        # Merge both lists, deduplicating by task ID (overdue takes priority).
-        tasks_by_id = {}
-        for t in today_raw:
-            if isinstance(t, dict) and t.get("id"):
-                tasks_by_id[str(t.get("id"))] = t
-        for t in overdue_raw:
-            if isinstance(t, dict) and t.get("id"):
-                tasks_by_id[str(t.get("id"))] = t
-        tasks = list(tasks_by_id.values())
-
-        print(f"✅ Todoist[phase=tasks_fetch] {len(tasks)} görev alındı "
-              f"(gecikmiş: {len(overdue_raw)}, bugün: {len(today_raw)}).")
-
-        project_map = {}
-        try:
-            projects_payload = _todoist_request("/projects", phase="projects_fetch")
-            projects = _todoist_results(projects_payload)
-            project_map = {
-                str(item.get("id")): item.get("name", "Genel")
-                for item in projects
-                if isinstance(item, dict)
-            }
-        except TodoistAPIError as err:
-            print(
-                f"⚠️ Todoist[phase=projects_fetch] proje adları alınamadı "
-                f"(status={err.status}). Görevler proje kimliğiyle devam edecek."
-            )
-
-        normalized = []
-        for task in tasks:
-            try:
-                if not isinstance(task, dict):
-                    continue
-                content = (task.get("content") or "").strip()
-                if not content:
-                    continue
-                if len(content) > 120:
-                    content = content[:117] + "..."
-
-                due_text, due_sort, is_overdue, has_time, is_today = _parse_todoist_due(task.get("due"), qatar_tz, now_qatar)
-
-                # Trust Todoist's own "overdue" filter over local date arithmetic.
-                # Todoist rolls date-only tasks forward each day, so a task
-                # originally due yesterday may come back with today's date — yet
-                # Todoist still considers it overdue.
-                task_id = str(task.get("id") or "")
-                if task_id in overdue_ids:
-                    is_overdue = True
-
-                priority_num = _safe_int(task.get("priority"), 1)
-                project_id = str(task.get("project_id") or "")
-                default_project_label = f"Proje {project_id}" if project_id else "Genel"
-                normalized.append({
-                    "content": content,
-                    "priority": priority_map.get(priority_num, "P4"),
-                    "priority_num": priority_num,
-                    "project": project_map.get(project_id, default_project_label),
-                    "due_text": due_text,
-                    "due_sort": due_sort,
-                    "is_overdue": is_overdue,
-                    "has_time": has_time,
-                    "is_today": is_today,
-                })
-            except Exception as err:
-                print(f"⚠️ Todoist[phase=normalize] bir görev atlandı: {err}")
-                continue
-
-        normalized.sort(key=lambda item: (0 if item["is_overdue"] else 1, item["due_sort"], -item["priority_num"]))
-        total_matched = len(normalized)
-        max_items = max(1, TODOIST_MAX_ITEMS)
-        overdue_all = [item for item in normalized if item["is_overdue"]]
-        today_all = [item for item in normalized if item.get("is_today") and not item["is_overdue"]]
-        other_all = [item for item in normalized if not item["is_overdue"] and not item.get("is_today")]
-
-        selected_items = []
-        for bucket in (overdue_all, today_all, other_all):
-            for item in bucket:
-                if len(selected_items) >= max_items:
-                    break
-                selected_items.append(item)
-            if len(selected_items) >= max_items:
-                break
+        print(f"✅ Todoist[phase=tasks_fetch] {counts['total']} görev alındı "
+              f"(gecikmiş: {counts['overdue_total']}, bugün: {counts['today_total']}).")
 
+        total_matched = counts["total"]
         overdue_items = [item for item in selected_items if item["is_overdue"]]
         today_items = [item for item in selected_items if item.get("is_today") and not item["is_overdue"]]
 
-        overdue_count = sum(1 for item in selected_items if item["is_overdue"])
-        today_count = sum(1 for item in selected_items if item.get("is_today") and not item["is_overdue"])
-        timed_today_count = sum(1 for item in selected_items if item["has_time"])
+        overdue_count = counts["overdue_total"]
+        today_count = counts["today_total"]
+        timed_today_count = counts["timed_total"]
 
         summary = (
             f"  Toplam görev (filtre): {total_matched} | Gösterilen: {len(selected_items)} | "
@@ -2034,7 +5142,11 @@ def get_todoist_data(now_qatar):
             "overdue_items": overdue_items,
             "today_items": today_items,
         }
-        _save_cache("todoist.json", {"text": text, "fetched_at": fetched_at, "structured": structured})
+        _save_cache(
+            cache_name,
+            {"text": text, "fetched_at": fetched_at, "structured": structured},
+            ttl_minutes=config.todoist_cache_ttl_min,
+        )
         return text, fetched_at, structured
     except Exception as err:
         if isinstance(err, TodoistAPIError):
@@ -2046,7 +5158,7 @@ def get_todoist_data(now_qatar):
             elif err.status == 400:
                 print(
                     f"⚠️ Todoist[phase={err.phase}] geçersiz istek (status=400). "
-                    f"Filtreyi kontrol et: '{TODOIST_FILTER}'."
+                    f"Filtreyi kontrol et: '{config.todoist_filter}'."
                 )
             elif err.status in (429, 500, 502, 503, 504):
                 print(
@@ -2068,12 +5180,44 @@ def get_todoist_data(now_qatar):
         return "(Todoist verisi alınamadı.)", now_utc_iso, empty_struct
 
 
-def get_planetary_data(now_qatar):
-    """Compute real planetary positions using Swiss Ephemeris via kerykeion."""
-    try:
-        AstrologicalSubjectFactory = _get_astrological_subject_factory()
-        # Current sky (transit chart) from Doha
-        transit = AstrologicalSubjectFactory.from_birth_data(
+_EPHEMERIS_LOCK = threading.Lock()
+ZODIAC_SIGNS_TR = {
+    "Ari": "Koç", "Tau": "Boğa", "Gem": "İkizler", "Can": "Yengeç",
+    "Leo": "Aslan", "Vir": "Başak", "Lib": "Terazi", "Sco": "Akrep",
+    "Sag": "Yay", "Cap": "Oğlak", "Aqu": "Kova", "Pis": "Balık",
+}
+
+
+def _default_natal_profile():
+    config = _config()
+    return {
+        "year": config.natal_year,
+        "month": config.natal_month,
+        "day": config.natal_day,
+        "hour": config.natal_hour,
+        "minute": config.natal_minute,
+        "lat": config.natal_lat,
+        "lng": config.natal_lng,
+        "tz": config.natal_tz,
+    }
+
+
+TRANSIT_PLANET_KEYS = [
+    "sun", "moon", "mercury", "venus", "mars",
+    "jupiter", "saturn", "uranus", "neptune", "pluto",
+]
+ZODIAC_SIGN_KEYS = ["Ari", "Tau", "Gem", "Can", "Leo", "Vir", "Lib", "Sco", "Sag", "Cap", "Aqu", "Pis"]
+NATAL_CACHE_VERSION = 1
+_TRANSIT_TABLE = None
+_TRANSIT_TABLE_LOCK = threading.Lock()
+
+
+def _compute_transit_chart(now_qatar):
+    """Current sky (transit chart) from Doha."""
+    AstrologicalSubjectFactory = _get_astrological_subject_factory()
+    # Swiss Ephemeris keeps global state; batch workers must not compute charts concurrently.
+    with _EPHEMERIS_LOCK:
+        return AstrologicalSubjectFactory.from_birth_data(
             name="Güncel Gökyüzü",
             year=now_qatar.year,
             month=now_qatar.month,
@@ -2086,85 +5230,637 @@ def get_planetary_data(now_qatar):
             online=False,
         )
 
-        # Fatih's natal chart
-        natal = AstrologicalSubjectFactory.from_birth_data(
-            name="Fatih",
-            year=NATAL_YEAR,
-            month=NATAL_MONTH,
-            day=NATAL_DAY,
-            hour=NATAL_HOUR,
-            minute=NATAL_MINUTE,
-            lng=NATAL_LNG,
-            lat=NATAL_LAT,
-            tz_str=NATAL_TZ,
+
+def _compute_natal_chart(natal, name):
+    AstrologicalSubjectFactory = _get_astrological_subject_factory()
+    with _EPHEMERIS_LOCK:
+        return AstrologicalSubjectFactory.from_birth_data(
+            name=name,
+            year=natal["year"],
+            month=natal["month"],
+            day=natal["day"],
+            hour=natal["hour"],
+            minute=natal["minute"],
+            lng=natal["lng"],
+            lat=natal["lat"],
+            tz_str=natal["tz"],
             online=False,
         )
 
-        # Zodiac sign Turkish mapping
-        sign_tr = {
-            "Ari": "Koç", "Tau": "Boğa", "Gem": "İkizler", "Can": "Yengeç",
-            "Leo": "Aslan", "Vir": "Başak", "Lib": "Terazi", "Sco": "Akrep",
-            "Sag": "Yay", "Cap": "Oğlak", "Aqu": "Kova", "Pis": "Balık",
+
+def _position_from_longitude(abs_pos, retrograde=False):
+    abs_pos = float(abs_pos) % 360.0
+    return {
+        "sign": ZODIAC_SIGN_KEYS[int(abs_pos // 30) % 12],
+        "position": abs_pos % 30.0,
+        "abs_pos": abs_pos,
+        "retrograde": bool(retrograde),
+    }
+
+
+def _chart_positions(chart):
+    """Plain `{planet: {sign, position, abs_pos, retrograde}}` dict from a kerykeion subject."""
+    positions = {}
+    for key in TRANSIT_PLANET_KEYS:
+        point = getattr(chart, key, None)
+        if point is None:
+            continue
+        positions[key] = {
+            "sign": point.sign,
+            "position": float(point.position),
+            "abs_pos": float(point.abs_pos),
+            "retrograde": bool(getattr(point, "retrograde", False)),
+        }
+    ascendant = getattr(chart, "ascendant", None) or getattr(chart, "first_house", None)
+    if ascendant is not None:
+        positions["ascendant"] = {"sign": ascendant.sign}
+    return positions
+
+
+def _natal_cache_name(natal):
+    raw = json.dumps({"v": NATAL_CACHE_VERSION, "natal": natal}, sort_keys=True)
+    return f"natal-{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]}.json"
+
+
+def _natal_positions(natal, name):
+    """Natal positions never change, so they are computed once per profile and kept in the cache."""
+    cache_name = _natal_cache_name(natal)
+    cached = _load_cache_any(cache_name)
+    if cached and isinstance(cached.get("data"), dict) and cached["data"].get("sun"):
+        return cached["data"]
+    positions = _chart_positions(_compute_natal_chart(natal, name))
+    _save_cache(cache_name, positions)
+    return positions
+
+
+def _transit_table_paths(directory=None):
+    directory = directory or _config().ephemeris_table_dir
+    return os.path.join(directory, "transits.json"), os.path.join(directory, "transits.f32")
+
+
+def _swisseph_data_path():
+    """kerykeion's bundled ephemeris files, located without importing kerykeion."""
+    spec = importlib.util.find_spec("kerykeion")
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    path = os.path.join(list(spec.submodule_search_locations)[0], "sweph")
+    return path if os.path.isdir(path) else None
+
+
+def precompute_transit_table(start_utc, days=365, step_minutes=None, directory=None):
+    """Write geocentric longitudes of the ten transit planets at a fixed step.
+
+    The table is a flat float32 array (`count` rows x 10 planets) next to a
+    small JSON header, so daily runs can look positions up without importing
+    kerykeion or calling Swiss Ephemeris.
+    """
+    swe = _get_swisseph()
+    step_minutes = step_minutes or _config().ephemeris_table_step_min
+    step_sec = step_minutes * 60
+    if start_utc.tzinfo is None:
+        start_utc = start_utc.replace(tzinfo=datetime.timezone.utc)
+    start_utc = start_utc.astimezone(datetime.timezone.utc)
+    count = int(days * 86400 // step_sec) + 1
+    planet_ids = [getattr(swe, key.upper()) for key in TRANSIT_PLANET_KEYS]
+    values = array.array("f")
+    with _EPHEMERIS_LOCK:
+        ephe_path = _swisseph_data_path()
+        if ephe_path:
+            swe.set_ephe_path(ephe_path)
+        start_jd = swe.julday(
+            start_utc.year, start_utc.month, start_utc.day,
+            start_utc.hour + start_utc.minute / 60.0 + start_utc.second / 3600.0,
+        )
+        step_days = step_sec / 86400.0
+        for row in range(count):
+            jd = start_jd + row * step_days
+            for planet_id in planet_ids:
+                values.append(swe.calc_ut(jd, planet_id, swe.FLG_SWIEPH)[0][0])
+
+    meta_path, data_path = _transit_table_paths(directory)
+    meta = {
+        "version": 1,
+        "start_utc": start_utc.isoformat(),
+        "step_sec": step_sec,
+        "count": count,
+        "planets": TRANSIT_PLANET_KEYS,
+        "byteorder": sys.byteorder,
+    }
+    _atomic_write_bytes(data_path, values.tobytes())
+    _atomic_write_bytes(meta_path, json.dumps(meta).encode("utf-8"))
+    print(
+        f"✅ Transit tablosu yazıldı: {data_path} ({count} satır, {step_minutes} dk adım, "
+        f"{len(values) * values.itemsize} bayt)."
+    )
+    return meta
+
+
+def _load_transit_table(directory=None):
+    """Load (and memoize per file mtime) the precomputed transit table, or return None."""
+    global _TRANSIT_TABLE
+    meta_path, data_path = _transit_table_paths(directory)
+    try:
+        mtime = os.stat(data_path).st_mtime
+    except OSError:
+        return None
+    with _TRANSIT_TABLE_LOCK:
+        cached = _TRANSIT_TABLE
+        if cached and cached["path"] == data_path and cached["mtime"] == mtime:
+            return cached
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            values = array.array("f")
+            with open(data_path, "rb") as f:
+                values.frombytes(f.read())
+            if meta.get("byteorder", sys.byteorder) != sys.byteorder:
+                values.byteswap()
+            start = _parse_iso_datetime(meta["start_utc"])
+            planets = list(meta["planets"])
+            count = int(meta["count"])
+            step_sec = int(meta["step_sec"])
+        except (OSError, ValueError, KeyError, TypeError) as err:
+            print(f"⚠️ Transit tablosu okunamadı ({data_path}): {err}")
+            return None
+        if start is None or len(values) != count * len(planets) or step_sec <= 0:
+            print(f"⚠️ Transit tablosu bozuk görünüyor: {data_path}")
+            return None
+        _TRANSIT_TABLE = {
+            "path": data_path,
+            "mtime": mtime,
+            "start": start,
+            "step_sec": step_sec,
+            "count": count,
+            "planets": planets,
+            "values": values,
         }
+        return _TRANSIT_TABLE
+
+
+def _transit_positions_from_table(table, moment):
+    """Interpolate positions at `moment`; None when the table does not cover it."""
+    offset = (moment - table["start"]).total_seconds() / table["step_sec"]
+    if offset < 0 or int(offset) + 1 >= table["count"]:
+        return None
+    row = int(offset)
+    fraction = offset - row
+    width = len(table["planets"])
+    values = table["values"]
+    positions = {}
+    for index, key in enumerate(table["planets"]):
+        before = values[row * width + index]
+        after = values[(row + 1) * width + index]
+        delta = (after - before + 180.0) % 360.0 - 180.0
+        positions[key] = _position_from_longitude(before + delta * fraction, retrograde=delta < 0)
+    return positions
+
+
+def _transit_positions(now_qatar):
+    """Current transit positions, read from the precomputed table when it covers `now_qatar`."""
+    table = _load_transit_table()
+    if table is not None:
+        positions = _transit_positions_from_table(table, now_qatar.astimezone(datetime.timezone.utc))
+        if positions is not None:
+            return positions
+        print("ℹ️ Transit tablosu bu tarihi kapsamıyor; Swiss Ephemeris ile hesaplanıyor.")
+    return _chart_positions(_compute_transit_chart(now_qatar))
+
+
+def _natal_headline(natal):
+    sun = ZODIAC_SIGNS_TR.get(natal["sun"]["sign"], natal["sun"]["sign"])
+    moon = ZODIAC_SIGNS_TR.get(natal["moon"]["sign"], natal["moon"]["sign"])
+    ascendant = natal.get("ascendant")
+    if not ascendant:
+        return f"  Güneş: {sun}, Ay: {moon}"
+    rising = ZODIAC_SIGNS_TR.get(ascendant["sign"], ascendant["sign"])
+    return f"  Güneş: {sun}, Ay: {moon}, Yükselen: {rising}"
+
+
+def get_planetary_data(now_qatar, natal_profile=None, transit=None, person_name=None, birth_data=None):
+    """Compute real planetary positions using Swiss Ephemeris via kerykeion.
+
+    Transit positions come from the precomputed table when one covers the
+    current time, and natal positions are cached per birth profile. Batch
+    mode computes `transit` once and passes each recipient's natal profile;
+    a `None` natal profile falls back to the `NATAL_*` settings.
+    """
+    person_name = person_name or _config().recipient_name
+    birth_data = birth_data or _config().user_birth_data
+    try:
+        if transit is None:
+            transit = _transit_positions(now_qatar)
+        natal = _natal_positions(natal_profile or _default_natal_profile(), person_name)
 
         planets = [
-            ("Güneş", transit.sun), ("Ay", transit.moon),
-            ("Merkür", transit.mercury), ("Venüs", transit.venus),
-            ("Mars", transit.mars), ("Jüpiter", transit.jupiter),
-            ("Satürn", transit.saturn), ("Uranüs", transit.uranus),
-            ("Neptün", transit.neptune), ("Plüton", transit.pluto),
+            ("Güneş", transit["sun"]), ("Ay", transit["moon"]),
+            ("Merkür", transit["mercury"]), ("Venüs", transit["venus"]),
+            ("Mars", transit["mars"]), ("Jüpiter", transit["jupiter"]),
+            ("Satürn", transit["saturn"]), ("Uranüs", transit["uranus"]),
+            ("Neptün", transit["neptune"]), ("Plüton", transit["pluto"]),
         ]
 
         natal_planets = [
-            ("Güneş", natal.sun), ("Ay", natal.moon),
-            ("Merkür", natal.mercury), ("Venüs", natal.venus),
-            ("Mars", natal.mars), ("Jüpiter", natal.jupiter),
-            ("Satürn", natal.saturn),
+            ("Güneş", natal["sun"]), ("Ay", natal["moon"]),
+            ("Merkür", natal["mercury"]), ("Venüs", natal["venus"]),
+            ("Mars", natal["mars"]), ("Jüpiter", natal["jupiter"]),
+            ("Satürn", natal["saturn"]),
         ]
 
         # Build transit positions text
         lines = []
         for name, planet in planets:
-            sign = sign_tr.get(planet.sign, planet.sign)
-            retro = " (Retrograd)" if getattr(planet, 'retrograde', False) else ""
-            lines.append(f"  {name}: {sign} {planet.position:.1f}°{retro}")
+            sign = ZODIAC_SIGNS_TR.get(planet["sign"], planet["sign"])
+            retro = " (Retrograd)" if planet.get("retrograde") else ""
+            lines.append(f"  {name}: {sign} {planet['position']:.1f}°{retro}")
 
         transit_text = "\n".join(lines)
 
-        # Build natal positions text
-        natal_lines = []
-        for name, planet in natal_planets:
-            sign = sign_tr.get(planet.sign, planet.sign)
-            natal_lines.append(f"  {name}: {sign} {planet.position:.1f}°")
+        # Build natal positions text
+        natal_lines = []
+        for name, planet in natal_planets:
+            sign = ZODIAC_SIGNS_TR.get(planet["sign"], planet["sign"])
+            natal_lines.append(f"  {name}: {sign} {planet['position']:.1f}°")
+
+        natal_text = "\n".join(natal_lines)
+
+        # Moon phase info
+        moon_sign = ZODIAC_SIGNS_TR.get(transit["moon"]["sign"], transit["moon"]["sign"])
+        moon_deg = transit["moon"]["position"]
+
+        return f"""
+GERÇEK GEZEGENSEL VERİLER (Swiss Ephemeris - bugünkü hesaplama):
+
+GÜNCEL TRANSİT POZİSYONLARI (Doha, {now_qatar.strftime('%d.%m.%Y %H:%M')}):
+{transit_text}
+
+NATAL HARİTA — {person_name} ({birth_data}):
+{_natal_headline(natal)}
+{natal_text}
+
+AY BİLGİSİ:
+  Ay şu anda {moon_sign} burcunda, {moon_deg:.1f}° konumunda.
+"""
+    except Exception as e:
+        print(f"⚠️ Ephemeris hesaplama hatası: {e}")
+        return "\n(Efemeris verisi hesaplanamadı, genel astroloji bilgisi kullan.)\n"
+
+
+def _run_data_sources(sources, max_workers=None):
+    """Run data collectors concurrently, each bounded by its own deadline.
+
+    `sources` maps a source name to `(collector, deadline_sec, fallback)`.
+    A deadline counts from the moment the collector starts running, so
+    queued collectors in large batches are not penalised for waiting.
+    Returns `{name: {"status", "value", "elapsed"}}` where status is one of
+    `ok`, `error` or `timeout`; failed or late sources carry their fallback.
+
+    Collectors run on daemon threads rather than a `ThreadPoolExecutor`,
+    whose workers are joined at interpreter exit: a collector stuck past its
+    deadline (a yfinance call has no timeout of its own) is abandoned and
+    cannot keep the process alive once the brief is sent.
+    """
+    results = {}
+    if not sources:
+        return results
+
+    workers = max(1, min(max_workers or _config().data_fetch_workers, len(sources)))
+    started = time.monotonic()
+    started_at = {}
+    jobs = queue.SimpleQueue()
+    futures = {}
+    for name, (collector, _, _) in sources.items():
+        future = Future()
+        futures[future] = name
+        jobs.put((future, name, collector))
+
+    def _worker():
+        while True:
+            try:
+                future, name, collector = jobs.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            started_at[name] = time.monotonic()
+            try:
+                future.set_result(collector())
+            except BaseException as err:
+                future.set_exception(err)
+
+    for index in range(workers):
+        threading.Thread(target=_worker, name=f"brief-data_{index}", daemon=True).start()
+
+    def _deadline(future):
+        name = futures[future]
+        if name not in started_at:
+            return None
+        return started_at[name] + max(0.0, float(sources[name][1]))
+
+    pending = set(futures)
+    try:
+        while pending:
+            now = time.monotonic()
+            for future in [f for f in pending if not f.done() and (_deadline(f) or float("inf")) <= now]:
+                pending.discard(future)
+                name = futures[future]
+                results[name] = {"status": "timeout", "value": sources[name][2], "elapsed": now - started}
+                print(f"⚠️ Veri kaynağı zaman aşımı: {name} ({sources[name][1]}s). Yedek değer kullanılıyor.")
+            if not pending:
+                break
+
+            deadlines = [d for d in (_deadline(f) for f in pending) if d is not None]
+            wait_for = min(deadlines) - now if deadlines else 0.25
+            if len(deadlines) < len(pending):
+                wait_for = min(wait_for, 0.25)
+            done, pending = wait(pending, timeout=max(0.0, wait_for), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures[future]
+                elapsed = time.monotonic() - started
+                try:
+                    results[name] = {"status": "ok", "value": future.result(), "elapsed": elapsed}
+                except Exception as err:
+                    print(f"⚠️ Veri kaynağı hatası ({name}): {err}")
+                    results[name] = {"status": "error", "value": sources[name][2], "elapsed": elapsed}
+    finally:
+        # Collectors that never started are dropped; late ones run on in their daemon threads.
+        for future in futures:
+            future.cancel()
+
+    if len(sources) <= 8:
+        summary = ", ".join(
+            f"{name}={results[name]['elapsed']:.1f}s/{results[name]['status']}" for name in sources if name in results
+        )
+    else:
+        statuses = [result["status"] for result in results.values()]
+        summary = ", ".join(f"{status}={statuses.count(status)}" for status in ("ok", "error", "timeout"))
+    print(f"⏱️ Veri toplama tamamlandı ({time.monotonic() - started:.1f}s): {summary}")
+    return results
+
+
+def _default_location():
+    return {"label": DOHA_LABEL, "lat": DOHA_LAT, "lng": DOHA_LNG, "tz": DOHA_TZ}
+
+
+def _default_recipient_profile():
+    """Profile for the classic single-brief run, built from module settings."""
+    config = _config()
+    return {
+        "id": "default",
+        "name": config.recipient_name,
+        "email_to": config.email_to,
+        "timezone": config.timezone,
+        "birth_data": config.user_birth_data,
+        "natal": _default_natal_profile(),
+        "location": _default_location(),
+        "tickers": None,
+        "display_tickers": None,
+        "shares": None,
+        "todoist_token": config.todoist_api_token,
+        "todoist_max_items": config.todoist_max_items,
+        "sections": list(config.brief_enabled_sections),
+        "output_path": "index.html",
+    }
+
+
+def _normalize_recipient_profile(raw, index):
+    """Validate one entry of the recipients file and fill in defaults.
+
+    Entries use the same camelCase keys as `brief-settings.json`:
+    `id`, `name`, `email`, `timezone`, `birthData`, `natal`
+    (`year`, `month`, `day`, `hour`, `minute`, `lat`, `lng`, `tz`),
+    `location` (`label`, `lat`, `lng`, `tz`), `holdings`, `todoistToken`
+    or `todoistTokenEnv`, `todoistMaxItems` and `sections`.
+    """
+    config = _config()
+    if not isinstance(raw, dict):
+        raise ValueError(f"alıcı #{index + 1} bir JSON nesnesi olmalı")
+    profile_id = re.sub(r"[^A-Za-z0-9_-]+", "-", str(raw.get("id") or f"recipient-{index + 1}")).strip("-")[:48]
+    profile_id = profile_id or f"recipient-{index + 1}"
+    timezone = str(raw.get("timezone") or config.timezone).strip()
+    pytz.timezone(timezone)
+
+    email_to = str(raw.get("email") or "").strip()
+    if not email_to:
+        raise ValueError(f"{profile_id}: 'email' alanı zorunlu")
+
+    raw_natal = raw.get("natal")
+    if not isinstance(raw_natal, dict):
+        raise ValueError(f"{profile_id}: 'natal' alanı zorunlu")
+    natal = {key: _safe_int(raw_natal.get(key), None) for key in ("year", "month", "day", "hour", "minute")}
+    missing = [key for key, value in natal.items() if value is None]
+    if missing:
+        raise ValueError(f"{profile_id}: natal alanları eksik ({', '.join(missing)})")
+    natal["lat"] = float(raw_natal["lat"])
+    natal["lng"] = float(raw_natal["lng"])
+    natal["tz"] = str(raw_natal.get("tz") or timezone).strip()
+
+    raw_location = raw.get("location")
+    if isinstance(raw_location, dict) and raw_location:
+        location = {
+            "label": str(raw_location.get("label") or DOHA_LABEL).strip(),
+            "lat": float(raw_location["lat"]),
+            "lng": float(raw_location["lng"]),
+            "tz": str(raw_location.get("tz") or timezone).strip(),
+        }
+    else:
+        location = _default_location()
+
+    holdings = raw.get("holdings")
+    # The operator's fallback ETF list is not the recipient's portfolio.
+    tickers = _tickers_from_holdings(holdings)
+    display_tickers = {}
+    for item in holdings if isinstance(holdings, list) else []:
+        ticker, display = _normalize_market_ticker(item.get("ticker") if isinstance(item, dict) else item)
+        if ticker in tickers:
+            display_tickers[ticker] = display
+
+    token_env = str(raw.get("todoistTokenEnv") or "").strip()
+    raw_token = raw.get("todoistToken") or (os.environ.get(token_env) if token_env else "")
+    sections = raw.get("sections")
+    sections = _brief_enabled_sections(sections) if isinstance(sections, dict) else list(config.brief_enabled_sections)
+    if not tickers:
+        sections = [section_id for section_id in sections if section_id != "finans"]
+
+    return {
+        "id": profile_id,
+        "name": str(raw.get("name") or "").strip() or profile_id,
+        "email_to": email_to,
+        "timezone": timezone,
+        "birth_data": str(raw.get("birthData") or "kişisel profil yapılandırıldı").strip(),
+        "natal": natal,
+        "location": location,
+        "tickers": tickers,
+        "display_tickers": display_tickers,
+        "shares": _shares_from_holdings(holdings),
+        "todoist_token": _normalize_todoist_token(raw_token),
+        "todoist_max_items": max(1, min(20, _safe_int(raw.get("todoistMaxItems"), config.todoist_max_items))),
+        "sections": sections,
+        "output_path": os.path.join(config.brief_batch_output_dir, f"{profile_id}.html"),
+    }
+
+
+def _load_recipient_profiles(path):
+    with open(path, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    raw_profiles = payload.get("recipients", []) if isinstance(payload, dict) else payload
+    if not isinstance(raw_profiles, list):
+        raise ValueError(f"{path}: alıcı listesi bulunamadı")
+
+    profiles = []
+    seen_ids = set()
+    for index, raw in enumerate(raw_profiles):
+        try:
+            profile = _normalize_recipient_profile(raw, index)
+        except Exception as err:
+            print(f"⚠️ Alıcı profili atlandı (#{index + 1}): {err}")
+            continue
+        if profile["id"] in seen_ids:
+            print(f"⚠️ Alıcı profili atlandı: '{profile['id']}' kimliği tekrar ediyor.")
+            continue
+        seen_ids.add(profile["id"])
+        profiles.append(profile)
+    return profiles
+
+
+def _now_in_timezone(tz_name):
+    return datetime.datetime.now(pytz.timezone(tz_name))
+
+
+def _planetary_fallback_text():
+    return "\n(Efemeris verisi hesaplanamadı, genel astroloji bilgisi kullan.)\n"
+
+
+def _gather_brief_inputs(now_qatar):
+    """Fan out the planetary, finance, weather and Todoist collectors."""
+    config = _config()
+    now_utc_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    sources = {
+        "planetary": (
+            lambda: get_planetary_data(now_qatar),
+            config.data_fetch_deadlines_sec["planetary"],
+            _planetary_fallback_text(),
+        ),
+        "finance": (
+            get_financial_data,
+            config.data_fetch_deadlines_sec["finance"],
+            _financial_fallback(),
+        ),
+        "weather": (
+            get_weather_data,
+            config.data_fetch_deadlines_sec["weather"],
+            _weather_fallback(),
+        ),
+        "todoist": (
+            lambda: get_todoist_data(now_qatar),
+            config.data_fetch_deadlines_sec["todoist"],
+            ("(Todoist verisi alınamadı.)", now_utc_iso, _empty_todoist_struct()),
+        ),
+    }
+    return _run_data_sources(sources)
+
+
+def _brief_data(planetary, finance, weather, todoist, tickers):
+    financial_text, finance_fetched_at, finance_latest_ts, portfolio = finance
+    weather_text, weather_icon, weather_fetched_at = weather
+    todoist_text, todoist_fetched_at, todoist_struct = todoist
+    return {
+        "planetary": planetary,
+        "financial": financial_text,
+        "finance_fetched_at": finance_fetched_at,
+        "finance_latest_ts": finance_latest_ts,
+        "portfolio": portfolio,
+        "weather": weather_text,
+        "weather_icon": weather_icon,
+        "weather_fetched_at": weather_fetched_at,
+        "todoist": todoist_text,
+        "todoist_fetched_at": todoist_fetched_at,
+        "todoist_struct": todoist_struct,
+        "tickers": list(tickers or []),
+    }
+
 
-        natal_text = "\n".join(natal_lines)
+def _gather_batch_inputs(profiles, now_utc):
+    """Fetch the inputs shared by a batch of recipients exactly once.
 
-        # Moon phase info
-        moon_sign = sign_tr.get(transit.moon.sign, transit.moon.sign)
-        moon_deg = transit.moon.position
+    Transit positions are read once, quotes are downloaded for the union
+    of all holdings, weather is fetched in one request covering the
+    distinct grid cells of all locations and each recipient's Todoist
+    account is read in the same fan-out.
+    """
+    config = _config()
+    now_utc_iso = now_utc.isoformat()
+    now_doha = now_utc.astimezone(pytz.timezone(DOHA_TZ))
+    union_tickers = []
+    locations = {}
+    for profile in profiles:
+        for ticker in profile["tickers"]:
+            if ticker not in union_tickers:
+                union_tickers.append(ticker)
+        locations.setdefault(_location_cache_key(profile["location"]), profile["location"])
+
+    sources = {
+        "transit": (lambda: _transit_positions(now_doha), config.data_fetch_deadlines_sec["planetary"], None),
+    }
+    if union_tickers:
+        sources["finance"] = (lambda: _fetch_market_quotes(union_tickers), config.data_fetch_deadlines_sec["finance"], None)
+    sources["weather"] = (
+        lambda: get_weather_for_locations(list(locations.values())),
+        config.data_fetch_deadlines_sec["weather"],
+        {key: _weather_fallback() for key in locations},
+    )
+    for profile in profiles:
+        if not profile["todoist_token"]:
+            continue
+        sources[f"todoist:{profile['id']}"] = (
+            lambda profile=profile: get_todoist_data(
+                _now_in_timezone(profile["timezone"]),
+                token=profile["todoist_token"],
+                max_items=profile["todoist_max_items"],
+                tz_name=profile["timezone"],
+            ),
+            config.data_fetch_deadlines_sec["todoist"],
+            ("(Todoist verisi alınamadı.)", now_utc_iso, _empty_todoist_struct()),
+        )
+    print(
+        f"ℹ️ Toplu mod: {len(profiles)} alıcı, {len(union_tickers)} sembol, "
+        f"{len(locations)} konum, {sum(1 for p in profiles if p['todoist_token'])} Todoist hesabı."
+    )
+    return _run_data_sources(sources, max_workers=max(config.data_fetch_workers, config.brief_batch_workers))
 
-        return f"""
-GERÇEK GEZEGENSEL VERİLER (Swiss Ephemeris - bugünkü hesaplama):
 
-GÜNCEL TRANSİT POZİSYONLARI (Doha, {now_qatar.strftime('%d.%m.%Y %H:%M')}):
-{transit_text}
+def _profile_brief_data(profile, shared, now_local):
+    now_utc_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    transit = shared.get("transit", {}).get("value")
+    if transit is not None:
+        planetary = get_planetary_data(
+            now_local,
+            natal_profile=profile["natal"],
+            transit=transit,
+            person_name=profile["name"],
+            birth_data=profile["birth_data"],
+        )
+    else:
+        planetary = _planetary_fallback_text()
 
-FATİH'İN NATAL HARİTASI ({USER_BIRTH_DATA}):
-{natal_lines[0]}
-  Güneş: İkizler, Ay: Terazi, Yükselen: Aslan
-{natal_text}
+    market = shared.get("finance", {}).get("value")
+    if market:
+        finance = _financial_inputs(profile["tickers"], market, profile["display_tickers"], profile["shares"])
+    else:
+        finance = _financial_fallback()
 
-AY BİLGİSİ:
-  Ay şu anda {moon_sign} burcunda, {moon_deg:.1f}° konumunda.
-"""
-    except Exception as e:
-        print(f"⚠️ Ephemeris hesaplama hatası: {e}")
-        return "\n(Efemeris verisi hesaplanamadı, genel astroloji bilgisi kullan.)\n"
+    weather = shared["weather"]["value"][_location_cache_key(profile["location"])]
+    todoist_result = shared.get(f"todoist:{profile['id']}")
+    if todoist_result:
+        todoist = todoist_result["value"]
+    else:
+        todoist = ("(Todoist bağlantısı yapılandırılmamış.)", now_utc_iso, _empty_todoist_struct())
+    return _brief_data(planetary, finance, weather, todoist, profile["tickers"])
 
 
-def _build_fallback_html(date_str, weather_data, todoist_struct, financial_data,
-                         todoist_time_display, finance_time_display, market_status, error):
-    """Minimal HTML when Gemini is completely unavailable — raw data only, no AI narrative."""
+def _fallback_section_blocks(weather_data, todoist_struct, financial_data,
+                             todoist_time_display, finance_time_display, market_status, error,
+                             tz_name=DOHA_TZ, location_label=DOHA_LABEL, portfolio_html=""):
+    """Raw-data HTML per section id (no AI narrative), in brief order."""
     error_snippet = html.escape(str(error)[:200])
 
     weather_lines = []
@@ -2178,15 +5874,23 @@ def _build_fallback_html(date_str, weather_data, todoist_struct, financial_data,
     finance_items = []
     for line in financial_data.splitlines():
         stripped = line.strip()
+        if portfolio_html and stripped.startswith("PORTFÖY ANALİTİĞİ"):
+            break  # already rendered as the summary table
         if stripped:
             finance_items.append(
                 f'<li style="padding:6px 0; font-size:13px; color:#1F2933; border-bottom:1px solid #E5E7EB;">'
                 f'{html.escape(stripped)}</li>'
             )
 
-    todoist_section = _build_todoist_section_html(todoist_struct, todoist_time_display)
+    def unavailable(section_id, label):
+        return (
+            f'<div class="section-wrapper" id="{section_id}">\n'
+            f'  <div class="card"><p style="font-size:13px; color:#4B5563; margin:0;">{label} bölümü bu çalıştırmada üretilemedi.</p></div>\n'
+            "</div>"
+        )
 
-    raw = f"""
+    return {
+        "odak": f"""
 <div class="section-wrapper" id="odak">
   <div class="card">
     <div class="card-header" style="margin-bottom:8px;">
@@ -2196,26 +5900,22 @@ def _build_fallback_html(date_str, weather_data, todoist_struct, financial_data,
     <p style="font-size:13px; color:#4B5563; margin:0 0 6px 0;">Gemini API yüksek talep nedeniyle yanıt veremedi. Aşağıda ham veriler sunulmaktadır.</p>
     <p style="font-size:12px; color:#6B7280; margin:0;">Hata: {error_snippet}</p>
   </div>
-</div>
+</div>""".strip(),
+        "hava": f"""
 <div class="section-wrapper" id="hava">
   <div class="card">
     <div class="card-header" style="margin-bottom:8px;">
       <span class="tag tag-blue">HAVA</span>
-      <span class="card-title" style="margin-left:8px;">Doha Hava Durumu</span>
+      <span class="card-title" style="margin-left:8px;">{html.escape(location_label.split(",", 1)[0])} Hava Durumu</span>
     </div>
     {"".join(weather_lines[:14])}
   </div>
-</div>
-<div class="section-wrapper" id="astro">
-  <div class="card"><p style="font-size:13px; color:#4B5563; margin:0;">Astroloji bölümü bu çalıştırmada üretilemedi.</p></div>
-</div>
-<div class="section-wrapper" id="karar">
-  <div class="card"><p style="font-size:13px; color:#4B5563; margin:0;">Karar bölümü bu çalıştırmada üretilemedi.</p></div>
-</div>
-<div class="section-wrapper" id="is">
-  <div class="card"><p style="font-size:13px; color:#4B5563; margin:0;">İş bölümü bu çalıştırmada üretilemedi.</p></div>
-</div>
-{todoist_section}
+</div>""".strip(),
+        "astro": unavailable("astro", "Astroloji"),
+        "karar": unavailable("karar", "Karar"),
+        "is": unavailable("is", "İş"),
+        "todoist": _build_todoist_section_html(todoist_struct, todoist_time_display, tz_name),
+        "finans": f"""
 <div class="section-wrapper" id="finans">
   <div class="card">
     <div class="card-header" style="margin-bottom:8px;">
@@ -2223,65 +5923,219 @@ def _build_fallback_html(date_str, weather_data, todoist_struct, financial_data,
       <span class="card-title" style="margin-left:8px;">Piyasa Verileri</span>
     </div>
     <p style="margin:0 0 8px 0; font-size:12px; color:#4B5563;">Veri zamanı: {html.escape(finance_time_display)} (US/Eastern) — {html.escape(market_status)}</p>
+    {portfolio_html}
     <ul style="list-style:none; padding:0; margin:0;">{"".join(finance_items)}</ul>
   </div>
-</div>
-""".strip()
-    return _escape_template_like_sequences(raw)
+</div>""".strip(),
+    }
 
 
-def generate_daily_brief():
-    if not API_KEY:
-        print("Hata: GEMINI_API_KEY (veya GOOGLE_API_KEY) bulunamadı.")
-        return
+def _build_fallback_html(date_str, weather_data, todoist_struct, financial_data,
+                         todoist_time_display, finance_time_display, market_status, error,
+                         tz_name=DOHA_TZ, location_label=DOHA_LABEL, portfolio_html=""):
+    """Minimal HTML when Gemini is completely unavailable — raw data only, no AI narrative."""
+    blocks = _fallback_section_blocks(
+        weather_data, todoist_struct, financial_data, todoist_time_display, finance_time_display,
+        market_status, error, tz_name=tz_name, location_label=location_label, portfolio_html=portfolio_html,
+    )
+    return _escape_template_like_sequences("\n".join(blocks.values()))
 
-    _validate_html_template_placeholders()
 
-    client = _create_genai_client(API_KEY)
-    print(f"Kullanılan Gemini modeli: {GEMINI_MODEL}")
-    
-    # Time Calc
-    now_qatar = get_current_time_qatar()
-    date_str = format_date_str(now_qatar)
-    gen_time_str = now_qatar.strftime("%H:%M:%S")
+def _log_render_settings():
+    config = _config()
+    if config.email_render_mode != "email-safe":
+        print(f"⚠️ Desteklenmeyen EMAIL_RENDER_MODE='{config.email_render_mode}'. email-safe moduna dönülüyor.")
+    if config.theme_profile != "offwhite-slate":
+        print(f"⚠️ Desteklenmeyen THEME_PROFILE='{config.theme_profile}'. offwhite-slate profiline dönülüyor.")
+    if config.gemini_generation_mode == "sections" and config.gemini_output_format == "json":
+        print("⚠️ GEMINI_OUTPUT_FORMAT=json yalnızca tek istek modunda geçerli; GEMINI_GENERATION_MODE=sections HTML bölümler üretecek.")
+    print(f"E-posta render modu: {config.email_render_mode} | Tema: {config.theme_profile}")
 
-    print(f"Özet oluşturuluyor: {date_str}...")
 
-    # Compute real planetary positions
-    planetary_data = get_planetary_data(now_qatar)
+WEATHER_PROMPT_PERIODS = (("Sabah", 6, 11), ("Öğle", 12, 16), ("Akşam", 17, 21))
+_WEATHER_HOUR_LINE = re.compile(
+    r"^\s*(\d{2}):\d{2} \| (-?\d+)°C \(hissedilen (-?\d+)°C\) \| (.+?) \| Nem %(\d+) \| Rüzgar (\d+) km/s$"
+)
+_QUOTE_LINE = re.compile(
+    r"^\s*(\S+): \$([\d.,]+) \(([+-]?[\d.]+)% (?:yukarı|aşağı)\)(?: \| 5g: ([+-]?[\d.]+)%)? \| Hacim: ([\d,]+)$"
+)
+_TODOIST_TASK_LINE = re.compile(r"^\s*- \[(P\d)\] (.+) \| (.+?) \| (.+?)( \(Gecikmiş\))?$")
+_POSITION_LINE = re.compile(r"^\s{2}(\S+): (.+°.*)$")
+_SOURCE_LINK_PREFERENCE = ("Web", "Web/App", "YouTube", "Instagram", "X/Twitter")
+
+
+def _compact_weather_text(text):
+    """Hourly rows pre-aggregated into the Sabah/Öğle/Akşam periods the prompt asks for."""
+    lines = text.splitlines()
+    hours = {}
+    for line in lines:
+        match = _WEATHER_HOUR_LINE.match(line)
+        if match:
+            hour, temp, feels, desc, humidity, wind = match.groups()
+            hours.setdefault(int(hour), (int(temp), int(feels), desc, int(humidity), int(wind)))
+    if not hours:
+        return text
+
+    rows = ["  dilim|saat|sıcaklık °C|hissedilen maks °C|durum|nem %|rüzgar maks km/s"]
+    for label, first, last in WEATHER_PROMPT_PERIODS:
+        values = [hours[hour] for hour in range(first, last + 1) if hour in hours]
+        if not values:
+            continue
+        temps = [value[0] for value in values]
+        dominant = collections.Counter(value[2] for value in values).most_common(1)[0][0]
+        rows.append(
+            f"  {label}|{first:02d}-{last:02d}|{min(temps)}-{max(temps)}|{max(value[1] for value in values)}|"
+            f"{dominant}|{round(sum(value[3] for value in values) / len(values))}|{max(value[4] for value in values)}"
+        )
+    header = lines[0].replace("Saatlik Tahmin", "dilim özeti")
+    summary = [line for line in lines if line.strip().startswith("Gün özeti")]
+    return "\n".join([header, *summary, *rows])
 
-    # Fetch real financial data
-    financial_data, finance_fetched_at, finance_latest_ts = get_financial_data()
 
-    # Fetch weather forecast
-    weather_data, weather_icon_key, weather_fetched_at = get_weather_data()
-    weather_icon_html = _weather_icon_image_html(weather_icon_key)
+def _compact_volume(value):
+    for limit, suffix in ((1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if value >= limit:
+            return f"{value / limit:.1f}{suffix}"
+    return f"{value:.0f}"
 
-    # Fetch Todoist tasks/events
-    todoist_data, todoist_fetched_at, todoist_struct = get_todoist_data(now_qatar)
 
-    now_utc = datetime.datetime.now(datetime.timezone.utc)
-    market_status = _market_status_us(now_utc)
-    weather_time_display = _format_time_for_display(datetime.datetime.fromisoformat(weather_fetched_at), TIMEZONE)
-    finance_time_display = _format_time_for_display(datetime.datetime.fromisoformat(finance_latest_ts), "US/Eastern")
-    todoist_time_display = _format_time_for_display(datetime.datetime.fromisoformat(todoist_fetched_at), TIMEZONE)
+def _compact_financial_text(text):
+    """Quote lines as one `sembol|fiyat|gün %|5g %|hacim` table; other lines are kept."""
+    out = []
+    header_added = False
+    for line in text.splitlines():
+        match = _QUOTE_LINE.match(line)
+        if not match:
+            out.append(line)
+            continue
+        if not header_added:
+            out.append("  sembol|fiyat $|gün %|5g %|hacim")
+            header_added = True
+        symbol, price, change, week, volume = match.groups()
+        out.append(f"  {symbol}|{price}|{change}|{week or '-'}|{_compact_volume(float(volume.replace(',', '')))}")
+    return "\n".join(out)
+
+
+def _compact_todoist_text(text):
+    out = []
+    header_added = False
+    for line in text.splitlines():
+        match = _TODOIST_TASK_LINE.match(line)
+        if not match:
+            if line.strip() and line.strip() != "Görev listesi:":
+                out.append(line)
+            continue
+        if not header_added:
+            out.append("  öncelik|görev|proje|zaman|gecikmiş")
+            header_added = True
+        priority, content, project, due, overdue = match.groups()
+        out.append(f"  {priority}|{content}|{project}|{due}|{'E' if overdue else '-'}")
+    return "\n".join(out)
+
+
+def _compact_planetary_text(text):
+    """Planet positions joined per chart; the Ay bilgisi block repeats the transit Moon and is dropped."""
+    out = []
+    positions = []
+    skip_moon_info = False
+    for line in text.splitlines():
+        if skip_moon_info and line.startswith("  "):
+            continue
+        skip_moon_info = False
+        match = _POSITION_LINE.match(line)
+        if match:
+            positions.append(f"{match.group(1)} {match.group(2)}")
+            continue
+        if positions:
+            out.append("  " + "; ".join(positions))
+            positions = []
+        if line.strip() == "AY BİLGİSİ:":
+            skip_moon_info = True
+            continue
+        if line.strip():
+            out.append(line)
+    if positions:
+        out.append("  " + "; ".join(positions))
+    return "\n".join(out)
+
+
+def _compact_sources_text(text):
+    """One preferred link per astrologer instead of every profile."""
+    out = []
+    for line in text.splitlines():
+        name, sep, links = line.partition(": ")
+        if not line.startswith("- ") or not sep or "http" not in links:
+            if line.strip():
+                out.append(line)
+            continue
+        by_label = {}
+        for link in links.split(" | "):
+            label, _, url = link.rpartition(" ")
+            by_label[label.strip()] = url
+        preferred = next((by_label[label] for label in _SOURCE_LINK_PREFERENCE if label in by_label), None)
+        out.append(f"{name}: {preferred or next(iter(by_label.values()))}")
+    return "\n".join(out)
+
+
+_PROMPT_BLOCK_ENCODERS = {
+    "planetary": _compact_planetary_text,
+    "financial": _compact_financial_text,
+    "weather": _compact_weather_text,
+    "todoist": _compact_todoist_text,
+    "sources": _compact_sources_text,
+}
 
-    if EMAIL_RENDER_MODE != "email-safe":
-        print(f"⚠️ Desteklenmeyen EMAIL_RENDER_MODE='{EMAIL_RENDER_MODE}'. email-safe moduna dönülüyor.")
-    if THEME_PROFILE != "offwhite-slate":
-        print(f"⚠️ Desteklenmeyen THEME_PROFILE='{THEME_PROFILE}'. offwhite-slate profiline dönülüyor.")
-    print(f"E-posta render modu: {EMAIL_RENDER_MODE} | Tema: {THEME_PROFILE}")
 
-    # --- ENRICHED PROMPT WITH REAL EPHEMERIS DATA ---
-    prompt = f"""
-    Sen Fatih için "Sabah Özeti" hazırlayan, zeki ama net bir astroloji ve finans asistanısın.
+def _prompt_data_blocks(data):
+    """Prompt text per data source, compactly encoded unless `PROMPT_COMPACT=0`."""
+    tickers = data["tickers"]
+    blocks = {
+        "planetary": data["planetary"],
+        "financial": data["financial"],
+        "weather": data["weather"],
+        "todoist": data["todoist"],
+        "portfolio": f"""
+    PORTFÖY:
+    - Aktif pozisyonlar: {", ".join(tickers) if tickers else "Yukarıdaki piyasa verilerine bak"}
+    - Yalnızca bu ETF'leri analiz et; listede olmayan sembollere yer verme.
+    """,
+        "sources": f"""
+    ASTROLOJİ KAYNAKLARI:
+    {ASTROLOGER_SOURCES}
+    {ASTROLOGY_BOOKS}
+    """,
+    }
+    if _config().prompt_compact:
+        for key, encode in _PROMPT_BLOCK_ENCODERS.items():
+            blocks[key] = encode(blocks[key]) + "\n"
+    return blocks
+
+
+def _estimate_tokens(text):
+    """Rough token count (~4 characters per token); no network round trip to count exactly."""
+    return (len(text) + 3) // 4
+
+
+def _log_prompt_budget(prompts, data):
+    """Log approximate tokens per data block across `prompts` against `PROMPT_TOKEN_BUDGET`."""
+    budget = _config().prompt_token_budget
+    blocks = _prompt_data_blocks(data)
+    total = sum(_estimate_tokens(prompt) for prompt in prompts.values())
+    breakdown = {
+        key: _estimate_tokens(text) * sum(1 for prompt in prompts.values() if text.strip() and text in prompt)
+        for key, text in blocks.items()
+    }
+    breakdown["talimat"] = max(0, total - sum(breakdown.values()))
+    parts = ", ".join(f"{key}={tokens}" for key, tokens in sorted(breakdown.items(), key=lambda kv: -kv[1]) if tokens)
+    limit = f" / bütçe {budget}" if budget else ""
+    print(f"🧮 Prompt ~{total} token{limit} ({len(prompts)} istek): {parts}")
+    if budget and total > budget:
+        largest = max(blocks, key=lambda key: breakdown.get(key, 0))
+        print(f"⚠️ Prompt token bütçesi aşıldı (~{total} > {budget}); en büyük veri bloğu: {largest}.")
+    return total, breakdown
 
-    PARAMETRELER:
-    - Tarih: {date_str}
-    - Kullanıcı: Fatih (Doğum: {USER_BIRTH_DATA})
-    - Dil: Türkçe
-    - Ton: Kısa, net, mobilde hızlı okunur.
 
+_BRIEF_DESIGN_RULES = """
     EMAIL TASARIM KISITLARI (ÇOK ÖNEMLİ):
     - İçerik yalnızca BODY içeriği olsun.
     - Her bölüm: <div class="section-wrapper" id="...">...</div>
@@ -2294,31 +6148,17 @@ def generate_daily_brief():
     - Flex veya grid layout kullanma.
     - Tek kolon, email-uyumlu sade bloklar kullan.
     - Karmaşık animasyon, sticky, hover davranışı istemiyoruz.
+    """
 
-    GERÇEK VERİLER:
-    {planetary_data}
-    {financial_data}
-    {weather_data}
-    {todoist_data}
-
-    PORTFÖY:
-    - Aktif pozisyonlar: {", ".join(_resolved_etf_tickers) if _resolved_etf_tickers else "Yukarıdaki piyasa verilerine bak"}
-    - Yalnızca bu ETF'leri analiz et; listede olmayan sembollere yer verme.
-
-    ASTROLOJİ KAYNAKLARI:
-    {ASTROLOGER_SOURCES}
-    {ASTROLOGY_BOOKS}
-
-    BÖLÜMLER:
-    1) ODAK (id=odak):
+_BRIEF_SECTION_SPECS = [
+    ("odak", Template("""ODAK (id=odak):
        - Bir motto, 3 kelime kuralı, kısa ruh hali geçiş analizi.
-       - kart bloğu (card) içinde olsun.
-
-    2) HAVA (id=hava):
+       - kart bloğu (card) içinde olsun."""), ("planetary",)),
+    ("hava", Template("""HAVA (id=hava):
        - Şu yapıyı kullan:
          <div class="weather-card">
            <div class="weather-icon-wrap">
-             {weather_icon_html}
+             $hava_ikonu
              <div class="weather-summary">...</div>
            </div>
            <div class="weather-periods">
@@ -2326,44 +6166,42 @@ def generate_daily_brief():
              <div class="weather-period"><strong>Öğle</strong>...</div>
              <div class="weather-period"><strong>Akşam</strong>...</div>
            </div>
-           <p style="margin-top:8px; font-size:12px; color:#4B5563;">Veri zamanı: {weather_time_display}</p>
+           <p style="margin-top:8px; font-size:12px; color:#4B5563;">Veri zamanı: $hava_veri_zamani</p>
            <p style="margin-top:8px;"><em>Ne giymeliyim: ...</em></p>
          </div>
-       - Gerçek hava verisini kullan.
-
-    3) HOROSKOP (id=astro):
+       - Gerçek hava verisini kullan."""), ("weather",)),
+    ("astro", Template("""HOROSKOP (id=astro):
        - Gerçek transit + natal sentez.
        - 3-4 paragraf + 3 maddelik kısa liste.
        - Etiketler: tag-blue/tag-gold/tag-red/tag-green/tag-lavender.
        - Kaynak bölümü ekle; en az 5 link (3 Türk + 2 uluslararası), class=source-link.
-       - Bir "Astro-Bilişsel Uyarı" kartı ekle (açık mavi-slate tonunda).
-
-    4) KARAR (id=karar):
+       - Bir "Astro-Bilişsel Uyarı" kartı ekle (açık mavi-slate tonunda)."""), ("planetary", "sources")),
+    ("karar", Template("""KARAR (id=karar):
        - En iyi, nötr, kaçın alanları.
-       - decision-grid içinde 3 adet decision-box; hepsi dikey okunabilir olsun.
-
-    5) İŞ (id=is):
-       - <ul class="bullet-list"> ile kısa maddeler.
-
-    6) TODOIST (id=todoist):
+       - decision-grid içinde 3 adet decision-box; hepsi dikey okunabilir olsun."""), ("planetary",)),
+    ("is", Template("""İŞ (id=is):
+       - <ul class="bullet-list"> ile kısa maddeler."""), ("planetary", "todoist")),
+    ("todoist", Template("""TODOIST (id=todoist):
        - card içinde kısa bir görev özeti ver.
        - <ul class="bullet-list"> kullanarak en önemli görevleri listele.
        - Her maddede görev adı + proje + saat/tarih bilgisi olsun.
        - Başta veri zamanı satırı:
-         "Veri zamanı: {todoist_time_display} (Asia/Qatar)"
-       - "Saatli etkinlikler" varsa ayrı bir kısa paragrafla vurgula.
-
-    7) FİNANS (id=finans):
+         "Veri zamanı: $todoist_veri_zamani ($saat_dilimi)"
+       - "Saatli etkinlikler" varsa ayrı bir kısa paragrafla vurgula."""), ("todoist",)),
+    ("finans", Template("""FİNANS (id=finans):
        - Gerçek fiyat + değişim yüzdesi.
        - Her hisse için davranışsal not.
        - Hisse adını <span class="ticker-pill"> ile yaz.
+       - PORTFÖY ANALİTİĞİ verisi varsa listeden önce 2-3 cümlelik portföy özeti yaz:
+         toplam değer, günlük K/Z, volatilite ve düşüş; sayıları aynen kullan, yeniden hesaplama.
        - Başta veri zamanı satırı:
-         "Veri zamanı: {finance_time_display} (US/Eastern) — {market_status}"
-       - Liste yapısı: <ul class="finance-list"><li>...</li></ul>
-
-    8) TEK SORU:
-       - Günün düşündürücü sorusu.
+         "Veri zamanı: $finans_veri_zamani (US/Eastern) — $piyasa_durumu"
+       - Liste yapısı: <ul class="finance-list"><li>...</li></ul>"""), ("financial", "portfolio")),
+    ("soru", Template("""TEK SORU (id=soru):
+       - Günün düşündürücü sorusu."""), ("planetary",)),
+]
 
+_BRIEF_OUTPUT_RULES = """
     KURALLAR:
     - Yalnızca saf HTML döndür.
     - <html>, <head>, <body> açma.
@@ -2372,69 +6210,580 @@ def generate_daily_brief():
     - Bölümler kısa, net, email-uyumlu olsun.
     """
 
+
+def _brief_prompt_parts(profile, data, date_str, weather_icon_html, weather_time_display,
+                        todoist_time_display, finance_time_display, market_status, placeholders=False):
+    """Building blocks of the brief prompt.
+
+    Returns `(intro, design, data_blocks, section_specs, rules)`:
+    `data_blocks` maps a data key to its prompt text and `section_specs` is
+    an ordered list of `(section_id, instructions, data_keys)`. With
+    `placeholders=True` the per-run display values in the instructions are
+    left as `[name]` references (see `_prompt_display_values`), which keeps
+    the instructions identical from run to run.
+    """
+    name = profile["name"]
+    intro = f"""
+    Sen {name} için "Sabah Özeti" hazırlayan, zeki ama net bir astroloji ve finans asistanısın.
+
+    PARAMETRELER:
+    - Tarih: {date_str}
+    - Kullanıcı: {name} (Doğum: {profile["birth_data"]})
+    - Dil: Türkçe
+    - Ton: Kısa, net, mobilde hızlı okunur.
+    """
+    values = _prompt_display_values(
+        profile, weather_icon_html, weather_time_display, todoist_time_display, finance_time_display, market_status,
+    )
+    if placeholders:
+        values = {key: f"[{key}]" for key in values}
+    section_specs = [
+        (section_id, instructions.substitute(values), keys) for section_id, instructions, keys in _BRIEF_SECTION_SPECS
+    ]
+    return intro, _BRIEF_DESIGN_RULES, _prompt_data_blocks(data), section_specs, _BRIEF_OUTPUT_RULES
+
+
+def _prompt_display_values(profile, weather_icon_html, weather_time_display, todoist_time_display,
+                           finance_time_display, market_status):
+    return {
+        "hava_ikonu": weather_icon_html,
+        "hava_veri_zamani": weather_time_display,
+        "todoist_veri_zamani": todoist_time_display,
+        "saat_dilimi": profile["timezone"],
+        "finans_veri_zamani": finance_time_display,
+        "piyasa_durumu": market_status,
+    }
+
+
+def _prompt_data_text(data_blocks, keys):
+    facts = [data_blocks[key] for key in ("planetary", "financial", "weather", "todoist") if key in keys]
+    extras = [data_blocks[key] for key in ("portfolio", "sources") if key in keys]
+    return "\n    GERÇEK VERİLER:\n    " + "\n    ".join(facts) + "\n" + "".join(extras)
+
+
+def _build_brief_prompt(profile, data, date_str, weather_icon_html, weather_time_display,
+                        todoist_time_display, finance_time_display, market_status):
+    intro, design, data_blocks, section_specs, rules = _brief_prompt_parts(
+        profile, data, date_str, weather_icon_html, weather_time_display,
+        todoist_time_display, finance_time_display, market_status,
+    )
+    sections = _numbered_sections(section_specs)
+    return intro + design + _prompt_data_text(data_blocks, data_blocks) + "\n    BÖLÜMLER:\n" + sections + "\n" + rules
+
+
+def _numbered_sections(section_specs):
+    return "\n\n".join(
+        f"    {number}) {instructions}" for number, (_, instructions, _) in enumerate(section_specs, start=1)
+    )
+
+
+def _build_brief_prompt_split(profile, data, date_str, weather_icon_html, weather_time_display,
+                              todoist_time_display, finance_time_display, market_status):
+    """The brief prompt as `(static_prefix, daily_suffix)` for Gemini context caching.
+
+    The prefix holds the design rules, the astrologer sources, the section
+    instructions (with `[name]` references to the day's display values) and
+    the output rules, so it only changes with the code or the sources. The
+    suffix carries the recipient, the date, the display values and the data.
+    """
+    intro, design, data_blocks, section_specs, rules = _brief_prompt_parts(
+        profile, data, date_str, weather_icon_html, weather_time_display,
+        todoist_time_display, finance_time_display, market_status, placeholders=True,
+    )
+    values = _prompt_display_values(
+        profile, weather_icon_html, weather_time_display, todoist_time_display, finance_time_display, market_status,
+    )
+    prefix = design + data_blocks["sources"] + "\n    BÖLÜMLER:\n" + _numbered_sections(section_specs) + "\n" + rules
+    daily_values = "".join(f"    - [{key}]: {value}\n" for key, value in values.items())
+    suffix = (
+        intro
+        + "\n    GÜNLÜK DEĞERLER (talimatlardaki [ad] alanları):\n" + daily_values
+        + _prompt_data_text(data_blocks, [key for key in data_blocks if key != "sources"])
+    )
+    return prefix, suffix
+
+
+def _build_section_prompts(profile, data, date_str, weather_icon_html, weather_time_display,
+                           todoist_time_display, finance_time_display, market_status, section_ids):
+    """One prompt per section in `section_ids`, each carrying only the data that section uses."""
+    intro, design, data_blocks, section_specs, rules = _brief_prompt_parts(
+        profile, data, date_str, weather_icon_html, weather_time_display,
+        todoist_time_display, finance_time_display, market_status,
+    )
+    prompts = {}
+    for section_id, instructions, keys in section_specs:
+        if section_id not in section_ids:
+            continue
+        prompts[section_id] = (
+            intro + design
+            + _prompt_data_text(data_blocks, keys)
+            + f"\n    BÖLÜM:\n    {instructions}\n"
+            + f'    - Yalnızca bu bölümü döndür: tek bir <div class="section-wrapper" id="{section_id}"> bloğu.\n'
+            + rules
+        )
+    return prompts
+
+
+def _schema_text(description):
+    return {"type": "STRING", "description": description}
+
+
+def _schema_list(items, description):
+    return {"type": "ARRAY", "items": items, "description": description}
+
+
+def _schema_object(properties):
+    return {"type": "OBJECT", "properties": properties, "required": list(properties)}
+
+
+BRIEF_RESPONSE_SCHEMA = _schema_object({
+    "odak": _schema_object({
+        "motto": _schema_text("Günün kısa mottosu."),
+        "rule_words": _schema_list(_schema_text("Tek kelime."), "3 kelime kuralı: tam 3 kelime."),
+        "mood_shift": _schema_text("Kısa ruh hali geçiş analizi (1-2 cümle)."),
+    }),
+    "hava": _schema_object({
+        "summary": _schema_text("Gerçek hava verisine dayalı tek cümlelik özet."),
+        "morning": _schema_text("Sabah için kısa not."),
+        "noon": _schema_text("Öğle için kısa not."),
+        "evening": _schema_text("Akşam için kısa not."),
+        "outfit": _schema_text("Ne giymeliyim önerisi."),
+    }),
+    "astro": _schema_object({
+        "title": _schema_text("Horoskop başlığı."),
+        "paragraphs": _schema_list(_schema_text("Paragraf."), "Gerçek transit + natal sentez, 3-4 paragraf."),
+        "highlights": _schema_list(
+            _schema_object({
+                "tone": {"type": "STRING", "enum": ["blue", "gold", "red", "green", "lavender"]},
+                "label": _schema_text("1-2 kelimelik etiket."),
+                "text": _schema_text("Kısa madde."),
+            }),
+            "Tam 3 maddelik kısa liste.",
+        ),
+        "warning": _schema_text("Astro-Bilişsel Uyarı metni."),
+        "sources": _schema_list(
+            _schema_object({"title": _schema_text("Kaynak adı."), "url": _schema_text("https:// bağlantısı.")}),
+            "En az 5 kaynak (3 Türk + 2 uluslararası), yalnızca ASTROLOJİ KAYNAKLARI listesinden.",
+        ),
+    }),
+    "karar": _schema_object({
+        "best": _schema_text("Günün en iyi alanı."),
+        "neutral": _schema_text("Nötr alan."),
+        "avoid": _schema_text("Kaçınılacak alan."),
+    }),
+    "is": _schema_object({
+        "items": _schema_list(_schema_text("Kısa iş maddesi."), "3-5 kısa iş maddesi."),
+    }),
+    "finans": _schema_object({
+        "summary": _schema_text(
+            "PORTFÖY ANALİTİĞİ verisi varsa 2-3 cümlelik portföy özeti (toplam değer, günlük K/Z, "
+            "volatilite, düşüş; sayıları aynen kullan). Yoksa boş bırak."
+        ),
+        "positions": _schema_list(
+            _schema_object({
+                "ticker": _schema_text("Portföydeki sembol."),
+                "price": _schema_text("Gerçek fiyat ve değişim yüzdesi, örn. '$31.20 (+0.8%)'."),
+                "note": _schema_text("Davranışsal not."),
+            }),
+            "Her aktif pozisyon için bir kayıt.",
+        ),
+    }),
+    "soru": _schema_object({
+        "question": _schema_text("Günün düşündürücü sorusu."),
+    }),
+})
+BRIEF_JSON_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": BRIEF_RESPONSE_SCHEMA,
+}
+
+
+def _build_json_brief_prompt(profile, data, date_str, weather_icon_html, weather_time_display,
+                             todoist_time_display, finance_time_display, market_status):
+    """Prompt for `GEMINI_OUTPUT_FORMAT=json`: data only; layout comes from the local templates."""
+    intro, _, data_blocks, _, _ = _brief_prompt_parts(
+        profile, data, date_str, weather_icon_html, weather_time_display,
+        todoist_time_display, finance_time_display, market_status,
+    )
+    return intro + _prompt_data_text(data_blocks, data_blocks) + """
+    ÇIKTI:
+    - Yanıtı verilen JSON şemasına göre döndür; HTML veya Markdown kullanma.
+    - Alan açıklamalarındaki adet ve uzunluk sınırlarına uy.
+    - Uydurma finans, astroloji veya Todoist görevi üretme.
+    - Türkçe karakterleri ve yazım kurallarını doğru kullan.
+    """
+
+
+_BRIEF_SECTION_TEMPLATES = {
+    "card": Template(
+        '<div$section_wrapper id="$section_id"><div$card>'
+        '<div$card_header><span$tag_attr>$tag</span> <span$card_title>$title</span></div>$body</div></div>'
+    ),
+    "paragraph": Template('<p style="margin:0 0 8px 0; font-size:14px; color:#1F2933; line-height:1.6;">$text</p>'),
+    "bullets": Template('<ul$bullet_list>$items</ul>'),
+    "bullet": Template('<li style="margin-bottom:6px; font-size:14px; color:#1F2933;">$text</li>'),
+    "tagged_bullet": Template('<li style="margin-bottom:6px; font-size:14px; color:#1F2933;"><span$tag_attr>$label</span> $text</li>'),
+    "source": Template('<li style="margin-bottom:4px; font-size:13px;"><a href="$url" target="_blank"$source_link>$title</a></li>'),
+    "note_card": Template(
+        '<div$note_attr><p style="margin:0; font-size:13px; color:#4B5563;">'
+        '<strong>Astro-Bilişsel Uyarı:</strong> $text</p></div>'
+    ),
+    "weather": Template(
+        '<div$section_wrapper id="hava"><div$weather_card>'
+        '<div$weather_icon_wrap>$icon<div$weather_summary>$summary</div></div>'
+        '<div$weather_periods>$periods</div>'
+        '<p style="margin-top:8px; font-size:12px; color:#4B5563;">Veri zamanı: $data_time</p>'
+        '<p style="margin-top:8px;"><em>Ne giymeliyim: $outfit</em></p></div></div>'
+    ),
+    "weather_period": Template('<div$weather_period><strong>$label</strong> $text</div>'),
+    "decision": Template(
+        '<div$decision_box><span$d_icon>$icon</span><span$d_label>$label</span><div$value_attr>$text</div></div>'
+    ),
+    "finance_item": Template(
+        '<li style="padding:6px 0; border-bottom:1px solid #E5E7EB; font-size:14px; color:#1F2933;">'
+        '<span$ticker_pill>$ticker</span> $price — $note</li>'
+    ),
+}
+
+
+def _class_attr(classes, extra_style=""):
+    """` class=... style=...` for trusted markup, with the class styles inlined like the sanitizer does."""
+    style = _merge_styles(_style_for_classes(classes), extra_style)
+    return f' class="{classes}" style="{html.escape(style, quote=True)}"'
+
+
+_SECTION_CLASS_ATTRS = (None, {})
+
+
+def _section_template(name, **values):
+    global _SECTION_CLASS_ATTRS
+    styles, attrs = _SECTION_CLASS_ATTRS
+    if styles is not _email_class_styles():
+        styles = _email_class_styles()
+        attrs = {cls.replace("-", "_"): _class_attr(cls) for cls in styles}
+        _SECTION_CLASS_ATTRS = (styles, attrs)
+    return _BRIEF_SECTION_TEMPLATES[name].substitute(attrs, **values)
+
+
+def _json_text(value):
+    return _escape_template_like_sequences(html.escape(str(value or "").strip(), quote=False))
+
+
+def _json_list(value):
+    return [item for item in value if item] if isinstance(value, list) else []
+
+
+def _render_json_section(section_id, payload, context):
+    """Trusted HTML for one section of a structured brief, or None when it has no content."""
+    def card(tag, tone, title, body):
+        return _section_template(
+            "card", section_id=section_id, tag=tag, tag_attr=_class_attr(f"tag tag-{tone}"),
+            title=_json_text(title), body=body,
+        )
+
+    def paragraphs(texts):
+        return "".join(_section_template("paragraph", text=_json_text(text)) for text in texts)
+
+    def bullets(texts):
+        items = "".join(_section_template("bullet", text=_json_text(text)) for text in texts)
+        return _section_template("bullets", items=items) if items else ""
+
+    if section_id == "odak":
+        words = " · ".join(_json_text(word) for word in _json_list(payload.get("rule_words")))
+        body = (f'<p style="margin:0 0 8px 0; font-size:13px; color:#4B5563;"><strong>{words}</strong></p>'
+                if words else "")
+        return card("ODAK", "blue", payload.get("motto"), body + paragraphs([payload.get("mood_shift")]))
+    if section_id == "hava":
+        periods = "".join(
+            _section_template("weather_period", label=label, text=_json_text(payload.get(key)))
+            for key, label in (("morning", "Sabah"), ("noon", "Öğle"), ("evening", "Akşam"))
+        )
+        return _section_template(
+            "weather", icon=context["weather_icon_html"], summary=_json_text(payload.get("summary")),
+            periods=periods, data_time=html.escape(context["weather_time_display"]),
+            outfit=_json_text(payload.get("outfit")),
+        )
+    if section_id == "astro":
+        tones = {"blue", "gold", "red", "green", "lavender"}
+        highlights = "".join(
+            _section_template(
+                "tagged_bullet", label=_json_text(item.get("label")), text=_json_text(item.get("text")),
+                tag_attr=_class_attr(f"tag tag-{item.get('tone') if item.get('tone') in tones else 'lavender'}"),
+            )
+            for item in _json_list(payload.get("highlights")) if isinstance(item, dict)
+        )
+        sources = "".join(
+            _section_template("source", url=html.escape(url, quote=True), title=_json_text(item.get("title") or url))
+            for item in _json_list(payload.get("sources")) if isinstance(item, dict)
+            for url in [_sanitize_url_attr("a", "href", str(item.get("url") or "").strip())] if url
+        )
+        body = paragraphs(_json_list(payload.get("paragraphs")))
+        if highlights:
+            body += _section_template("bullets", items=highlights)
+        if payload.get("warning"):
+            body += _section_template(
+                "note_card", text=_json_text(payload.get("warning")),
+                note_attr=_class_attr("card", "background-color:#EEF4F8;border-color:#CDE4F4;"),
+            )
+        if sources:
+            body += '<p style="margin:8px 0 4px 0; font-size:12px; color:#4B5563;"><strong>Kaynaklar</strong></p>'
+            body += _section_template("bullets", items=sources)
+        return card("HOROSKOP", "lavender", payload.get("title") or "Günün Gökyüzü", body)
+    if section_id == "karar":
+        boxes = "".join(
+            _section_template(
+                "decision", icon=icon, label=label, text=_json_text(payload.get(key)),
+                value_attr=_class_attr(f"d-val {tone}"),
+            )
+            for key, icon, label, tone in (
+                ("best", "✅", "En iyi", "d-good"),
+                ("neutral", "⚖️", "Nötr", "d-neutral"),
+                ("avoid", "⛔", "Kaçın", "d-bad"),
+            )
+        )
+        return card("KARAR", "green", "Günün Kararları", f'<div{_class_attr("decision-grid")}>{boxes}</div>')
+    if section_id == "is":
+        return card("İŞ", "gold", "İş Odağı", bullets(_json_list(payload.get("items"))))
+    if section_id == "finans":
+        items = "".join(
+            _section_template(
+                "finance_item", ticker=_json_text(item.get("ticker")), price=_json_text(item.get("price")),
+                note=_json_text(item.get("note")),
+            )
+            for item in _json_list(payload.get("positions")) if isinstance(item, dict)
+        )
+        body = (
+            '<p style="margin:0 0 8px 0; font-size:12px; color:#4B5563;">'
+            f'Veri zamanı: {html.escape(context["finance_time_display"])} (US/Eastern) — '
+            f'{html.escape(context["market_status"])}</p>'
+        )
+        if payload.get("summary"):
+            body += paragraphs([payload["summary"]])
+        body += f'<ul{_class_attr("finance-list")}>{items}</ul>'
+        return card("FİNANS", "gold", "Piyasa Notları", body)
+    if section_id == "soru":
+        return card("SORU", "lavender", "Günün Sorusu", paragraphs([payload.get("question")]))
+    return None
+
+
+def _parse_json_brief(text):
+    payload = json.loads(re.sub(r"^```(?:json)?\s*|\s*```$", "", (text or "").strip()))
+    if not isinstance(payload, dict):
+        raise ValueError("Gemini JSON yanıtı bir nesne değil.")
+    return payload
+
+
+def _render_json_brief(text, section_ids, context):
+    """Render a schema-shaped JSON brief into `{section_id: html}` with the local templates.
+
+    Sections the model left empty get the placeholder card; malformed JSON
+    raises `ValueError` so the caller can fall back.
+    """
+    payload = _parse_json_brief(text)
+    blocks = {}
+    for section_id in section_ids:
+        section = payload.get(section_id)
+        rendered = _render_json_section(section_id, section, context) if isinstance(section, dict) and any(
+            section.values()) else None
+        blocks[section_id] = rendered or _missing_section_html(section_id)
+    return blocks
+
+
+def _clean_model_html(text):
+    return (text or "").replace("```html", "").replace("```", "").strip()
+
+
+def _generate_sectioned_brief(client, prompts, day, fallback_blocks, order):
+    """Generate every section prompt concurrently and stitch the results in `order`.
+
+    Sections in `order` without a prompt get an empty placeholder for the
+    caller's replacement. Each generated section has
+    `GEMINI_SECTION_TIMEOUT_SEC` to answer (they all start together); a
+    section that fails or times out is swapped for its entry in
+    `fallback_blocks` (an empty entry drops it, a missing one falls back to
+    the placeholder card). Returns `(raw_html, section_replacements)` for
+    `_postprocess_brief_html`, or raises the last error when no section was
+    generated.
+
+    Section threads share the deadline, so a timed-out section stops
+    retrying and hedging and its thread exits. A Gemini call already in
+    flight finishes within `GEMINI_HTTP_TIMEOUT_SEC` and its answer is dropped.
+    """
+    timeout = _config().gemini_section_timeout_sec
+    deadline = time.monotonic() + timeout
+
+    def generate(prompt):
+        started = time.monotonic()
+        response = _generate_brief_content(client, prompt, day, deadline=deadline)
+        return response.text, time.monotonic() - started
+
+    executor = ThreadPoolExecutor(max_workers=max(1, len(prompts)), thread_name_prefix="gemini-section")
+    futures = {section_id: executor.submit(generate, prompt) for section_id, prompt in prompts.items()}
+    wait(futures.values(), timeout=timeout)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    parts = []
+    replacements = {}
+    timings = {}
+    last_err = None
+    for section_id in order:
+        future = futures.get(section_id)
+        if future is None:
+            parts.append(f'<div class="section-wrapper" id="{section_id}"></div>')
+            continue
+        try:
+            if not future.done():
+                raise TimeoutError(f"{timeout:g}s içinde yanıt gelmedi")
+            text, timings[section_id] = future.result()
+            section_html = _clean_model_html(text)
+            if not section_html:
+                raise ValueError("boş yanıt")
+        except Exception as err:
+            last_err = err
+            print(f"⚠️ '{section_id}' bölümü üretilemedi, yedek blok kullanılıyor: {str(err)[:200]}")
+            parts.append(f'<div class="section-wrapper" id="{section_id}"></div>')
+            replacements[section_id] = fallback_blocks.get(section_id, _missing_section_html(section_id))
+            continue
+        if not re.search(rf'\bid=["\']{re.escape(section_id)}["\']', section_html):
+            section_html = f'<div class="section-wrapper" id="{section_id}">{section_html}</div>'
+        parts.append(section_html)
+
+    if not timings:
+        raise last_err if last_err else RuntimeError("Gemini bölüm yanıtı alınamadı.")
+    slowest = max(timings, key=timings.get)
+    print(
+        f"🧩 Bölüm bazlı üretim: {len(timings)}/{len(futures)} bölüm hazır "
+        f"(en yavaş: {slowest} {timings[slowest]:.1f}s)"
+    )
+    return "\n".join(parts), replacements
+
+
+def _report_gemini_failure(err):
+    err_text = str(err)
+    print(f"❌ Gemini tüm modeller ve denemeler tükendi: {err_text[:300]}")
+    if "no longer available to new users" in err_text or ("NOT_FOUND" in err_text and "models/" in err_text):
+        print(f"\nGemini modeli '{_config().gemini_model}' bu anahtar/proje için kullanılamıyor.")
+        print("Çözüm: GEMINI_MODEL değişkenini geçerli bir modelle güncelle ve workflow'u tekrar çalıştır.")
+    if (
+        "PERMISSION_DENIED" in err_text
+        and "generativelanguage.googleapis.com" in err_text
+    ) or "SERVICE_DISABLED" in err_text:
+        print("\nGemini isteği başarısız: API anahtarının bağlı olduğu projede Generative Language API etkin değil.")
+        print("Çözüm: İlgili projede API'yi etkinleştir, GEMINI_API_KEY secret'ını güncelle ve tekrar çalıştır.")
+
+
+def _render_brief(client, profile, data, now_local, normalize_headers=True):
+    """Generate the final email HTML for one recipient.
+
+    Returns `(final_html, subject_date)`; the subject is prefixed with
+    `[Yedek]` when Gemini was unavailable and the raw-data fallback was used.
+    """
+    date_str = format_date_str(now_local)
+    gen_time_str = now_local.strftime("%H:%M:%S")
+    tz_name = profile["timezone"]
+    sections = profile["sections"]
+    todoist_struct = data["todoist_struct"]
+
+    print(f"Özet oluşturuluyor: {date_str} ({profile['id']})...")
+
+    weather_icon_html = _weather_icon_image_html(data["weather_icon"])
+    now_utc = datetime.datetime.now(datetime.timezone.utc)
+    market_status = _market_status_us(now_utc)
+    weather_time_display = _format_time_for_display(datetime.datetime.fromisoformat(data["weather_fetched_at"]), tz_name)
+    finance_time_display = _format_time_for_display(datetime.datetime.fromisoformat(data["finance_latest_ts"]), "US/Eastern")
+    todoist_time_display = _format_time_for_display(datetime.datetime.fromisoformat(data["todoist_fetched_at"]), tz_name)
+
+    prompt_args = (
+        profile, data, date_str, weather_icon_html, weather_time_display,
+        todoist_time_display, finance_time_display, market_status,
+    )
+    portfolio_html = _portfolio_summary_html(
+        data["portfolio"], profile["display_tickers"] or _portfolio_display_tickers,
+    )
+
+    subject_date = date_str
+    day = now_local.date().isoformat()
+    structured = None
     try:
-        response = _generate_content_with_retry(client, prompt)
+        if _config().gemini_generation_mode == "sections":
+            # Todoist is always the locally rendered table, so it gets no request.
+            section_ids = [sid for sid in BRIEF_SECTION_IDS if sid in sections] + ["soru"]
+            prompt_ids = [sid for sid in section_ids if sid != "todoist"]
+            fallback_blocks = _fallback_section_blocks(
+                data["weather"], todoist_struct, data["financial"], todoist_time_display, finance_time_display,
+                market_status, "", tz_name=tz_name, location_label=profile["location"]["label"],
+                portfolio_html=portfolio_html,
+            )
+            fallback_blocks.update(odak=_missing_section_html("odak"), soru="")
+            prompts = _build_section_prompts(*prompt_args, prompt_ids)
+            _log_prompt_budget(prompts, data)
+            raw_html, replacements = _generate_sectioned_brief(client, prompts, day, fallback_blocks, section_ids)
+        elif _config().gemini_output_format == "json":
+            prompt = _build_json_brief_prompt(*prompt_args)
+            _log_prompt_budget({"brief": prompt}, data)
+            response = _generate_brief_content(
+                client, prompt, day, BRIEF_JSON_GENERATION_CONFIG, validate=_parse_json_brief,
+            )
+            json_ids = [sid for sid in BRIEF_SECTION_IDS if sid in sections and sid != "todoist"] + ["soru"]
+            structured = _render_json_brief(response.text, json_ids, {
+                "weather_icon_html": weather_icon_html,
+                "weather_time_display": weather_time_display,
+                "finance_time_display": finance_time_display,
+                "market_status": market_status,
+            })
+        else:
+            prefix = None
+            if _config().gemini_context_cache:
+                prefix, suffix = _build_brief_prompt_split(*prompt_args)
+                prompt = prefix + suffix
+            else:
+                prompt = _build_brief_prompt(*prompt_args)
+            _log_prompt_budget({"brief": prompt}, data)
+            response = _generate_brief_content(client, prompt, day, cached_prefix=prefix)
+            raw_html, replacements = _clean_model_html(response.text), {}
     except Exception as err:
-        err_text = str(err)
-        print(f"❌ Gemini tüm modeller ve denemeler tükendi: {err_text[:300]}")
-        if "no longer available to new users" in err_text or ("NOT_FOUND" in err_text and "models/" in err_text):
-            print(f"\nGemini modeli '{GEMINI_MODEL}' bu anahtar/proje için kullanılamıyor.")
-            print("Çözüm: GEMINI_MODEL değişkenini geçerli bir modelle güncelle ve workflow'u tekrar çalıştır.")
-        if (
-            "PERMISSION_DENIED" in err_text
-            and "generativelanguage.googleapis.com" in err_text
-        ) or "SERVICE_DISABLED" in err_text:
-            print("\nGemini isteği başarısız: API anahtarının bağlı olduğu projede Generative Language API etkin değil.")
-            print("Çözüm: İlgili projede API'yi etkinleştir, GEMINI_API_KEY secret'ını güncelle ve tekrar çalıştır.")
+        _report_gemini_failure(err)
         print("⚠️ Gemini yanıtsız. Ham veri içeren yedek e-posta gönderiliyor...")
         raw_html = _build_fallback_html(
-            date_str, weather_data, todoist_struct, financial_data,
+            date_str, data["weather"], todoist_struct, data["financial"],
             todoist_time_display, finance_time_display, market_status, err,
+            tz_name=tz_name, location_label=profile["location"]["label"], portfolio_html=portfolio_html,
         )
-        raw_html = _filter_enabled_sections(raw_html)
+        raw_html = _filter_enabled_sections(raw_html, sections)
+        brief_text = _strip_html_tags(raw_html)
         mood = MOOD_PROFILES[3].copy()
         mood["level"] = 3
         mood["score"] = 0
-        hero_image_url, image_model_used = _generate_daily_header_image(client, raw_html, date_str, mood, now_qatar)
-        hero_image_markup = _build_hero_image_markup(hero_image_url, mood, date_str, todoist_struct)
-        final_html = HTML_TEMPLATE.substitute(
-            date_string=date_str,
-            content_body=raw_html,
-            hero_image_markup=hero_image_markup,
-            gen_time=gen_time_str,
-            weather_time=weather_time_display,
-            todoist_time=todoist_time_display,
-            finance_time=finance_time_display,
-            market_status=market_status,
-            brief_font_stack=BRIEF_FONT_STACK,
-            nav_links=_build_nav_links(),
-        )
-        _log_payload_size(final_html)
-        with open("index.html", "w", encoding="utf-8") as f:
-            f.write(final_html)
-        send_email(final_html, f"[Yedek] {date_str}")
-        return
-    
-    # Temizlik
-    raw_html = response.text.replace("```html", "").replace("```", "").strip()
-    raw_html = _sanitize_html(raw_html)
-    raw_html = _escape_template_like_sequences(raw_html)
-    raw_html = _ensure_required_sections(raw_html)
-    todoist_section_html = _build_todoist_section_html(todoist_struct, todoist_time_display)
-    raw_html = _replace_section_by_id(raw_html, "todoist", todoist_section_html)
-    raw_html = _filter_enabled_sections(raw_html)
-
-    mood = _score_brief_mood(raw_html)
-    print(f"🧠 Özet ruh hali seviyesi: {mood['level']} ({mood['label']}) | skor={mood['score']}")
-    hero_image_url, image_model_used = _generate_daily_header_image(client, raw_html, date_str, mood, now_qatar)
+        subject_date = f"[Yedek] {date_str}"
+    else:
+        todoist_section_html = _build_todoist_section_html(todoist_struct, todoist_time_display, tz_name)
+        if structured is not None:
+            # Template output is trusted markup, so it skips the sanitizer pass.
+            structured["todoist"] = todoist_section_html
+            order = [sid for sid in BRIEF_SECTION_IDS if sid in sections] + ["soru"]
+            raw_html = "\n".join(structured[sid] for sid in order)
+            brief_text = _strip_html_tags(raw_html)
+        else:
+            replacements["todoist"] = todoist_section_html
+            raw_html, brief_text = _postprocess_brief_html(raw_html, sections, replacements)
+
+        mood = _score_brief_text(brief_text)
+        print(f"🧠 Özet ruh hali seviyesi: {mood['level']} ({mood['label']}) | skor={mood['score']}")
+
+    hero_image_url, image_model_used, hero_renditions = _generate_daily_header_image(
+        client, brief_text, date_str, mood, now_local, normalize_all=normalize_headers,
+    )
     if hero_image_url:
         print(f"🖼️ Üst görsel URL'si hazırlandı ({image_model_used})")
     else:
         print("⚠️ Üst görsel kullanılamadı, yedek hero bloğu kullanılıyor.")
-    hero_image_markup = _build_hero_image_markup(hero_image_url, mood, date_str, todoist_struct)
-    
+    hero_image_markup = _build_hero_image_markup(
+        hero_image_url, mood, date_str, todoist_struct,
+        recipient_name=profile["name"], location_label=profile["location"]["label"], renditions=hero_renditions,
+    )
+
     # Template Birleştirme
-    final_html = HTML_TEMPLATE.substitute(
+    final_html = _html_template().substitute(
         date_string=date_str,
         content_body=raw_html,
         hero_image_markup=hero_image_markup,
@@ -2443,17 +6792,154 @@ def generate_daily_brief():
         todoist_time=todoist_time_display,
         finance_time=finance_time_display,
         market_status=market_status,
-        brief_font_stack=BRIEF_FONT_STACK,
-        nav_links=_build_nav_links()
+        brief_font_stack=_config().brief_font_stack,
+        nav_links=_build_nav_links(sections),
+        recipient_name=html.escape(profile["name"]),
+        location_label=html.escape(profile["location"]["label"]),
     )
     _log_payload_size(final_html)
+    return final_html, subject_date, _brief_plain_text(profile, subject_date, raw_html)
 
-    # 1. Dosyaya Yaz (Web İçin)
-    with open("index.html", "w", encoding="utf-8") as f:
+
+def _brief_plain_text(profile, subject_date, raw_html):
+    # Only the section body is rendered; the template chrome adds nothing readable.
+    header = [
+        f"Sabah Özeti: {subject_date}",
+        f"Günaydın, {profile['name']}. 📍 {profile['location']['label']}",
+    ]
+    return "\n".join(header) + "\n\n" + _html_to_plain_text(raw_html)
+
+
+def _write_brief_output(profile, final_html):
+    output_path = profile["output_path"]
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
         f.write(final_html)
-    
+
+
+def _deliver_brief(profile, final_html, subject_date, plain_text=None):
+    # 1. Dosyaya Yaz (Web İçin)
+    _write_brief_output(profile, final_html)
     # 2. Email Gönder
-    send_email(final_html, date_str)
+    try:
+        send_email(final_html, subject_date, profile["email_to"], plain_text)
+    finally:
+        close_email_transport()
+
+
+def generate_daily_brief():
+    config = _config()
+    if not config.api_key:
+        print("Hata: GEMINI_API_KEY (veya GOOGLE_API_KEY) bulunamadı.")
+        return
+
+    _validate_html_template_placeholders()
+
+    client = _create_genai_client(config.api_key)
+    print(f"Kullanılan Gemini modeli: {config.gemini_model}")
+    _log_render_settings()
+
+    profile = _default_recipient_profile()
+    now_qatar = get_current_time_qatar()
+
+    # Planetary positions, market data, weather and Todoist are collected concurrently.
+    inputs = _gather_brief_inputs(now_qatar)
+    data = _brief_data(
+        inputs["planetary"]["value"],
+        inputs["finance"]["value"],
+        inputs["weather"]["value"],
+        inputs["todoist"]["value"],
+        _resolved_etf_tickers,
+    )
+    final_html, subject_date, plain_text = _render_brief(client, profile, data, now_qatar)
+    _deliver_brief(profile, final_html, subject_date, plain_text)
+
+
+def generate_batch_briefs(recipients_path):
+    """Render and send one brief per recipient profile in a single process."""
+    config = _config()
+    if not config.api_key:
+        print("Hata: GEMINI_API_KEY (veya GOOGLE_API_KEY) bulunamadı.")
+        return
+
+    _validate_html_template_placeholders()
+    profiles = _load_recipient_profiles(recipients_path)
+    if not profiles:
+        print(f"⚠️ Toplu mod: '{recipients_path}' içinde geçerli alıcı profili yok.")
+        return
+
+    client = _create_genai_client(config.api_key)
+    print(f"Kullanılan Gemini modeli: {config.gemini_model}")
+    _log_render_settings()
+
+    shared = _gather_batch_inputs(profiles, datetime.datetime.now(datetime.timezone.utc))
+    _normalize_all_mood_headers()
+
+    def _run_profile(profile):
+        now_local = _now_in_timezone(profile["timezone"])
+        data = _profile_brief_data(profile, shared, now_local)
+        final_html, subject_date, plain_text = _render_brief(client, profile, data, now_local, normalize_headers=False)
+        _write_brief_output(profile, final_html)
+        return final_html, subject_date, profile["email_to"], plain_text
+
+    failures = 0
+    outgoing = []
+    with ThreadPoolExecutor(max_workers=min(config.brief_batch_workers, len(profiles)), thread_name_prefix="brief-batch") as executor:
+        futures = {executor.submit(_run_profile, profile): profile["id"] for profile in profiles}
+        for future in futures:
+            try:
+                outgoing.append(future.result())
+            except Exception as err:
+                failures += 1
+                print(f"❌ Toplu mod: '{futures[future]}' özeti üretilemedi: {err}")
+    print(f"✅ Toplu mod tamamlandı: {len(profiles) - failures}/{len(profiles)} özet üretildi.")
+
+    # All briefs share the pooled, rate-limited transport instead of one login per recipient.
+    try:
+        sent = send_emails(outgoing)
+    finally:
+        close_email_transport()
+    print(f"📧 Toplu mod: {sum(sent)}/{len(outgoing)} e-posta gönderildi.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sabah Özeti üretir ve e-posta ile gönderir.")
+    parser.add_argument(
+        "--batch",
+        metavar="RECIPIENTS_JSON",
+        default=_config().brief_recipients_file or None,
+        help="Alıcı profillerini içeren JSON dosyası; verilirse her alıcı için ayrı özet üretilir.",
+    )
+    parser.add_argument(
+        "--precompute-transits",
+        action="store_true",
+        help="Transit gezegen konumlarını önceden hesaplayıp EPHEMERIS_TABLE_DIR altına yazar.",
+    )
+    parser.add_argument("--start", metavar="YYYY-MM-DD", help="Transit tablosunun başlangıç günü (UTC, varsayılan bugün).")
+    parser.add_argument("--days", type=int, default=365, help="Transit tablosunun kapsadığı gün sayısı.")
+    parser.add_argument(
+        "--no-gemini-cache",
+        action="store_true",
+        help="Önbellekteki Gemini yanıtını yok sayar ve modeli yeniden çağırır (GEMINI_CACHE_BYPASS=1).",
+    )
+    args = parser.parse_args(argv)
+    if args.no_gemini_cache:
+        os.environ["GEMINI_CACHE_BYPASS"] = "1"
+        reload_config()
+    if args.precompute_transits:
+        if args.start:
+            start = datetime.datetime.strptime(args.start, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc)
+        else:
+            start = datetime.datetime.now(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        precompute_transit_table(start, days=max(1, args.days))
+    elif args.batch:
+        generate_batch_briefs(args.batch)
+    else:
+        generate_daily_brief()
+    _join_cache_refresh_threads()
+
 
 if __name__ == "__main__":
-    generate_daily_brief()
+    main()
@@ -0,0 +1,34 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import morning_brief_engine as engine
+
+
+class EngineTestCase(unittest.TestCase):
+    """Runs each test against an empty cache directory and a config built from `env`.
+
+    The cache backend and the Gemini model health are reset so nothing leaks
+    between tests; `reset_globals` names further module globals to reset to
+    None. `configure(**overrides)` rebuilds the config with changed variables.
+    """
+
+    env = {}
+    reset_globals = ()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patches = {"CACHE_DIR": self.tmp.name, "_CACHE_BACKEND": None, "_GEMINI_HEALTH": None}
+        patches.update((name, None) for name in self.reset_globals)
+        for name, value in patches.items():
+            patcher = mock.patch.object(engine, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(engine.reload_config)
+        self.configure()
+
+    def configure(self, **overrides):
+        with mock.patch.dict(os.environ, dict(self.env, **overrides)):
+            engine.reload_config()
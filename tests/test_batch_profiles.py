@@ -0,0 +1,66 @@
+import unittest
+
+import morning_brief_engine as engine
+
+
+NATAL = {"year": 1990, "month": 1, "day": 2, "hour": 3, "minute": 4, "lat": 41.0, "lng": 29.0}
+
+
+class RecipientProfileTests(unittest.TestCase):
+    def test_normalizes_recipient_profile(self):
+        profile = engine._normalize_recipient_profile(
+            {
+                "id": "ali veli",
+                "name": "Ali",
+                "email": "ali@example.com",
+                "timezone": "Europe/Istanbul",
+                "natal": NATAL,
+                "location": {"label": "İstanbul, Türkiye", "lat": 41.01, "lng": 28.97},
+                "holdings": [{"ticker": "NASDAQ:AAPL"}, {"ticker": "SCHD", "include": False}],
+                "sections": {"astro": False},
+            },
+            0,
+        )
+
+        self.assertEqual(profile["id"], "ali-veli")
+        self.assertEqual(profile["tickers"], ["AAPL"])
+        self.assertEqual(profile["display_tickers"], {"AAPL": "NASDAQ:AAPL"})
+        self.assertEqual(profile["natal"]["tz"], "Europe/Istanbul")
+        self.assertEqual(profile["location"]["tz"], "Europe/Istanbul")
+        self.assertNotIn("astro", profile["sections"])
+        self.assertTrue(profile["output_path"].endswith("ali-veli.html"))
+
+    def test_rejects_profile_without_natal_data(self):
+        with self.assertRaises(ValueError):
+            engine._normalize_recipient_profile({"id": "x", "email": "x@example.com", "natal": {"year": 1990}}, 0)
+
+    def test_rejects_profile_without_email(self):
+        with self.assertRaises(ValueError):
+            engine._normalize_recipient_profile({"id": "x", "natal": NATAL}, 0)
+
+    def test_profile_without_holdings_gets_no_finance_section(self):
+        profile = engine._normalize_recipient_profile({"id": "x", "email": "x@example.com", "natal": NATAL}, 0)
+
+        self.assertEqual(profile["tickers"], [])
+        self.assertNotIn("finans", profile["sections"])
+
+    def test_formats_quotes_for_each_recipient_subset(self):
+        market = {
+            "fetched_at": "2026-01-05T12:00:00+00:00",
+            "quotes": {
+                "AAPL": {"price": 200.0, "change_pct": 1.5, "week_change_pct": None, "volume": 1000,
+                         "ts": "2026-01-05T00:00:00-05:00"},
+                "SCHD": {"error": "Veri alınamadı"},
+            },
+        }
+
+        text, fetched_at, latest_ts = engine._format_financial_text(["AAPL"], market, {"AAPL": "NASDAQ:AAPL"})
+
+        self.assertIn("NASDAQ:AAPL: $200.00 (+1.50% yukarı)", text)
+        self.assertNotIn("SCHD", text)
+        self.assertEqual(fetched_at, market["fetched_at"])
+        self.assertEqual(latest_ts, "2026-01-05T00:00:00-05:00")
+
+
+if __name__ == "__main__":
+    unittest.main()
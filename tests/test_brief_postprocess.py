@@ -0,0 +1,59 @@
+import unittest
+
+import morning_brief_engine as engine
+
+
+MODEL_OUTPUT = (
+    '<div class="section-wrapper" id="odak"><div class="card"><p>Güçlü bir fırsat günü ${name}</p></div></div>'
+    '<div class="section-wrapper" id="astro"><div class="card"><div><p>Dikkat: risk</p></div></div></div>'
+    '<div class="section-wrapper" id="todoist"><div class="card"><p>Model görev listesi</p></div></div>'
+    '<script>alert(1)</script>'
+    '<div class="section-wrapper" id="finans"><ul class="finance-list"><li>SCHD</li></ul></div>'
+)
+TODOIST_HTML = '<div class="section-wrapper" id="todoist"><p>Yerel görev tablosu</p></div>'
+
+
+def _multi_pass(raw_html, sections):
+    raw_html = engine._sanitize_html(raw_html)
+    raw_html = engine._escape_template_like_sequences(raw_html)
+    raw_html = engine._ensure_required_sections(raw_html, sections)
+    raw_html = engine._replace_section_by_id(raw_html, "todoist", TODOIST_HTML)
+    return engine._filter_enabled_sections(raw_html, sections)
+
+
+class BriefPostprocessTests(unittest.TestCase):
+    def test_single_pass_matches_multi_pass_pipeline(self):
+        sections = ["odak", "hava", "todoist", "finans"]
+
+        body, text = engine._postprocess_brief_html(MODEL_OUTPUT, sections, {"todoist": TODOIST_HTML})
+
+        self.assertEqual(body, _multi_pass(MODEL_OUTPUT, sections))
+        self.assertNotIn('id="astro"', body)
+        self.assertIn('id="hava"', body)
+        self.assertIn("Yerel görev tablosu", body)
+        self.assertNotIn("Model görev listesi", body)
+        self.assertIn("&#36;{name}", body)
+        self.assertEqual(text, engine._strip_html_tags(body))
+
+    def test_missing_replacement_section_is_appended(self):
+        body, _ = engine._postprocess_brief_html(
+            '<div id="odak"><p>x</p></div>', ["odak", "todoist"], {"todoist": TODOIST_HTML}
+        )
+
+        self.assertTrue(body.endswith(TODOIST_HTML))
+
+    def test_escapes_text_that_decodes_to_markup(self):
+        body, _ = engine._postprocess_brief_html("<p>&lt;script&gt;alert(1)&lt;/script&gt;</p>", [], {})
+
+        self.assertNotIn("<script>", body)
+        self.assertIn("&lt;script&gt;", body)
+
+    def test_mood_scoring_from_collected_text_matches_html_scoring(self):
+        body, text = engine._postprocess_brief_html(MODEL_OUTPUT, engine.BRIEF_SECTION_IDS, {})
+
+        self.assertEqual(engine._score_brief_text(text), engine._score_brief_mood(body))
+        self.assertEqual(engine._extract_themes_from_text(text), engine._extract_themes(body))
+
+
+if __name__ == "__main__":
+    unittest.main()
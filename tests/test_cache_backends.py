@@ -0,0 +1,115 @@
+import datetime
+import os
+import threading
+import unittest
+from unittest import mock
+
+import morning_brief_engine as engine
+from engine_test_case import EngineTestCase
+
+
+def _entry(data, age_sec=0, ttl=None):
+    ts = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=age_sec)
+    return {"ts": ts.isoformat(), "ttl": ttl, "data": data}
+
+
+class CacheBackendTests(EngineTestCase):
+    def _backends(self):
+        return [
+            engine._JSONFileCacheBackend(self.tmp.name, 10_000),
+            engine._SQLiteCacheBackend(os.path.join(self.tmp.name, "cache.sqlite3"), 10_000),
+            engine._MemoryCacheBackend(10_000),
+        ]
+
+    def test_round_trip_and_delete(self):
+        for backend in self._backends():
+            with self.subTest(backend=type(backend).__name__):
+                backend.set("todoist.json", _entry({"text": "ğüş"}))
+                self.assertEqual(backend.get("todoist.json")["data"], {"text": "ğüş"})
+                backend.delete("todoist.json")
+                self.assertIsNone(backend.get("todoist.json"))
+
+    def test_json_backend_writes_atomically_without_temp_leftovers(self):
+        backend = engine._JSONFileCacheBackend(self.tmp.name, 10_000)
+        backend.set("weather.json", _entry({"text": "a"}))
+        backend.set("weather.json", _entry({"text": "b"}))
+
+        self.assertEqual(backend.get("weather.json")["data"], {"text": "b"})
+        self.assertEqual([name for name in os.listdir(self.tmp.name) if name.startswith(".tmp-")], [])
+
+    def test_evicts_least_recently_used_entries_over_budget(self):
+        for backend in self._backends():
+            with self.subTest(backend=type(backend).__name__):
+                backend.max_bytes = 600
+                for key in ("a.json", "b.json", "c.json"):
+                    backend.set(key, _entry("x" * 200))
+                    if isinstance(backend, engine._JSONFileCacheBackend):
+                        os.utime(os.path.join(self.tmp.name, key), (1, 1 + len(os.listdir(self.tmp.name))))
+                backend.get("a.json")
+
+                self.assertGreater(backend.evict(), 0)
+
+                self.assertIsNotNone(backend.get("a.json"))
+                self.assertIsNone(backend.get("b.json"))
+
+    def test_evicts_expired_entries_before_recently_used_ones(self):
+        for backend in self._backends():
+            with self.subTest(backend=type(backend).__name__):
+                backend.max_bytes = 600
+                backend.set("old.json", _entry("x" * 200, ttl=3600))
+                backend.set("expired.json", _entry("x" * 200, age_sec=7200, ttl=60))
+                backend.set("new.json", _entry("x" * 200))
+                backend.get("old.json")
+                backend.get("expired.json")
+
+                self.assertEqual(backend.evict(), 1)
+                self.assertIsNone(backend.get("expired.json"))
+                self.assertIsNotNone(backend.get("old.json"))
+
+
+class CacheFetchTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.backend = engine._MemoryCacheBackend(1_000_000)
+        patcher = mock.patch.object(engine, "_CACHE_BACKEND", self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_respects_stored_per_key_ttl(self):
+        self.backend.set("short.json", _entry("v", age_sec=120, ttl=60))
+        self.backend.set("long.json", _entry("v", age_sec=120, ttl=600))
+
+        self.assertIsNone(engine._load_cache("short.json"))
+        self.assertIsNotNone(engine._load_cache("long.json"))
+
+    def test_serves_stale_value_while_refreshing_in_background(self):
+        self.backend.set("weather.json", _entry("old", age_sec=90 * 60))
+        refreshed = threading.Event()
+
+        def refresh():
+            refreshed.set()
+            return "new"
+
+        value = engine._cache_fetch("weather.json", 60, refresh, stale_minutes=60)
+
+        self.assertEqual(value, "old")
+        engine._join_cache_refresh_threads(5)
+        self.assertTrue(refreshed.is_set())
+        self.assertEqual(engine._CACHE_REFRESH_THREADS, [])
+        self.assertEqual(self.backend.get("weather.json")["data"], "new")
+
+    def test_refreshes_synchronously_once_beyond_stale_window(self):
+        self.backend.set("weather.json", _entry("old", age_sec=5 * 3600))
+        calls = []
+
+        def refresh():
+            calls.append(1)
+            return "new"
+
+        self.assertEqual(engine._cache_fetch("weather.json", 60, refresh, stale_minutes=60), "new")
+        self.assertEqual(engine._cache_fetch("weather.json", 60, refresh, stale_minutes=60), "new")
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import subprocess
+import sys
+import threading
+import unittest
+
+import morning_brief_engine as engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HUNG_COLLECTOR_PROBE = """
+import threading
+import morning_brief_engine as engine
+results = engine._run_data_sources({"hung": (threading.Event().wait, 0.1, "fallback")})
+print(results["hung"]["status"])
+"""
+
+
+class DataSourceFanOutTests(unittest.TestCase):
+    def test_collects_results_and_falls_back_on_timeout_or_error(self):
+        release = threading.Event()
+        daemon = []
+
+        def slow():
+            daemon.append(threading.current_thread().daemon)
+            release.wait(5)
+            return "late"
+
+        def broken():
+            raise RuntimeError("boom")
+
+        try:
+            results = engine._run_data_sources(
+                {
+                    "fast": (lambda: "value", 5, "fallback-fast"),
+                    "slow": (slow, 0.2, "fallback-slow"),
+                    "broken": (broken, 5, "fallback-broken"),
+                },
+                max_workers=3,
+            )
+        finally:
+            release.set()
+
+        self.assertEqual(results["fast"], {"status": "ok", "value": "value", "elapsed": results["fast"]["elapsed"]})
+        self.assertEqual(results["slow"]["status"], "timeout")
+        self.assertEqual(results["slow"]["value"], "fallback-slow")
+        # A hung collector must not hold up interpreter exit.
+        self.assertEqual(daemon, [True])
+        self.assertEqual(results["broken"]["status"], "error")
+        self.assertEqual(results["broken"]["value"], "fallback-broken")
+
+    def test_collectors_run_concurrently(self):
+        barrier = threading.Barrier(3, timeout=2)
+
+        def collector():
+            barrier.wait()
+            return "ok"
+
+        results = engine._run_data_sources(
+            {name: (collector, 5, None) for name in ("a", "b", "c")},
+            max_workers=3,
+        )
+
+        self.assertEqual({result["status"] for result in results.values()}, {"ok"})
+
+    def test_hung_collector_does_not_block_interpreter_exit(self):
+        result = subprocess.run(
+            [sys.executable, "-c", HUNG_COLLECTOR_PROBE],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            timeout=60,
+            check=True,
+        )
+
+        self.assertEqual(result.stdout.strip().splitlines()[-1], "timeout")
+
+
+if __name__ == "__main__":
+    unittest.main()
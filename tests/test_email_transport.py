@@ -0,0 +1,132 @@
+import email
+import os
+import smtplib
+import threading
+import time
+import unittest
+from unittest import mock
+
+import morning_brief_engine as engine
+from engine_test_case import EngineTestCase
+
+
+class _FakeServer:
+    def __init__(self, log, fail_first=None):
+        self.log = log
+        self.fail_first = fail_first
+
+    def send_message(self, message):
+        if self.fail_first is not None:
+            err, self.fail_first = self.fail_first, None
+            raise err
+        self.log.append(message["To"])
+
+    def quit(self):
+        pass
+
+
+def _message(to):
+    return engine._build_email_message("<p>Merhaba</p>", "1 Ocak 2026", to, "sender@example.com")
+
+
+class SMTPTransportTests(unittest.TestCase):
+    def _transport(self, connect, **kwargs):
+        options = {"pool_size": 2, "max_retries": 3, "retry_base_sec": 0.01, "connect": connect}
+        options.update(kwargs)
+        return engine._SMTPEmailTransport("smtp.example.com", 465, "user", "pass", **options)
+
+    def test_reuses_pooled_connections_for_many_messages(self):
+        sent, connects = [], []
+        lock = threading.Lock()
+
+        def connect():
+            with lock:
+                connects.append(1)
+            return _FakeServer(sent)
+
+        transport = self._transport(connect, max_per_connection=100)
+        results = transport.send_many([_message(f"user{i}@example.com") for i in range(10)])
+        transport.close()
+
+        self.assertEqual(results, [None] * 10)
+        self.assertEqual(len(sent), 10)
+        self.assertLessEqual(len(connects), 2)
+
+    def test_retries_transient_failures_on_a_fresh_connection(self):
+        sent = []
+        servers = [
+            _FakeServer(sent, fail_first=smtplib.SMTPServerDisconnected("dropped")),
+            _FakeServer(sent),
+        ]
+        transport = self._transport(lambda: servers.pop(0), pool_size=1)
+
+        transport.send(_message("a@example.com"))
+
+        self.assertEqual(sent, ["a@example.com"])
+        self.assertEqual(servers, [])
+
+    def test_does_not_retry_authentication_errors(self):
+        attempts = []
+
+        def connect():
+            attempts.append(1)
+            raise smtplib.SMTPAuthenticationError(535, b"bad credentials")
+
+        transport = self._transport(connect, pool_size=1)
+        with self.assertRaises(engine.EmailDeliveryError) as ctx:
+            transport.send(_message("a@example.com"))
+
+        self.assertFalse(ctx.exception.transient)
+        self.assertEqual(len(attempts), 1)
+
+    def test_retry_backoff_is_jittered(self):
+        def connect():
+            raise smtplib.SMTPServerDisconnected("dropped")
+
+        transport = self._transport(connect, pool_size=1, retry_base_sec=1.0)
+        with mock.patch.object(engine.time, "sleep") as sleep:
+            for _ in range(10):
+                with self.assertRaises(engine.EmailDeliveryError):
+                    transport.send(_message("a@example.com"))
+        waits = [call.args[0] for call in sleep.call_args_list]
+
+        self.assertEqual(len(waits), 20)
+        self.assertTrue(all(0.5 <= wait <= 1.0 for wait in waits[0::2]))
+        self.assertTrue(all(1.0 <= wait <= 2.0 for wait in waits[1::2]))
+        self.assertGreater(len(set(waits[0::2])), 1)
+
+    def test_token_bucket_paces_sends(self):
+        bucket = engine._TokenBucket(rate_per_sec=20, capacity=1)
+        start = time.monotonic()
+        for _ in range(3):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+class FileTransportTests(EngineTestCase):
+    def test_send_emails_writes_messages_to_outbox(self):
+        outbox = os.path.join(self.tmp.name, "outbox")
+        self.configure(EMAIL_BACKEND="file", EMAIL_OUTBOX_DIR=outbox, EMAIL_TO="default@example.com")
+        results = engine.send_emails([
+            ("<p>Bir</p>", "1 Ocak 2026", "ali@example.com"),
+            ("<p>İki</p>", "1 Ocak 2026", None),
+        ])
+        # Only the single-brief path falls back to EMAIL_TO.
+        self.assertTrue(engine.send_email("<p>İki</p>", "1 Ocak 2026"))
+        engine.close_email_transport()
+
+        self.assertEqual(results, [True, False])
+        recipients = set()
+        for name in os.listdir(outbox):
+            with open(os.path.join(outbox, name), "rb") as f:
+                message = email.message_from_bytes(f.read())
+            recipients.add(message["To"])
+            self.assertEqual(
+                [part.get_content_type() for part in message.get_payload()],
+                ["text/plain", "text/html"],
+            )
+        self.assertEqual(recipients, {"ali@example.com", "default@example.com"})
+
+
+if __name__ == "__main__":
+    unittest.main()
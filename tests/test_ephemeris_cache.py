@@ -0,0 +1,50 @@
+import datetime
+import os
+import unittest
+from unittest import mock
+
+import morning_brief_engine as engine
+from engine_test_case import EngineTestCase
+
+
+class TransitTableTests(EngineTestCase):
+    reset_globals = ("_TRANSIT_TABLE",)
+
+    def test_table_lookup_matches_swiss_ephemeris(self):
+        swe = engine._get_swisseph()
+        table_dir = os.path.join(self.tmp.name, "ephemeris")
+        start = datetime.datetime(2026, 3, 1, tzinfo=datetime.timezone.utc)
+        engine.precompute_transit_table(start, days=2, step_minutes=60, directory=table_dir)
+        table = engine._load_transit_table(table_dir)
+
+        moment = start + datetime.timedelta(hours=20, minutes=30)
+        positions = engine._transit_positions_from_table(table, moment)
+        jd = swe.julday(2026, 3, 1, 20.5)
+        for key in engine.TRANSIT_PLANET_KEYS:
+            expected = swe.calc_ut(jd, getattr(swe, key.upper()), swe.FLG_SWIEPH)[0][0]
+            delta = (positions[key]["abs_pos"] - expected + 180.0) % 360.0 - 180.0
+            self.assertLess(abs(delta), 0.01, key)
+            self.assertEqual(positions[key]["sign"], engine.ZODIAC_SIGN_KEYS[int(expected // 30)])
+
+        self.assertIsNone(engine._transit_positions_from_table(table, start - datetime.timedelta(minutes=1)))
+        self.assertIsNone(engine._transit_positions_from_table(table, start + datetime.timedelta(days=3)))
+
+    def test_natal_positions_are_computed_once_per_profile(self):
+        chart = mock.Mock()
+        for key in engine.TRANSIT_PLANET_KEYS:
+            setattr(chart, key, mock.Mock(sign="Gem", position=12.5, abs_pos=72.5, retrograde=False))
+        chart.ascendant = mock.Mock(sign="Leo")
+        natal = engine._default_natal_profile()
+
+        with mock.patch.object(engine, "_compute_natal_chart", return_value=chart) as compute:
+            first = engine._natal_positions(natal, "Test")
+            second = engine._natal_positions(natal, "Test")
+            engine._natal_positions(dict(natal, hour=(natal["hour"] + 1) % 24), "Test")
+
+        self.assertEqual(first, second)
+        self.assertEqual(first["ascendant"], {"sign": "Leo"})
+        self.assertEqual(compute.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import datetime
+import types
+import unittest
+from unittest import mock
+
+import morning_brief_engine as engine
+from engine_test_case import EngineTestCase
+
+PROFILE = {"name": "Ada", "birth_data": "1 Ocak 1990", "timezone": "Asia/Qatar"}
+
+
+class _FakeModels:
+    def __init__(self):
+        self.calls = []
+
+    def generate_content(self, model, contents):
+        self.calls.append(model)
+        return types.SimpleNamespace(text=f"<p>yanıt {len(self.calls)}</p>", model_version=model)
+
+
+class GeminiResponseCacheTests(EngineTestCase):
+    env = {"GEMINI_MODEL": "gemini-test"}
+
+    def setUp(self):
+        super().setUp()
+        self.client = types.SimpleNamespace(models=_FakeModels())
+
+    def test_reuses_response_for_same_prompt_day_and_settings(self):
+        first = engine._generate_brief_content(self.client, "  Tarih: 1 Ocak\n    Veri: X\n", "2026-01-01")
+        again = engine._generate_brief_content(self.client, "Tarih: 1 Ocak\nVeri: X", "2026-01-01")
+
+        self.assertEqual(again.text, first.text)
+        self.assertEqual(self.client.models.calls, ["gemini-test"])
+
+        engine._generate_brief_content(self.client, "Tarih: 1 Ocak\nVeri: Y", "2026-01-01")
+        engine._generate_brief_content(self.client, "Tarih: 1 Ocak\nVeri: X", "2026-01-02")
+        self.assertEqual(len(self.client.models.calls), 3)
+
+    def test_settings_change_and_bypass_call_the_model(self):
+        engine._generate_brief_content(self.client, "prompt", "2026-01-01")
+
+        self.configure(THEME_PROFILE="other")
+        engine._generate_brief_content(self.client, "prompt", "2026-01-01")
+        self.assertEqual(len(self.client.models.calls), 2)
+
+        self.configure(GEMINI_CACHE_BYPASS="1")
+        fresh = engine._generate_brief_content(self.client, "prompt", "2026-01-01")
+        self.assertEqual(len(self.client.models.calls), 3)
+
+        self.configure()
+        self.assertEqual(engine._generate_brief_content(self.client, "prompt", "2026-01-01").text, fresh.text)
+        self.assertEqual(len(self.client.models.calls), 3)
+
+    def test_rerun_minutes_later_hits_the_cache(self):
+        tz = engine.pytz.timezone("Asia/Qatar")
+        first_run = tz.localize(datetime.datetime(2026, 10, 18, 8, 0))
+
+        def _prompt(now, todoist_time):
+            data = {
+                "tickers": ["SCHD"],
+                "planetary": engine.get_planetary_data(now),
+                "financial": "FİNANS VERİSİ",
+                "weather": "HAVA VERİSİ",
+                "todoist": "TODOIST VERİSİ",
+            }
+            return engine._build_brief_prompt(
+                PROFILE, data, "18 Ekim 2026", "<img>", "18.10.2026 05:00", todoist_time, "17.10.2026 16:00", "Kapalı",
+            )
+
+        first = _prompt(first_run, "18.10.2026 08:00")
+        second = _prompt(first_run + datetime.timedelta(minutes=25), "18.10.2026 08:25")
+        self.assertNotEqual(first, second)
+
+        with mock.patch.object(self.client.models, "generate_content",
+                               return_value=types.SimpleNamespace(text="<p>Veri zamanı: 18.10.2026 08:00</p>")):
+            engine._generate_brief_content(self.client, first, "2026-10-18")
+        again = engine._generate_brief_content(self.client, second, "2026-10-18")
+
+        self.assertEqual(self.client.models.calls, [])
+        self.assertEqual(again.text, "<p>Veri zamanı: 18.10.2026 08:25</p>")
+
+
+if __name__ == "__main__":
+    unittest.main()
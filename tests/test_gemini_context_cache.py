@@ -0,0 +1,110 @@
+import time
+import types
+import unittest
+from unittest import mock
+
+import morning_brief_engine as engine
+from engine_test_case import EngineTestCase
+
+PROFILE = {"name": "Ada", "birth_data": "1 Ocak 1990", "timezone": "Asia/Qatar"}
+DATA = {
+    "tickers": ["SCHD"],
+    "planetary": "GEZEGEN VERİSİ",
+    "financial": "FİNANS VERİSİ",
+    "weather": "HAVA VERİSİ",
+    "todoist": "TODOIST VERİSİ",
+}
+
+
+def _prompt_args(date_str="18 Ekim 2026", weather_time="08:00"):
+    return (PROFILE, DATA, date_str, "<img>", weather_time, "08:00", "01:00", "Piyasa kapalı")
+
+
+class _FakeCaches:
+    def __init__(self):
+        self.created = []
+        self.updated = []
+        self.deleted = []
+
+    def create(self, model, config):
+        self.created.append((model, config))
+        return types.SimpleNamespace(name=f"cachedContents/{len(self.created)}", expire_time=None)
+
+    def update(self, name, config):
+        self.updated.append((name, config["ttl"]))
+
+    def delete(self, name):
+        self.deleted.append(name)
+
+
+class _FakeModels:
+    def __init__(self, reject_cache=False):
+        self.calls = []
+        self.reject_cache = reject_cache
+
+    def generate_content(self, model, contents, config=None):
+        self.calls.append((model, contents, config))
+        if self.reject_cache and config and config.get("cached_content"):
+            raise RuntimeError("403 PERMISSION_DENIED CachedContent not found")
+        return types.SimpleNamespace(text="<p>yanıt</p>")
+
+
+class GeminiContextCacheTests(EngineTestCase):
+    env = {
+        "GEMINI_MODEL": "gemini-test",
+        "GEMINI_FALLBACK_MODELS": "gemini-backup",
+        "GEMINI_MAX_RETRIES": "1",
+        "GEMINI_CONTEXT_CACHE": "1",
+        "GEMINI_CONTEXT_CACHE_MIN_TOKENS": "0",
+        "GEMINI_CACHE_TTL_MIN": "0",
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.client = types.SimpleNamespace(caches=_FakeCaches(), models=_FakeModels())
+
+    def _generate(self, **kwargs):
+        prefix, suffix = engine._build_brief_prompt_split(*_prompt_args(**kwargs))
+        engine._generate_brief_content(self.client, prefix + suffix, "2026-10-18", cached_prefix=prefix)
+        return prefix, suffix
+
+    def test_static_prefix_is_registered_once_and_only_the_suffix_is_sent(self):
+        prefix, suffix = self._generate()
+        _, other_suffix = self._generate(date_str="19 Ekim 2026", weather_time="09:00")
+
+        self.assertEqual(len(self.client.caches.created), 1)
+        model, config = self.client.caches.created[0]
+        self.assertEqual((model, config["contents"], config["ttl"]), ("gemini-test", [prefix], "21600s"))
+        self.assertEqual(
+            [(call[1], call[2]) for call in self.client.models.calls],
+            [(suffix, {"cached_content": "cachedContents/1"}), (other_suffix, {"cached_content": "cachedContents/1"})],
+        )
+        self.assertIn("[hava_veri_zamani]", prefix)
+        self.assertNotIn("HAVA VERİSİ", prefix)
+        self.assertIn("- [hava_veri_zamani]: 09:00", other_suffix)
+
+    def test_prefix_change_replaces_and_expiry_extends_the_handle(self):
+        self._generate()
+        with mock.patch.object(engine, "ASTROLOGY_BOOKS", "REFERANS KİTAPLAR:\n- Yeni kitap\n"):
+            self._generate()
+        self.assertEqual(self.client.caches.deleted, ["cachedContents/1"])
+        self.assertEqual(len(self.client.caches.created), 2)
+
+        registry = engine._gemini_context_registry_name("gemini-test")
+        entry = engine._load_cache_any(registry)["data"]
+        engine._save_cache(registry, dict(entry, expire_at=time.time() + 600))
+        with mock.patch.object(engine, "ASTROLOGY_BOOKS", "REFERANS KİTAPLAR:\n- Yeni kitap\n"):
+            self._generate()
+        self.assertEqual(self.client.caches.updated, [("cachedContents/2", "21600s")])
+        self.assertEqual(len(self.client.caches.created), 2)
+
+    def test_rejected_handle_falls_back_to_the_full_prompt(self):
+        self.client.models.reject_cache = True
+        prefix, suffix = self._generate()
+
+        self.assertEqual(self.client.models.calls[-1], ("gemini-test", prefix + suffix, None))
+        self.assertIsNone(engine._load_cache_any(engine._gemini_context_registry_name("gemini-test")))
+
+
+if __name__ == "__main__":
+    unittest.main()
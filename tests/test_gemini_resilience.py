@@ -0,0 +1,121 @@
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+
+import morning_brief_engine as engine
+from engine_test_case import EngineTestCase
+
+
+class _FakeModels:
+    """Answers per model, or raises `errors[model]`; `held` models wait for `release` first.
+
+    With `error_calls[model]` set, only that many calls raise before it answers.
+    """
+
+    def __init__(self, held=(), errors=None, error_calls=None):
+        self.held = set(held)
+        self.release = threading.Event()
+        self.errors = errors or {}
+        self.error_calls = dict(error_calls or {})
+        self.calls = []
+        self.answered = []
+        self.lock = threading.Lock()
+
+    def generate_content(self, model, contents):
+        with self.lock:
+            self.calls.append(model)
+            failing = model in self.errors and self.error_calls.get(model, 1) > 0
+            if model in self.error_calls:
+                self.error_calls[model] -= 1
+        if model in self.held:
+            self.release.wait(5)
+        if failing:
+            raise self.errors[model]
+        with self.lock:
+            self.answered.append(model)
+        return types.SimpleNamespace(text=f"<p>{model}</p>")
+
+
+class GeminiResilienceTests(EngineTestCase):
+    env = {
+        "GEMINI_MODEL": "primary",
+        "GEMINI_FALLBACK_MODELS": "backup",
+        "GEMINI_MAX_RETRIES": "1",
+        "GEMINI_HEDGE_AFTER_SEC": "0.2",
+        "GEMINI_BREAKER_THRESHOLD": "2",
+    }
+
+    def _generate(self, models):
+        return engine._generate_content_with_retry(types.SimpleNamespace(models=models), "prompt")
+
+    def test_slow_primary_is_hedged_and_first_answer_wins(self):
+        models = _FakeModels(held={"primary"})
+        self.addCleanup(models.release.set)
+
+        response = self._generate(models)
+
+        # The primary is still waiting, so only the hedge can have answered.
+        self.assertEqual(response.text, "<p>backup</p>")
+        self.assertEqual(models.calls, ["primary", "backup"])
+        self.assertEqual(models.answered, ["backup"])
+
+    def test_hedge_delay_follows_recorded_latency_percentile(self):
+        health = engine._ModelHealth()
+        for latency in (1.0, 2.0, 3.0, 4.0, 10.0):
+            health.record_success("primary", latency)
+
+        self.assertEqual(health.hedge_delay("primary"), 10.0)
+        self.assertEqual(health.hedge_delay("unknown"), 0.2)
+        self.configure(GEMINI_HEDGE_PERCENTILE="60")
+        self.assertEqual(health.hedge_delay("primary"), 3.0)
+
+    def test_open_breaker_is_persisted_and_skips_the_model(self):
+        models = _FakeModels(errors={"primary": RuntimeError("503 UNAVAILABLE")})
+        for _ in range(2):
+            self.assertEqual(self._generate(models).text, "<p>backup</p>")
+        self.assertEqual(models.calls.count("primary"), 2)
+
+        # A new run reads the breaker state back from the cache.
+        with mock.patch.object(engine, "_GEMINI_HEALTH", None):
+            models.calls.clear()
+            self._generate(models)
+        self.assertEqual(models.calls, ["backup"])
+        self.assertTrue(engine._load_cache_any(engine.GEMINI_HEALTH_CACHE)["data"]["primary"]["open_until"] > time.time())
+
+    def test_breaker_counts_exhausted_calls_not_attempts(self):
+        self.configure(GEMINI_MAX_RETRIES="4", GEMINI_HEDGE_AFTER_SEC="30")
+        models = _FakeModels(errors={"primary": RuntimeError("503 UNAVAILABLE")}, error_calls={"primary": 3})
+
+        with mock.patch.object(engine, "_gemini_retry_delay", return_value=0.0):
+            self.assertEqual(self._generate(models).text, "<p>primary</p>")
+        self.assertEqual(models.calls, ["primary"] * 4)
+        self.assertFalse(engine._gemini_health().is_open("primary"))
+
+    def test_losing_hedged_call_does_not_update_saved_health(self):
+        models = _FakeModels(held={"primary"})
+        self.assertEqual(self._generate(models).text, "<p>backup</p>")
+        models.release.set()
+        for thread in threading.enumerate():
+            if thread.name.startswith("gemini"):
+                thread.join()
+
+        self.assertEqual(engine._gemini_health().state["primary"]["latencies"], [])
+        saved = engine._load_cache_any(engine.GEMINI_HEALTH_CACHE)["data"]
+        self.assertEqual(saved["primary"]["latencies"], [])
+        self.assertEqual(len(saved["backup"]["latencies"]), 1)
+
+    def test_backoff_honors_server_retry_hint(self):
+        err = RuntimeError("429 RESOURCE_EXHAUSTED {'retryDelay': '12s'}")
+        self.assertEqual(engine._gemini_retry_hint(err), 12.0)
+        self.assertGreaterEqual(engine._gemini_retry_delay(err, 1), 12.0)
+
+        plain = RuntimeError("503 UNAVAILABLE")
+        delays = {engine._gemini_retry_delay(plain, 2) for _ in range(20)}
+        self.assertTrue(all(3.0 <= delay <= 6.0 for delay in delays))
+        self.assertGreater(len(delays), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+import io
+import os
+import threading
+import types
+import unittest
+from unittest import mock
+
+from PIL import Image, ImageFilter
+
+import morning_brief_engine as engine
+from engine_test_case import EngineTestCase
+
+MOOD = {"level": 3, "label": "Dengeli", "tone": "sakin"}
+
+
+def _png_bytes():
+    buffer = io.BytesIO()
+    Image.new("RGB", (68, 22), (40, 80, 120)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class _ImageModels:
+    """Returns a small PNG; the first `gather` calls meet at a barrier, all calls wait for `release`."""
+
+    def __init__(self, gather=0):
+        self.gather = threading.Barrier(gather, timeout=5) if gather else None
+        self.release = threading.Event()
+        self.release.set()
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def generate_content(self, model, contents):
+        with self.lock:
+            self.calls.append(model)
+        if self.gather is not None:
+            self.gather.wait()
+        self.release.wait(5)
+        inline = types.SimpleNamespace(data=_png_bytes(), mime_type="image/png")
+        return types.SimpleNamespace(parts=[types.SimpleNamespace(inline_data=inline)])
+
+
+class HeaderPoolTests(EngineTestCase):
+    env = {"HEADER_TARGET_WIDTH": "680", "HEADER_TARGET_HEIGHT": "220"}
+
+    def setUp(self):
+        super().setUp()
+        self.header_dir = os.path.join(self.tmp.name, "headers")
+        os.makedirs(self.header_dir)
+        # _header_model_candidates reads GEMINI_IMAGE_MODEL from the environment on every call.
+        for patcher in (mock.patch.object(engine, "HEADER_IMAGE_DIR", self.header_dir),
+                        mock.patch.dict(os.environ, {"GEMINI_IMAGE_MODEL": "image-test"})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self._join_pool_threads)
+
+    @staticmethod
+    def _join_pool_threads():
+        for thread in threading.enumerate():
+            if thread.name.startswith("header-pool"):
+                thread.join()
+
+    def test_missing_variants_are_generated_concurrently(self):
+        self.configure(HEADER_POOL_SIZE="4", HEADER_POOL_WORKERS="4")
+        client = types.SimpleNamespace(models=_ImageModels(gather=4))
+
+        variants, model_used = engine._ensure_mood_header_pool(client, MOOD, "odak", "18 Ekim 2026")
+
+        # All four requests were in flight at once, or the barrier would have broken.
+        self.assertFalse(client.models.gather.broken)
+        self.assertEqual(model_used, "image-test")
+        self.assertEqual(sorted(variants), [1, 2, 3, 4])
+        self.assertEqual(sorted(os.listdir(self.header_dir)), ["manifest.json"] + [f"mood-3-{i}.png" for i in range(1, 5)])
+        self.assertEqual(len(engine._load_header_manifest()), 4)
+        with Image.open(variants[1]) as img:
+            self.assertEqual(img.size, (680, 220))
+
+    def test_background_mode_ships_with_an_existing_variant(self):
+        self.configure(HEADER_POOL_SIZE="3", HEADER_POOL_BACKGROUND="1")
+        with open(os.path.join(self.header_dir, "mood-3-1.png"), "wb") as existing:
+            existing.write(_png_bytes())
+        client = types.SimpleNamespace(models=_ImageModels())
+        client.models.release.clear()
+        self.addCleanup(client.models.release.set)
+
+        # Generation stays blocked until after the call returns, so only the existing variant can ship.
+        variants, model_used = engine._ensure_mood_header_pool(client, MOOD, "odak", "18 Ekim 2026")
+        self.assertEqual((sorted(variants), model_used), ([1], "pool-cache"))
+
+        # A second render while the fill is running does not request the same variants again.
+        engine._ensure_mood_header_pool(client, MOOD, "odak", "18 Ekim 2026")
+        client.models.release.set()
+        self._join_pool_threads()
+        self.assertEqual(len(client.models.calls), 2)
+        self.assertEqual(sorted(engine._existing_mood_header_variants(3)), [1, 2, 3])
+
+    def test_manifest_skips_unchanged_headers(self):
+        self.configure(HEADER_NORMALIZE_WORKERS="2")
+        for index, size in enumerate([(1024, 1024), (2000, 500), (680, 220)], start=1):
+            Image.new("RGB", size, (index * 60, 90, 120)).save(os.path.join(self.header_dir, f"mood-2-{index}.png"))
+        untouched = os.path.join(self.header_dir, "mood-2-3.png")
+        with open(untouched, "rb") as f:
+            original = f.read()
+
+        engine._normalize_all_mood_headers()
+
+        manifest = engine._load_header_manifest()
+        self.assertEqual(sorted(manifest), ["mood-2-1.png", "mood-2-2.png", "mood-2-3.png"])
+        self.assertEqual(manifest["mood-2-1.png"]["encoder"], "PNG optimize=True")
+        for name in manifest:
+            with Image.open(os.path.join(self.header_dir, name)) as img:
+                self.assertEqual(img.size, (680, 220))
+        with open(untouched, "rb") as f:
+            self.assertEqual(f.read(), original)
+
+        # A warm run only hashes files; a replaced file is the only one normalized again.
+        with mock.patch.object(engine, "_get_pil_image", side_effect=AssertionError("decoded")):
+            engine._normalize_all_mood_headers()
+        Image.new("RGB", (900, 900)).save(os.path.join(self.header_dir, "mood-2-2.png"))
+        with mock.patch.object(engine, "_normalize_header_image", wraps=engine._normalize_header_image) as normalize:
+            engine._normalize_all_mood_headers()
+        self.assertEqual([call.args[0] for call in normalize.call_args_list], [os.path.join(self.header_dir, "mood-2-2.png")])
+
+    def test_derivatives_fit_the_budget_and_markup_prefers_the_smallest(self):
+        self.configure(HEADER_IMAGE_BUDGET_KB="10")
+        source = os.path.join(self.header_dir, "mood-4-1.png")
+        texture = Image.effect_noise((1360, 440), 60).filter(ImageFilter.GaussianBlur(6))
+        Image.merge("RGB", (texture, Image.linear_gradient("L").resize((1360, 440)), texture)).save(source)
+
+        renditions = engine._header_derivatives(source)
+
+        self.assertEqual([(r["density"], r["width"], r["height"]) for r in renditions],
+                         [(1, 680, 220), (1, 680, 220), (2, 1360, 440), (2, 1360, 440)])
+        for rendition in renditions:
+            self.assertLessEqual(rendition["bytes"], 10 * 1024)
+            self.assertIn(engine._header_derivative_key(engine._file_sha256(source), 10 * 1024), rendition["path"])
+        jpeg_2x = next(r for r in renditions if r["format"] == "jpg" and r["density"] == 2)
+        with Image.open(jpeg_2x["path"]) as img:
+            self.assertTrue(img.info.get("progressive"))
+
+        # Cached by source hash; a changed source replaces the old renditions.
+        with mock.patch.object(engine, "_encode_under_budget", side_effect=AssertionError("re-encoded")):
+            self.assertEqual(engine._header_derivatives(source), renditions)
+        Image.new("RGB", (680, 220), (10, 20, 30)).save(source)
+        smaller = engine._header_derivatives(source)
+        self.assertEqual({r["density"] for r in smaller}, {1})
+        self.assertEqual(len(os.listdir(engine._header_derived_dir())), 2)
+
+        for rendition in renditions:
+            rendition["url"] = f"https://img/{os.path.basename(rendition['path'])}"
+        mood = {"level": 4, "label": "Parlak", "overlay": "#123456"}
+        markup = engine._build_hero_image_markup("https://img/source.png", mood, "18 Ekim 2026", renditions=renditions)
+        fallback = min((r for r in renditions if r["format"] == "jpg" and r["density"] == 1), key=lambda r: r["bytes"])
+        self.assertIn(f'src="{fallback["url"]}"', markup)
+        self.assertNotIn("source.png", markup)
+        best_2x = min((r for r in renditions if r["density"] == 2), key=lambda r: r["bytes"])
+        self.assertIn(f"url('{best_2x['url']}') 2x)", markup)
+
+    def test_reference_dimensions_come_from_the_manifest_without_hashing(self):
+        reference = os.path.join(self.header_dir, "mood-5-5.png")
+        Image.new("RGB", (640, 200)).save(reference)
+        engine._record_header_manifest([reference], 640, 200)
+
+        with mock.patch.object(engine, "_file_sha256", side_effect=AssertionError("reference hashed")), \
+                mock.patch.object(engine, "_get_pil_image", side_effect=AssertionError("reference opened")):
+            self.assertEqual(engine._header_reference_dimensions(), (640, 200))
+
+    def test_urls_are_versioned_by_content_and_published_immutably(self):
+        path = os.path.join(self.header_dir, "mood-1-1.png")
+        Image.new("RGB", (680, 220), (1, 2, 3)).save(path)
+        engine._record_header_manifest([path], 680, 220)
+        digest = engine._file_sha256(path)[:12]
+
+        url = engine._hero_image_public_url(path)
+        self.assertTrue(url.endswith(f"/mood-1-1.png?v={digest}"))
+        self.assertEqual(engine._hero_image_public_url(path), url)
+
+        # A file changed after it was indexed is hashed again.
+        Image.new("RGB", (680, 220), (9, 9, 9)).save(path)
+        changed = engine._file_sha256(path)[:12]
+        self.assertTrue(engine._hero_image_public_url(path).endswith(f"?v={changed}"))
+        engine._record_header_manifest([path], 680, 220)
+        with mock.patch.object(engine, "_file_sha256", side_effect=AssertionError("manifest not used")):
+            self.assertTrue(engine._hero_image_public_url(path).endswith(f"?v={changed}"))
+        Image.new("RGB", (680, 220), (1, 2, 3)).save(path)
+
+        static_dir = os.path.join(self.tmp.name, "static")
+        self.configure(STATIC_ASSET_DIR=static_dir, STATIC_ASSET_BASE_URL="https://cdn.example/h/")
+        self.assertEqual(engine._hero_image_public_url(path), f"https://cdn.example/h/mood-1-1.{digest}.png")
+        published = os.path.join(static_dir, f"mood-1-1.{digest}.png")
+        with open(published, "rb") as f, open(path, "rb") as src:
+            self.assertEqual(f.read(), src.read())
+
+        # Published names are never rewritten.
+        with open(published, "wb") as f:
+            f.write(b"kept")
+        engine._hero_image_public_url(path)
+        with open(published, "rb") as f:
+            self.assertEqual(f.read(), b"kept")
+
+
+if __name__ == "__main__":
+    unittest.main()
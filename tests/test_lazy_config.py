@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+import morning_brief_engine as engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_PROBE = """
+import contextlib, io, json, sys, time
+start = time.perf_counter()
+import argparse, concurrent.futures, hashlib, html.parser, http.client, random, sqlite3, urllib.request
+baseline = time.perf_counter() - start
+out = io.StringIO()
+start = time.perf_counter()
+with contextlib.redirect_stdout(out):
+    import morning_brief_engine as engine
+elapsed = time.perf_counter() - start
+heavy = [
+    "kerykeion", "swisseph", "yfinance", "PIL", "numpy", "google.genai", "google.oauth2",
+    "googleapiclient", "smtplib", "email.mime.multipart",
+]
+print(json.dumps({
+    "baseline": baseline,
+    "elapsed": elapsed,
+    "stdout": out.getvalue(),
+    "config_built": engine._CONFIG is not None,
+    "heavy_loaded": [name for name in heavy if name in sys.modules],
+}))
+"""
+
+
+class LazyConfigTests(unittest.TestCase):
+    def test_import_is_cheap_and_side_effect_free(self):
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            timeout=60,
+            check=True,
+        )
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+
+        self.assertEqual(probe["stdout"], "")
+        self.assertFalse(probe["config_built"])
+        self.assertEqual(probe["heavy_loaded"], [])
+        # Generous bound, scaled by a stdlib-only import in the same process so slow runners do not fail it.
+        self.assertLess(probe["elapsed"], max(0.5, 10 * probe["baseline"]))
+
+    def test_reload_picks_up_environment_changes(self):
+        self.addCleanup(engine.reload_config)
+        with mock.patch.dict(os.environ, {"GEMINI_MAX_RETRIES": "6", "BRIEF_RECIPIENT_NAME": "Ayşe"}):
+            config = engine.reload_config()
+
+        self.assertEqual(config.gemini_max_retries, 6)
+        self.assertIs(engine._config(), config)
+        self.assertEqual(engine.RECIPIENT_NAME, "Ayşe")
+        with self.assertRaises(AttributeError):
+            config.gemini_max_retries = 1
+        with self.assertRaises(AttributeError):
+            engine.NOT_A_SETTING
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import email
+import unittest
+
+import morning_brief_engine as engine
+
+BODY = """
+<div class="section-wrapper" id="odak">
+  <div class="card">
+    <h2>Günün odağı</h2>
+    <ul>
+      <li>Rapor <a href="https://x.y/rapor">taslağı</a></li>
+      <li>Spor
+        <ol><li>Isınma</li><li>Koşu</li></ol>
+      </li>
+    </ul>
+    <p>Ayrıntı <a href="https://x.y/rapor">burada</a>, <a href="#finans">finans</a> ve <a href="https://a.b">https://a.b</a>.</p>
+  </div>
+</div>
+"""
+
+
+class PlainTextRendererTests(unittest.TestCase):
+    def test_lists_and_links_become_bullets_and_footnotes(self):
+        text = engine._html_to_plain_text(BODY)
+
+        self.assertEqual(text, "\n".join([
+            "Günün odağı",
+            "",
+            "- Rapor taslağı [1]",
+            "- Spor",
+            "  1. Isınma",
+            "  2. Koşu",
+            "",
+            "Ayrıntı burada [1], finans ve https://a.b.",
+            "",
+            "Bağlantılar:",
+            "[1] https://x.y/rapor",
+        ]))
+
+    def test_data_tables_align_and_layout_tables_read_top_to_bottom(self):
+        rows = engine._todoist_rows_html([
+            {"content": "Rapor", "project": "İş", "due_text": "Dün", "priority": "P1"},
+            {"content": "Uzun görev adı", "project": "Ev", "due_text": "18:00", "priority": "P4"},
+        ])
+        raw = (
+            '<table role="presentation"><tr><td><p>Üst</p><p>Alt</p></td></tr><tr><td>'
+            f'<table role="presentation"><tr><td>Görev</td><td>Proje</td><td>Zaman</td><td>Öncelik</td></tr>{rows}</table>'
+            "</td></tr></table>"
+        )
+
+        self.assertEqual(engine._html_to_plain_text(raw).splitlines(), [
+            "Üst",
+            "",
+            "Alt",
+            "",
+            "Görev           Proje  Zaman  Öncelik",
+            "Rapor           İş     Dün    P1",
+            "Uzun görev adı  Ev     18:00  P4",
+        ])
+
+    def test_head_and_style_are_skipped(self):
+        raw = "<html><head><title>Başlık</title><style>.card{color:red}</style></head><body><p>Metin</p></body></html>"
+
+        self.assertEqual(engine._html_to_plain_text(raw), "Metin")
+        self.assertEqual(engine._strip_html_tags(raw + "<script>x()</script><b>kalın</b>"), "Metin kalın")
+
+    def test_email_uses_the_supplied_plain_text(self):
+        message = engine._build_email_message("<p>HTML</p>", "1 Ocak 2026", "a@b.c", "s@b.c", plain_text="Gövde")
+        parts = {part.get_content_type(): part.get_payload(decode=True).decode() for part in message.walk()
+                 if not part.is_multipart()}
+
+        self.assertEqual(parts["text/plain"], "Gövde")
+        fallback = email.message_from_bytes(
+            engine._build_email_message("<p>HTML</p>", "1 Ocak 2026", "a@b.c", "s@b.c").as_bytes()
+        )
+        self.assertEqual(fallback.get_payload(0).get_payload(decode=True).decode(), "HTML")
+
+
+if __name__ == "__main__":
+    unittest.main()
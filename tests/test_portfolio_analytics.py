@@ -0,0 +1,84 @@
+import datetime
+import unittest
+
+import numpy as np
+
+import morning_brief_engine as engine
+
+
+def _history(closes, start=datetime.date(2026, 1, 5), skip=()):
+    """Daily bars stamped at New York midnight (05:00 UTC), leaving out the `skip` offsets."""
+    days = [offset for offset in range(len(closes)) if offset not in skip]
+    ts = np.array([
+        int(datetime.datetime.combine(start + datetime.timedelta(days=offset), datetime.time(5),
+                                      datetime.timezone.utc).timestamp())
+        for offset in days
+    ], dtype=np.int64)
+    close = np.array([closes[offset] for offset in days], dtype=np.float64)
+    return {"ts": ts, "open": close, "high": close, "low": close, "close": close,
+            "volume": np.ones(len(days)), "fetched_at": 0.0}
+
+
+class PortfolioAnalyticsTests(unittest.TestCase):
+    def test_share_weighted_values_and_risk_metrics(self):
+        rng = np.random.default_rng(7)
+        a = 100 * np.cumprod(1 + rng.normal(0, 0.01, 40))
+        b = 50 * np.cumprod(1 + rng.normal(0, 0.02, 40))
+        histories = {"AAA": _history(a), "BBB": _history(b)}
+
+        analytics = engine._portfolio_analytics(["AAA", "BBB"], histories, {"AAA": 2, "BBB": 10}, window=20)
+
+        total = 2 * a + 10 * b
+        returns = total[1:] / total[:-1] - 1
+        self.assertEqual(analytics["days"], 40)
+        self.assertAlmostEqual(analytics["total_value"], total[-1])
+        self.assertAlmostEqual(analytics["daily_pnl"], total[-1] - total[-2])
+        self.assertAlmostEqual(analytics["volatility_pct"], returns[-20:].std(ddof=1) * np.sqrt(252) * 100)
+        self.assertEqual(len(analytics["rolling_volatility_pct"]), len(returns) - 19)
+        self.assertAlmostEqual(analytics["max_drawdown_pct"], ((total / np.maximum.accumulate(total)) - 1).min() * 100)
+        self.assertAlmostEqual(sum(p["weight_pct"] for p in analytics["positions"]), 100.0)
+        expected_corr = np.corrcoef(a[1:] / a[:-1] - 1, b[1:] / b[:-1] - 1)[0, 1]
+        self.assertAlmostEqual(analytics["correlation"][0][1], expected_corr, places=4)
+        self.assertEqual(analytics["top_correlations"][0][:2], ("AAA", "BBB"))
+
+    def test_aligns_calendars_and_starts_when_all_holdings_trade(self):
+        histories = {
+            "AAA": _history([10, 11, 12, 13, 14, 15], skip={3}),
+            "BBB": _history([0, 0, 20, 21, 22, 23], skip={0, 1}),
+        }
+
+        analytics = engine._portfolio_analytics(["AAA", "BBB", "ZZZ"], histories)
+
+        self.assertEqual(analytics["symbols"], ["AAA", "BBB"])
+        self.assertEqual(analytics["days"], 4)
+        # AAA's missing day is carried forward from the previous close.
+        values = [12 + 20, 12 + 21, 14 + 22, 15 + 23]
+        self.assertAlmostEqual(analytics["total_value"], values[-1])
+        self.assertAlmostEqual(analytics["daily_pnl"], values[-1] - values[-2])
+        self.assertAlmostEqual(analytics["max_drawdown_pct"], 0.0)
+        self.assertEqual(analytics["as_of"], "2026-01-10")
+
+    def test_prompt_text_and_sheet_shares(self):
+        rows = [
+            ["Ticker", "Shares"],
+            ["SCHD", "10,5"],
+            ["NASDAQ:QQQ", "2"],
+            ["SCHD", "4,5"],
+            ["GLDW", "0"],
+        ]
+        tickers, display_map, shares = engine._extract_portfolio_holdings_from_rows(rows, 1, "Ticker", "Shares")
+        self.assertEqual(tickers, ["SCHD", "QQQ"])
+        self.assertEqual(shares, {"SCHD": 15.0, "QQQ": 2.0})
+
+        histories = {"SCHD": _history([30, 31, 32]), "QQQ": _history([500, 495, 505])}
+        market = {"quotes": {}, "histories": histories, "fetched_at": "2026-01-08T00:00:00+00:00"}
+        text, _, _, analytics = engine._financial_inputs(tickers, market, display_map, shares)
+
+        self.assertIn("PORTFÖY ANALİTİĞİ (3 işlem günü", text)
+        self.assertIn("NASDAQ:QQQ", text)
+        self.assertAlmostEqual(analytics["total_value"], 15 * 32 + 2 * 505)
+        self.assertIn("<table", engine._portfolio_summary_html(analytics, display_map))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+import morning_brief_engine as engine
+
+
+class _FakeYFinance:
+    """Serves daily bars from a fixed calendar and records every download call."""
+
+    def __init__(self, closes):
+        self.closes = closes
+        self.calls = []
+
+    def download(self, symbols, start=None, **kwargs):
+        self.calls.append((list(symbols), start))
+        frames = {}
+        for symbol in symbols:
+            rows = {day: close for day, close in self.closes.get(symbol, {}).items() if day >= start}
+            index = pd.DatetimeIndex(sorted(rows), tz="America/New_York")
+            closes = [rows[day] for day in sorted(rows)]
+            frames[symbol] = pd.DataFrame(
+                {"Open": closes, "High": closes, "Low": closes, "Close": closes, "Volume": [1000.0] * len(closes)},
+                index=index,
+            )
+        return pd.concat(frames, axis=1)
+
+
+def _calendar(days, base):
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    return {
+        (today - datetime.timedelta(days=days - 1 - i)).isoformat(): base + i
+        for i in range(days)
+    }
+
+
+class PriceStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(engine.reload_config)
+        with mock.patch.dict(os.environ, {"PRICE_STORE_DIR": self.tmp.name, "FINANCE_CACHE_TTL_MIN": "30"}):
+            engine.reload_config()
+        patcher = mock.patch.object(engine, "CACHE_DIR", self.tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.yf = _FakeYFinance({"AAA": _calendar(8, 10.0), "BBB": _calendar(8, 20.0), "CCC": _calendar(8, 30.0)})
+        patcher = mock.patch.object(engine, "_get_yfinance", return_value=self.yf)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fetches_once_then_only_new_symbols(self):
+        market = engine._fetch_market_quotes(["AAA", "BBB"])
+        self.assertEqual(len(self.yf.calls), 1)
+        self.assertEqual(sorted(self.yf.calls[0][0]), ["AAA", "BBB"])
+        self.assertAlmostEqual(market["quotes"]["AAA"]["price"], 17.0)
+        self.assertAlmostEqual(market["quotes"]["AAA"]["change_pct"], (17.0 - 16.0) / 16.0 * 100)
+        self.assertAlmostEqual(market["quotes"]["BBB"]["week_change_pct"], (27.0 - 23.0) / 23.0 * 100)
+
+        engine._fetch_market_quotes(["AAA", "BBB"])
+        self.assertEqual(len(self.yf.calls), 1)
+
+        market = engine._fetch_market_quotes(["AAA", "BBB", "CCC"])
+        self.assertEqual(self.yf.calls[1][0], ["CCC"])
+        self.assertAlmostEqual(market["quotes"]["CCC"]["price"], 37.0)
+
+    def test_refresh_fetches_only_bars_after_the_last_stored_one(self):
+        engine._fetch_market_quotes(["AAA"])
+        stored = engine._load_price_history("AAA")
+        stale = dict(stored, fetched_at=stored["fetched_at"] - 3600)
+        engine._save_price_history("AAA", stale)
+
+        last_day = max(self.yf.closes["AAA"])
+        self.yf.closes["AAA"][last_day] = 99.0
+        market = engine._fetch_market_quotes(["AAA"])
+
+        self.assertEqual(self.yf.calls[-1], (["AAA"], last_day))
+        history = engine._load_price_history("AAA")
+        self.assertEqual(len(history["ts"]), len(stored["ts"]))
+        self.assertEqual(len(set(history["ts"].tolist())), len(history["ts"]))
+        self.assertAlmostEqual(market["quotes"]["AAA"]["price"], 99.0)
+
+    def test_symbol_without_new_bars_is_not_refetched_until_stale(self):
+        engine._fetch_market_quotes(["AAA"])
+        stored = engine._load_price_history("AAA")
+        engine._save_price_history("AAA", dict(stored, fetched_at=stored["fetched_at"] - 3600))
+        self.yf.closes["AAA"] = {}
+
+        market = engine._fetch_market_quotes(["AAA"])
+        self.assertEqual(len(self.yf.calls), 2)
+        self.assertAlmostEqual(market["quotes"]["AAA"]["price"], 17.0)
+
+        engine._fetch_market_quotes(["AAA"])
+        self.assertEqual(len(self.yf.calls), 2)
+
+    def test_corrupt_store_file_is_refetched(self):
+        engine._fetch_market_quotes(["AAA"])
+        path = engine._price_store_path("AAA")
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) // 2)
+
+        self.assertIsNone(engine._load_price_history("AAA"))
+        market = engine._fetch_market_quotes(["AAA"])
+        self.assertEqual(len(self.yf.calls), 2)
+        self.assertAlmostEqual(market["quotes"]["AAA"]["price"], 17.0)
+        self.assertIsNotNone(engine._load_price_history("AAA"))
+
+    def test_unknown_symbol_reports_error(self):
+        market = engine._fetch_market_quotes(["ZZZ"])
+        self.assertIn("error", market["quotes"]["ZZZ"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import contextlib
+import datetime
+import io
+import os
+import unittest
+from unittest import mock
+
+import morning_brief_engine as engine
+
+
+def _forecast():
+    return {
+        "start": datetime.datetime(2026, 10, 18).isoformat(),
+        "step_min": 60,
+        "temp": [20 + h * 0.5 for h in range(24)],
+        "feels": [22 + (h == 13) for h in range(24)],
+        "humidity": [50 + h for h in range(24)],
+        "code": [0] * 12 + [3] * 12,
+        "wind": [10 + (h == 7) * 5 for h in range(24)],
+        "fetched_at": "2026-10-18T05:00:00+00:00",
+    }
+
+
+MARKET = {
+    "quotes": {
+        "SCHD": {"price": 31.2, "change_pct": 0.81, "week_change_pct": -1.2, "volume": 12345678,
+                 "ts": "2026-10-17T20:00:00+00:00"},
+        "QQQ": {"error": "Veri alınamadı"},
+    },
+    "fetched_at": "2026-10-18T05:00:00+00:00",
+}
+TODOIST = (
+    "GERÇEK TODOIST GÖREVLERİ:\n  Toplam görev (filtre): 2 | Gösterilen: 2 | Bugün saatli etkinlik: 1 | Gecikmiş: 1"
+    "\n\nGörev listesi:\n  - [P1] Rapor | İş | Dün (Gecikmiş)\n  - [P4] Spor | Ev | 18:00"
+)
+
+
+class PromptBudgetTests(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(engine.reload_config)
+        engine.reload_config()
+        self.data = {
+            "tickers": ["SCHD", "QQQ"],
+            "planetary": "GEZEGEN\n  Güneş: Terazi 24.8°\n  Ay: Oğlak 19.8°\n\nAY BİLGİSİ:\n  Ay şu anda Oğlak burcunda.\n",
+            "financial": engine._format_financial_text(["SCHD", "QQQ"], MARKET)[0],
+            "weather": engine._weather_text({"label": "Doha, Katar"}, _forecast())[0],
+            "todoist": TODOIST,
+        }
+
+    def test_blocks_are_encoded_compactly(self):
+        blocks = engine._prompt_data_blocks(self.data)
+
+        self.assertEqual(blocks["weather"].splitlines()[2:], [
+            "  dilim|saat|sıcaklık °C|hissedilen maks °C|durum|nem %|rüzgar maks km/s",
+            "  Sabah|06-11|23-26|22|Açık|58|15",
+            "  Öğle|12-16|26-28|23|Bulutlu|64|10",
+            "  Akşam|17-21|28-30|22|Bulutlu|69|10",
+        ])
+        self.assertIn("  SCHD|31.20|+0.81|-1.20|12.3M", blocks["financial"])
+        self.assertIn("  QQQ: Veri alınamadı", blocks["financial"])
+        self.assertIn("  P1|Rapor|İş|Dün|E", blocks["todoist"])
+        self.assertIn("  Güneş Terazi 24.8°; Ay Oğlak 19.8°", blocks["planetary"])
+        self.assertNotIn("AY BİLGİSİ", blocks["planetary"])
+        self.assertIn("- Dinçer Güner: https://www.dincerguner.com/", blocks["sources"])
+        self.assertNotIn("instagram.com/dincerguner", blocks["sources"])
+        for key in ("weather", "sources"):
+            self.assertLess(len(blocks[key]), len(self.data.get(key) or engine.ASTROLOGER_SOURCES) / 1.5)
+
+        with mock.patch.dict(os.environ, {"PROMPT_COMPACT": "0"}):
+            engine.reload_config()
+        self.assertEqual(engine._prompt_data_blocks(self.data)["weather"], self.data["weather"])
+
+    def test_budget_breakdown_is_logged(self):
+        prompts = {"hava": "talimat " + engine._prompt_data_blocks(self.data)["weather"]}
+        with mock.patch.dict(os.environ, {"PROMPT_TOKEN_BUDGET": "50"}):
+            engine.reload_config()
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            total, breakdown = engine._log_prompt_budget(prompts, self.data)
+
+        self.assertEqual(total, engine._estimate_tokens(prompts["hava"]))
+        self.assertEqual(breakdown["financial"], 0)
+        self.assertEqual(breakdown["weather"] + breakdown["talimat"], total)
+        self.assertIn(f"🧮 Prompt ~{total} token / bütçe 50 (1 istek): weather=", out.getvalue())
+        self.assertIn("en büyük veri bloğu: weather", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
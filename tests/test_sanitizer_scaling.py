@@ -0,0 +1,86 @@
+import os
+import random
+import time
+import unittest
+from html.parser import HTMLParser
+from unittest import mock
+
+import morning_brief_engine as engine
+
+# Fragments model output has been seen to contain, plus constructs that make
+# html.parser rescan its input (unterminated tags, comments, declarations).
+FUZZ_TOKENS = [
+    '<div class="card tag-blue">', '<div id="odak">', "</div>", '<p style="color:red;x:url(a)">', "</p>",
+    '<a href="https://x.y/?a=1&b=2" target="_blank" onclick="x">', '<a href="javascript:alert(1)">', "</a>",
+    "<script>", "</script>", '<img src="data:x" alt="A" width="10">', '<span class="ticker-pill bogus!">', "</span>",
+    "${x}", "&amp;", "&#60;", "metin ", "<", ">", "</", "<!--", "-->", "<![CDATA[", "<![foo[", "]]>", "<?xml ", "<!x ",
+    '<a href="x" ', "<STYLE>", 'style="expression(1)"', "<td align=CENTER colspan=2>",
+]
+SCALING_UNITS = {
+    "unterminated_tags": '<a href="x" ',
+    "unterminated_comments": "<!-- ",
+    "comments_before_gt": "<!-- > ",
+    "marked_sections": "<![foo[ ",
+    "processing_instructions": "<?x ",
+    "end_tags": "</",
+    "repeated_cards": '<div class="card"><p style="color:red">Metin ${x} <a href="https://x.y">l</a></p></div>',
+}
+
+
+class _TagCollector(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tags = []
+
+    def handle_starttag(self, tag, attrs):
+        self.tags.append((tag, dict(attrs)))
+
+
+class SanitizerScalingTests(unittest.TestCase):
+    def test_fuzzed_output_only_contains_allowed_markup(self):
+        rng = random.Random(2026)
+        for _ in range(400):
+            raw = "".join(rng.choice(FUZZ_TOKENS) for _ in range(rng.randint(1, 80)))
+            body, _ = engine._postprocess_brief_html(raw, ["odak"], {"odak": "<p>yedek</p>"})
+            collector = _TagCollector()
+            collector.feed(body)
+            collector.close()
+            for tag, attrs in collector.tags:
+                self.assertIn(tag, engine.SANITIZER_ALLOWED_TAGS, raw)
+                self.assertLessEqual(set(attrs), engine.SANITIZER_ALLOWED_ATTRS[tag], raw)
+                self.assertNotIn("javascript", attrs.get("href", ""), raw)
+                self.assertNotIn("expression", attrs.get("style", ""), raw)
+            self.assertNotIn("${", body)
+            self.assertNotIn("<!", body)
+
+    def test_sanitization_time_grows_linearly(self):
+        def _best_time(text):
+            best = float("inf")
+            for _ in range(2):
+                start = time.perf_counter()
+                engine._sanitize_html(text)
+                best = min(best, time.perf_counter() - start)
+            return best
+
+        for name, unit in SCALING_UNITS.items():
+            with self.subTest(name):
+                small = _best_time(unit * (256 * 1024 // len(unit)))
+                large = _best_time(unit * (1024 * 1024 // len(unit)))
+                # 4x the input: linear stays near 4x, quadratic would be near 16x.
+                self.assertLess(large, max(small, 0.01) * 8)
+
+    def test_unknown_marked_section_is_dropped(self):
+        self.assertEqual(engine._sanitize_html("<p>a</p><![foo[ x ]]><p>b</p>"), "<p>a</p><p>b</p>")
+        self.assertEqual(engine._sanitize_html("<p>a<!-- gizli --></p><b"), "<p>a</p>&lt;b")
+
+    def test_class_styles_are_memoized_per_config(self):
+        self.addCleanup(engine.reload_config)
+        first = engine._style_for_classes("card ticker-pill")
+        self.assertIs(engine._style_for_classes("card ticker-pill"), first)
+        with mock.patch.dict(os.environ, {"BRIEF_MONO_FONT_STACK": "Courier"}):
+            engine.reload_config()
+        self.assertIn("font-family:Courier", engine._style_for_classes("card ticker-pill"))
+
+
+if __name__ == "__main__":
+    unittest.main()
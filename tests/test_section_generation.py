@@ -0,0 +1,134 @@
+import contextlib
+import io
+import re
+import threading
+import types
+import unittest
+from unittest import mock
+
+import morning_brief_engine as engine
+from engine_test_case import EngineTestCase
+
+PROFILE = {"name": "Ada", "birth_data": "1 Ocak 1990", "timezone": "Asia/Qatar"}
+DATA = {
+    "tickers": ["SCHD"],
+    "planetary": "GEZEGEN VERİSİ",
+    "financial": "FİNANS VERİSİ",
+    "weather": "HAVA VERİSİ",
+    "todoist": "TODOIST VERİSİ",
+}
+PROMPT_ARGS = (PROFILE, DATA, "18 Ekim 2026", "<img>", "08:00", "08:00", "01:00", "Piyasa kapalı")
+
+
+class _SectionModels:
+    """Answers a section prompt with its own block; `slow` sections block until `release`, `broken` ones raise."""
+
+    def __init__(self, slow=(), broken=(), busy=()):
+        self.slow = set(slow)
+        self.broken = set(broken)
+        self.busy = set(busy)
+        self.calls = []
+        self.answered = []
+        self.release = threading.Event()
+
+    def generate_content(self, model, contents):
+        section_id = re.search(r'tek bir <div class="section-wrapper" id="(\w+)">', contents).group(1)
+        self.calls.append(section_id)
+        if section_id in self.slow:
+            self.release.wait(5)
+        if section_id in self.broken:
+            raise ValueError("INVALID_ARGUMENT")
+        if section_id in self.busy:
+            raise RuntimeError("503 UNAVAILABLE")
+        body = f"<p>{section_id} metni</p>"
+        self.answered.append(section_id)
+        if section_id == "soru":
+            return types.SimpleNamespace(text=f"```html\n{body}\n```")
+        return types.SimpleNamespace(text=f'<div class="section-wrapper" id="{section_id}">{body}</div>')
+
+
+class SectionGenerationTests(EngineTestCase):
+    env = {"GEMINI_MODEL": "gemini-test", "GEMINI_MAX_RETRIES": "1", "GEMINI_SECTION_TIMEOUT_SEC": "1"}
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(self._join_section_threads)
+
+    @staticmethod
+    def _join_section_threads():
+        # Timed-out sections keep running; let them finish before the cache dir goes away.
+        for thread in threading.enumerate():
+            if thread.name.startswith("gemini-section"):
+                thread.join()
+
+    def test_section_prompts_carry_only_their_data(self):
+        prompts = engine._build_section_prompts(*PROMPT_ARGS, ["hava", "finans", "astro"])
+
+        self.assertEqual(list(prompts), ["hava", "astro", "finans"])
+        self.assertIn("HAVA VERİSİ", prompts["hava"])
+        self.assertNotIn("FİNANS VERİSİ", prompts["hava"])
+        self.assertIn("FİNANS VERİSİ", prompts["finans"])
+        self.assertIn("Aktif pozisyonlar: SCHD", prompts["finans"])
+        self.assertIn("ASTROLOJİ KAYNAKLARI", prompts["astro"])
+        self.assertNotIn("GEZEGEN VERİSİ", prompts["finans"])
+
+        full = engine._build_brief_prompt(*PROMPT_ARGS)
+        for text in ("HAVA VERİSİ", "FİNANS VERİSİ", "TODOIST VERİSİ", "8) TEK SORU (id=soru)"):
+            self.assertIn(text, full)
+
+    def test_slow_and_failed_sections_fall_back_independently(self):
+        order = ["odak", "hava", "astro", "karar", "todoist", "finans", "soru"]
+        prompt_ids = [sid for sid in order if sid != "todoist"]
+        prompts = engine._build_section_prompts(*PROMPT_ARGS, prompt_ids)
+        models = _SectionModels(slow={"astro"}, broken={"karar"})
+        self.addCleanup(models.release.set)
+        client = types.SimpleNamespace(models=models)
+        fallbacks = {"astro": '<div class="section-wrapper" id="astro"><p>astro yedek</p></div>'}
+
+        self.configure(GEMINI_SECTION_TIMEOUT_SEC="0.3", GEMINI_FALLBACK_MODELS="x")
+        log = io.StringIO()
+        with contextlib.redirect_stdout(log):
+            raw_html, replacements = engine._generate_sectioned_brief(client, prompts, "2026-10-18", fallbacks, order)
+        models.release.set()
+
+        # The slow section was still waiting when the brief was stitched, so it timed out.
+        self.assertNotIn("astro", models.answered)
+        self.assertRegex(log.getvalue(), r"'astro' bölümü üretilemedi.*(süre sınırında|içinde yanıt)")
+        self.assertEqual(replacements["astro"], fallbacks["astro"])
+
+        replacements["todoist"] = '<div class="section-wrapper" id="todoist"><p>görev tablosu</p></div>'
+        body, text = engine._postprocess_brief_html(raw_html, ["odak", "hava", "astro", "karar", "todoist", "finans"],
+                                                    replacements)
+        self.assertEqual(re.findall(r'id="(\w+)"', body), order)
+        self.assertIn("astro yedek", text)
+        self.assertIn("Bu bölüm şu an üretilemedi", text)
+        self.assertIn("hava metni", text)
+        self.assertIn("görev tablosu", text)
+        self.assertIn("soru metni", text)
+
+    def test_timed_out_section_stops_retrying(self):
+        prompts = engine._build_section_prompts(*PROMPT_ARGS, ["odak", "hava"])
+        models = _SectionModels(busy={"hava"})
+        client = types.SimpleNamespace(models=models)
+
+        self.configure(GEMINI_SECTION_TIMEOUT_SEC="0.2", GEMINI_MAX_RETRIES="5")
+        with mock.patch.object(engine, "_gemini_retry_delay", return_value=30.0):
+            _, replacements = engine._generate_sectioned_brief(client, prompts, "2026-10-18", {}, ["odak", "hava"])
+            threads = [thread for thread in threading.enumerate() if thread.name.startswith("gemini-section")]
+            for thread in threads:
+                thread.join(5)
+
+        self.assertIn("hava", replacements)
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual(models.calls.count("hava"), 1)
+
+    def test_raises_when_every_section_fails(self):
+        prompts = engine._build_section_prompts(*PROMPT_ARGS, ["odak", "hava"])
+        client = types.SimpleNamespace(models=_SectionModels(broken={"odak", "hava"}))
+
+        with self.assertRaises(ValueError):
+            engine._generate_sectioned_brief(client, prompts, "2026-10-18", {}, ["odak", "hava"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+import types
+import unittest
+
+import morning_brief_engine as engine
+from engine_test_case import EngineTestCase
+
+CONTEXT = {
+    "weather_icon_html": '<img src="https://example.com/sun.png" alt="Güneşli" />',
+    "weather_time_display": "08:00",
+    "finance_time_display": "16:00",
+    "market_status": "Piyasa kapalı",
+}
+PAYLOAD = {
+    "odak": {"motto": "Sakin <kal>", "rule_words": ["odak", "nefes", "${x}"], "mood_shift": "Hafif yükseliş."},
+    "hava": {"summary": "Güneşli", "morning": "Serin", "noon": "Sıcak", "evening": "Ilık", "outfit": "Keten"},
+    "astro": {
+        "title": "Ay Boğa'da",
+        "paragraphs": ["Birinci paragraf."],
+        "highlights": [{"tone": "gold", "label": "Para", "text": "Bütçeye dikkat"}],
+        "warning": "Acele karar verme.",
+        "sources": [
+            {"title": "Kaynak", "url": "https://example.com/astro"},
+            {"title": "Kötü", "url": "javascript:alert(1)"},
+        ],
+    },
+    "karar": {"best": "Yazı", "neutral": "Toplantı", "avoid": "Alışveriş"},
+    "is": {"items": []},
+    "finans": {"summary": "", "positions": [{"ticker": "SCHD", "price": "$31.20 (+0.8%)", "note": "Sabırlı ol"}]},
+    "soru": {"question": "Bugün neyi bırakacaksın?"},
+}
+
+
+class _JsonModels:
+    def __init__(self, text=None):
+        self.configs = []
+        self.text = text or json.dumps(PAYLOAD)
+
+    def generate_content(self, model, contents, config=None):
+        self.configs.append(config)
+        return types.SimpleNamespace(text=self.text)
+
+
+class StructuredOutputTests(EngineTestCase):
+    env = {"GEMINI_MODEL": "gemini-test"}
+
+    def test_templates_render_escaped_trusted_sections(self):
+        ids = ["odak", "hava", "astro", "karar", "is", "finans", "soru"]
+        blocks = engine._render_json_brief(f"```json\n{json.dumps(PAYLOAD)}\n```", ids, CONTEXT)
+
+        self.assertEqual(list(blocks), ids)
+        for section_id, block in blocks.items():
+            self.assertIn(f'id="{section_id}"', block)
+        self.assertIn("Sakin &lt;kal&gt;", blocks["odak"])
+        self.assertIn("&#36;{x}", blocks["odak"])
+        self.assertIn('href="https://example.com/astro"', blocks["astro"])
+        self.assertNotIn("javascript", blocks["astro"])
+        self.assertIn(CONTEXT["weather_icon_html"], blocks["hava"])
+        self.assertIn("Bu bölüm şu an üretilemedi", blocks["is"])
+        self.assertIn("Veri zamanı: 16:00 (US/Eastern) — Piyasa kapalı", blocks["finans"])
+
+        # Class styles are inlined exactly as the sanitizer would inline them.
+        sanitized = engine._sanitize_html('<span class="ticker-pill">SCHD</span>')
+        self.assertIn(sanitized, blocks["finans"])
+
+    def test_malformed_json_raises(self):
+        with self.assertRaises(ValueError):
+            engine._render_json_brief("<div>not json</div>", ["odak"], CONTEXT)
+
+    def test_truncated_json_reply_is_not_cached(self):
+        client = types.SimpleNamespace(models=_JsonModels(text=json.dumps(PAYLOAD)[:40]))
+        for _ in range(2):
+            response = engine._generate_brief_content(
+                client, "prompt", "2026-10-18", engine.BRIEF_JSON_GENERATION_CONFIG, validate=engine._parse_json_brief,
+            )
+            with self.assertRaises(ValueError):
+                engine._render_json_brief(response.text, ["odak"], CONTEXT)
+
+        self.assertEqual(len(client.models.configs), 2)
+
+    def test_response_schema_is_sent_and_keys_the_cache(self):
+        client = types.SimpleNamespace(models=_JsonModels())
+
+        engine._generate_brief_content(client, "prompt", "2026-10-18", engine.BRIEF_JSON_GENERATION_CONFIG)
+        engine._generate_brief_content(client, "prompt", "2026-10-18", engine.BRIEF_JSON_GENERATION_CONFIG)
+        engine._generate_brief_content(client, "prompt", "2026-10-18")
+
+        self.assertEqual(client.models.configs, [engine.BRIEF_JSON_GENERATION_CONFIG, None])
+        self.assertEqual(client.models.configs[0]["response_mime_type"], "application/json")
+        self.assertEqual(
+            set(engine.BRIEF_RESPONSE_SCHEMA["properties"]),
+            {"odak", "hava", "astro", "karar", "is", "finans", "soru"},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
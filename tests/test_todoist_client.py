@@ -0,0 +1,140 @@
+import datetime
+import gzip
+import json
+import tempfile
+import threading
+import time
+import unittest
+import urllib.parse
+from email.message import Message
+from unittest import mock
+
+import pytz
+
+import morning_brief_engine as engine
+
+NOW = pytz.timezone("Asia/Qatar").localize(datetime.datetime(2026, 10, 18, 8, 0))
+
+
+class _Response:
+    def __init__(self, status, payload, headers=None):
+        self.status = status
+        self.headers = Message()
+        for name, value in (headers or {}).items():
+            self.headers[name] = value
+        self.headers["Content-Encoding"] = "gzip"
+        self._body = gzip.compress(json.dumps(payload).encode())
+        self.will_close = False
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+    def read(self):
+        return self._body
+
+
+class _FakeServer:
+    """Answers Todoist paths, counting connections and concurrent requests.
+
+    With `gather` set, the first `gather` requests are held until all of them
+    are in flight, so calls that are not concurrent fail instead of passing slowly.
+    """
+
+    def __init__(self, gather=0, throttle_first=False):
+        self.gather = threading.Barrier(gather, timeout=5) if gather else None
+        self.throttle_first = throttle_first
+        self.connections = 0
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def connect(self):
+        with self.lock:
+            self.connections += 1
+        return _FakeConnection(self)
+
+    def respond(self, method, path, headers):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.requests.append((time.monotonic(), path, headers.get("Accept-Encoding")))
+            throttle, self.throttle_first = self.throttle_first, False
+            gathering = self.gather is not None and len(self.requests) <= self.gather.parties
+        if gathering:
+            self.gather.wait()
+        with self.lock:
+            self.active -= 1
+        if throttle:
+            return _Response(429, {"error": "Too many requests"}, {"Retry-After": "1"})
+        parsed = urllib.parse.urlsplit(path)
+        if parsed.path.endswith("/projects"):
+            return _Response(200, {"results": [{"id": "p1", "name": "Ev"}], "next_cursor": None})
+        query = urllib.parse.parse_qs(parsed.query)["query"][0]
+        day = NOW.date() - datetime.timedelta(days=1 if query == "overdue" else 0)
+        task = {"id": query, "content": query, "priority": 1, "project_id": "p1", "due": {"date": day.isoformat()}}
+        return _Response(200, {"results": [task], "next_cursor": None})
+
+
+class _FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.pending = None
+
+    def request(self, method, path, body=None, headers=None):
+        self.pending = (method, path, headers)
+
+    def getresponse(self):
+        return self.server.respond(*self.pending)
+
+    def close(self):
+        pass
+
+
+class TodoistClientTests(unittest.TestCase):
+    def _client(self, server):
+        pool = engine._HTTPSConnectionPool("api.todoist.com", size=3, connect=server.connect)
+        patcher = mock.patch.object(engine, "_TODOIST_CLIENT", engine._TodoistClient(pool=pool))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_filter_and_project_calls_run_concurrently_on_pooled_connections(self):
+        server = _FakeServer(gather=3)
+        self._client(server)
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.object(engine, "CACHE_DIR", cache_dir), \
+                mock.patch.object(engine, "_CACHE_BACKEND", None):
+            _, _, structured = engine.get_todoist_data(NOW, token="token-a", max_items=10, tz_name="Asia/Qatar")
+
+        self.assertFalse(server.gather.broken)
+        self.assertEqual(server.max_active, 3)
+        self.assertEqual({encoding for _, _, encoding in server.requests}, {"gzip"})
+        self.assertEqual(structured["total_matched"], 2)
+        self.assertEqual(structured["overdue_items"][0]["project"], "Ev")
+
+        engine._todoist_request("/projects", token="token-a")
+        self.assertEqual(server.connections, 3)
+
+    def test_retry_after_pauses_every_call_for_the_token(self):
+        server = _FakeServer(throttle_first=True)
+        self._client(server)
+        limit = engine._TODOIST_CLIENT._limit("token-b")
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(engine._todoist_request("/projects", token="token-b")))
+        first.start()
+        while not limit["resume_at"]:
+            time.sleep(0.01)
+        results.append(engine._todoist_request("/projects", token="token-b"))
+        first.join()
+
+        self.assertEqual(len(results), 2)
+        times = [stamp for stamp, _, _ in server.requests]
+        self.assertEqual(len(times), 3)
+        # Both the retry and the call issued during the pause wait until Retry-After has passed.
+        self.assertLess(times[0], limit["resume_at"])
+        self.assertGreaterEqual(min(times[1:]), limit["resume_at"])
+
+
+if __name__ == "__main__":
+    unittest.main()
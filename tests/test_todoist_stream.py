@@ -0,0 +1,134 @@
+import datetime
+import unittest
+from unittest import mock
+
+import pytz
+
+import morning_brief_engine as engine
+from engine_test_case import EngineTestCase
+
+TZ = pytz.timezone("Asia/Qatar")
+NOW = TZ.localize(datetime.datetime(2026, 10, 18, 8, 0))
+
+
+def _task(task_id, day_offset, priority=1, hour=None):
+    day = (NOW + datetime.timedelta(days=day_offset)).date()
+    due = {"date": f"{day.isoformat()}T{hour:02d}:00:00" if hour is not None else day.isoformat()}
+    return {"id": str(task_id), "content": f"Görev {task_id}", "priority": priority, "project_id": "p1", "due": due}
+
+
+class _FakeTodoist:
+    """Serves `/tasks/filter` results in pages of `page_size` linked by `next_cursor`."""
+
+    def __init__(self, tasks_by_query, page_size=3, bad_queries=()):
+        self.tasks_by_query = tasks_by_query
+        self.page_size = page_size
+        self.bad_queries = set(bad_queries)
+        self.calls = []
+
+    def __call__(self, path, params=None, phase="request", token=None, **kwargs):
+        params = params or {}
+        self.calls.append((path, params.get("query"), params.get("cursor")))
+        if path == "/projects":
+            return {"results": [{"id": "p1", "name": "Ev"}], "next_cursor": None}
+        query = params["query"]
+        if query in self.bad_queries:
+            raise engine.TodoistAPIError(phase=phase, path=path, status=400, details="bad filter")
+        offset = int(params.get("cursor") or 0)
+        items = self.tasks_by_query[query]
+        page = items[offset:offset + self.page_size]
+        next_offset = offset + self.page_size
+        return {"results": page, "next_cursor": str(next_offset) if next_offset < len(items) else None}
+
+
+class _TodoistTestCase(EngineTestCase):
+    def _run(self, api, max_items):
+        with mock.patch.object(engine, "_todoist_request", api):
+            return engine.get_todoist_data(NOW, token="token-1234567890", max_items=max_items, tz_name="Asia/Qatar")
+
+
+class TodoistStreamTests(_TodoistTestCase):
+
+    def test_follows_cursors_and_counts_every_task(self):
+        overdue = [_task(i, -1 - (i % 4), priority=1 + i % 4) for i in range(10)]
+        # Todoist rolls date-only tasks forward, so some overdue ones come back dated today.
+        today = [_task(i, 0, hour=9 + i % 8) for i in range(100, 112)] + [_task(3, 0), _task(7, 0)]
+        api = _FakeTodoist({"overdue": overdue, "today": today})
+
+        text, _, structured = self._run(api, max_items=5)
+
+        task_pages = [call for call in api.calls if call[0] == "/tasks/filter"]
+        self.assertEqual(len(task_pages), 4 + 5)
+        self.assertEqual(structured["total_matched"], 22)
+        self.assertEqual(structured["overdue_count"], 10)
+        self.assertEqual(structured["today_count"], 12)
+        self.assertEqual(structured["timed_today_count"], 12)
+        self.assertEqual(structured["displayed_count"], 5)
+
+        normalized = [
+            engine._normalize_todoist_task(task, {"p1": "Ev"}, TZ, NOW, True) for task in overdue
+        ]
+        expected = sorted(normalized, key=engine._todoist_rank)[:5]
+        self.assertEqual(structured["overdue_items"], expected)
+        self.assertEqual(structured["today_items"], [])
+        self.assertIn("Toplam görev (filtre): 22 | Gösterilen: 5", text)
+        self.assertIn("| Ev |", text)
+
+    def test_invalid_filter_is_skipped(self):
+        api = _FakeTodoist({"today": [_task(1, 0, hour=10), _task(2, 0)]}, bad_queries={"overdue"})
+
+        _, _, structured = self._run(api, max_items=10)
+
+        self.assertEqual(structured["total_matched"], 2)
+        self.assertEqual([item["content"] for item in structured["today_items"]], ["Görev 1", "Görev 2"])
+
+
+class _FakeSync:
+    """Answers `/sync` with a full snapshot first and the queued deltas afterwards."""
+
+    def __init__(self, snapshot, deltas):
+        self.snapshot = snapshot
+        self.deltas = list(deltas)
+        self.tokens = []
+
+    def __call__(self, path, params=None, phase="request", token=None, data=None, **kwargs):
+        assert path == "/sync", path
+        self.tokens.append(data["sync_token"])
+        if data["sync_token"] == "*":
+            return dict(self.snapshot, full_sync=True, sync_token="t1")
+        delta = self.deltas.pop(0)
+        return dict(delta, full_sync=False, sync_token=f"t{len(self.tokens)}")
+
+
+class TodoistMirrorTests(_TodoistTestCase):
+    env = {"TODOIST_SYNC_MODE": "sync"}
+
+    def _expire_cache(self):
+        engine._cache_backend().delete(engine._todoist_cache_name("token-1234567890"))
+
+    def test_syncs_deltas_into_the_local_mirror(self):
+        api = _FakeSync(
+            {
+                "items": [_task(1, -2, priority=4), _task(2, 0, hour=11), _task(3, 5), dict(_task(4, 0), checked=True)],
+                "projects": [{"id": "p1", "name": "Ev"}],
+            },
+            [
+                {"items": [dict(_task(2, 0), is_deleted=True), _task(5, 0, hour=9)], "projects": []},
+            ],
+        )
+
+        _, _, first = self._run(api, max_items=10)
+        self._expire_cache()
+        text, _, second = self._run(api, max_items=10)
+
+        self.assertEqual(api.tokens, ["*", "t1"])
+        self.assertEqual(first["total_matched"], 2)
+        self.assertEqual([item["content"] for item in first["overdue_items"]], ["Görev 1"])
+        self.assertEqual([item["content"] for item in first["today_items"]], ["Görev 2"])
+        self.assertEqual([item["content"] for item in second["today_items"]], ["Görev 5"])
+        self.assertEqual(second["overdue_items"][0]["project"], "Ev")
+        self.assertIn("Toplam görev (filtre): 2", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
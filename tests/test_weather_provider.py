@@ -0,0 +1,105 @@
+import datetime
+import json
+import unittest
+import urllib.error
+import urllib.parse
+from email.message import Message
+from unittest import mock
+
+import morning_brief_engine as engine
+from engine_test_case import EngineTestCase
+
+
+def _hourly(base):
+    start = datetime.datetime(2026, 10, 18)
+    return {
+        "time": [(start + datetime.timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in range(24)],
+        "temperature_2m": [base + h * 0.25 for h in range(24)],
+        "apparent_temperature": [base + 1 for _ in range(24)],
+        "relative_humidity_2m": [55] * 24,
+        "weather_code": [0] * 24,
+        "wind_speed_10m": [12.34] * 24,
+    }
+
+
+class _Response:
+    def __init__(self, payload, etag):
+        self.payload = payload
+        self.headers = Message()
+        self.headers["ETag"] = etag
+
+    def read(self):
+        return json.dumps(self.payload).encode()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _FakeOpenMeteo:
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, req, timeout=None):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(req.full_url).query)
+        self.requests.append((query, req.get_header("If-none-match")))
+        if req.get_header("If-none-match") == '"v1"':
+            raise urllib.error.HTTPError(req.full_url, 304, "Not Modified", Message(), None)
+        latitudes = query["latitude"][0].split(",")
+        payloads = [{"hourly": _hourly(20.0 + float(lat))} for lat in latitudes]
+        return _Response(payloads if len(payloads) > 1 else payloads[0], '"v1"')
+
+
+LOCATIONS = [
+    {"label": "Doha, Katar", "lat": 25.2854, "lng": 51.531, "tz": "Asia/Qatar"},
+    {"label": "West Bay, Katar", "lat": 25.3190, "lng": 51.5270, "tz": "Asia/Qatar"},
+    {"label": "İstanbul, Türkiye", "lat": 41.0082, "lng": 28.9784, "tz": "Europe/Istanbul"},
+]
+
+
+class WeatherProviderTests(EngineTestCase):
+    env = {"WEATHER_GRID_DEG": "0.1", "WEATHER_CACHE_STALE_MIN": "0"}
+
+    def setUp(self):
+        super().setUp()
+        self.api = _FakeOpenMeteo()
+        patcher = mock.patch.object(engine.urllib.request, "urlopen", self.api)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_nearby_locations_share_one_multi_coordinate_request(self):
+        results = engine.get_weather_for_locations(LOCATIONS)
+
+        self.assertEqual(len(self.api.requests), 1)
+        query, _ = self.api.requests[0]
+        self.assertEqual(query["latitude"][0].split(","), ["25.3", "41"])
+        self.assertEqual(query["timezone"][0], "Asia/Qatar,Europe/Istanbul")
+        doha = results[engine._location_cache_key(LOCATIONS[0])]
+        west_bay = results[engine._location_cache_key(LOCATIONS[1])]
+        self.assertTrue(doha[0].startswith("DOHA HAVA DURUMU"))
+        self.assertTrue(west_bay[0].startswith("WEST BAY HAVA DURUMU"))
+        self.assertIn("  00:00 | 45°C (hissedilen 46°C) | Açık | Nem %55 | Rüzgar 12 km/s", doha[0])
+        self.assertEqual(doha[1], "sunny")
+
+        engine.get_weather_for_locations(LOCATIONS)
+        self.assertEqual(len(self.api.requests), 1)
+
+    def test_expired_cells_are_revalidated_with_etag(self):
+        first = engine.get_weather_data(LOCATIONS[2])
+        name = engine._weather_cell_cache_name(engine._weather_cell(LOCATIONS[2])["key"])
+        backend = engine._cache_backend()
+        entry = backend.get(name)
+        entry["ts"] = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=3)).isoformat()
+        backend.set(name, entry)
+
+        second = engine.get_weather_data(LOCATIONS[2])
+
+        self.assertEqual([etag for _, etag in self.api.requests], [None, '"v1"'])
+        self.assertEqual(first, second)
+        self.assertIsNotNone(engine._load_cache(name))
+
+
+if __name__ == "__main__":
+    unittest.main()